@@ -1,86 +1,74 @@
-from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
-from langchain.schema.runnable import RunnableParallel
-from langchain_community.utilities import SQLDatabase
-from langchain_experimental.sql import SQLDatabaseChain 
-from langchain_community.tools import DuckDuckGoSearchRun
 from langchain.agents import Tool
-from dotenv import load_dotenv
-import os
+import functools
 import sys
 from pathlib import Path
 
-script_dir = Path(__file__).parent.absolute()
-db_path = script_dir.parent / "db" / "farming_memory.db"
-db = SQLDatabase.from_uri(f"sqlite:///{db_path}")
-
 sys.path.append(str(Path(__file__).parent.parent))
 from modules.query_extract_run import extract_sql_query, run_query
+from modules.sql_cache import get_sql
 from modules.memory_handler import store_crux  
+from modules.search_cache import cached
+from modules.step_dag import StepDAG
+from modules.registry import get_cached_llm, get_search, get_sql_chain
+from modules.carbon_engine import compute_carbon_footprint, summarize_carbon_footprint
+from modules.prompt_compaction import compact_context, compaction_report, distinct_crops
 
-load_dotenv()
-groq_api_key = os.getenv("GROQ_API_KEY")
-
-llm = ChatGroq(
-    model_name="llama3-70b-8192",
-    temperature=0.7,
-    groq_api_key=groq_api_key
-)
+llm = get_cached_llm("llama3-70b-8192", namespace="carbon")
 
-llm2 = ChatGroq(
-    model_name="llama-3.3-70b-versatile",
-    temperature=0.7,
-    groq_api_key=groq_api_key
-)
-
-search = DuckDuckGoSearchRun()
 search_tool = Tool(
     name="Web Search",
-    func=search.run,
+    func=cached(lambda query: get_search().run(query)),
     description="Useful for finding recent data on carbon emission factors and reduction strategies"
 )
 
-def carbon_footprint_analyzer():
-    db_chain = SQLDatabaseChain.from_llm(llm2, db, verbose=True)
-    qns1 = db_chain("GIVE ONLY THE SQL QUERY to select Farm_ID, Crop_Type, Fertilizer_Usage_kg, Pesticide_Usage_kg from farmer_advisor")
-    gen_query = extract_sql_query(qns1["result"])
-    farm_data = run_query(gen_query)
-    farm_str = " ".join([row[1] for row in farm_data])
+# Steps the /stream endpoints send as soon as they finish, mapped to their key in the result
+STREAM_SECTIONS = {
+    "carbon_calc": "carbon_footprint_calculation",
+    "reduction_insights": "reduction_insights",
+    "web_carbon_trends": "web_carbon_trends"
+}
+
+# Shared by every request, only the values passed to run() change
+@functools.lru_cache(maxsize=None)
+def _carbon_dag():
+    def generate_sql(question):
+        db_chain = get_sql_chain()
+        qns1 = db_chain(question)
+        return extract_sql_query(qns1["result"])
+
+    def farm_rows():
+        gen_query = get_sql("GIVE ONLY THE SQL QUERY to select Farm_ID, Crop_Type, Fertilizer_Usage_kg, Pesticide_Usage_kg from farmer_advisor", generate_sql)
+        return run_query(gen_query)
 
     carbon_calc_prompt = PromptTemplate(
-        input_variables=["farm_data"],
+        input_variables=["carbon_summary"],
         template="""
-        Using the following farm data from the farmer_advisor table: {farm_data}
-        Calculate the carbon footprint for each farm with emission factors:
-        - Fertilizer: 5.2 kg CO2e/kg
-        - Pesticide: 16.6 kg CO2e/kg
+        The carbon footprint of the farms in the farmer_advisor table has already been calculated:
+        {carbon_summary}
         
-        Provide the response strictly in this format:
-        - Farm Data: <list of Farm_ID, Crop_Type, Carbon_Footprint (kg CO2e)>
-        - Total Carbon Footprint: <sum of all footprints in kg CO2e>
+        Do NOT recalculate or change any number. Narrate these results and provide the response strictly in this format:
+        - Summary: <2-3 lines describing which crops and inputs drive the footprint>
+        - Total Carbon Footprint: <total footprint in kg CO2e exactly as given>
         """
     )
 
     carbon_calc_chain = carbon_calc_prompt | llm
 
     reduction_insights_prompt = PromptTemplate(
-        input_variables=["farm_data"],
+        input_variables=["carbon_summary"],
         template="""
-        For the following farm data: {farm_data}
-        Provide reduction insights based on Fertilizer_Usage_kg and Pesticide_Usage_kg:
-        - If Fertilizer_Usage_kg > 50, suggest "Reduce fertilizer use by 20% with precision farming"
-        - If Pesticide_Usage_kg > 5, suggest "Switch to organic pesticides, reducing emissions by 30%"
-        
-        Calculate potential reduction in kg CO2e:
-        - Fertilizer reduction: 20% of fertilizer contribution (Fertilizer_Usage_kg * 5.2)
-        - Pesticide reduction: 30% of pesticide contribution (Pesticide_Usage_kg * 16.6)
+        For the following computed carbon footprint and potential reduction per crop: {carbon_summary}
+        The reductions were estimated with these rules:
+        - If Fertilizer_Usage_kg > 50, "Reduce fertilizer use by 20% with precision farming"
+        - If Pesticide_Usage_kg > 5, "Switch to organic pesticides, reducing emissions by 30%"
         
+        Do NOT recalculate or change any number.
         Provide the response strictly in this format:
         - Reduction Insights:
-          - <Farm_ID>:
-            - Crop_Type: <crop>
+          - <Crop_Type>:
             - Insights: <list of applicable strategies>
-            - Estimated_Reduction: <total reduction in kg CO2e>
+            - Estimated_Reduction: <total reduction in kg CO2e exactly as given>
         """
     )
 
@@ -105,24 +93,48 @@ def carbon_footprint_analyzer():
         """
     )
 
-    def web_carbon_trends_analysis(farm_str):
+    def web_search(farm_str):
         search_query = f"2024 carbon footprint reduction strategies for farming crops like {farm_str} site:.edu OR site:.gov OR site:.org"
-        search_results = search_tool.run(search_query)
-        
+        return search_tool.run(search_query)
+
+    def web_carbon_trends_analysis(farm_str, search_results):
         prompt = web_carbon_trends_prompt.format(farm_str=farm_str)
         return llm.invoke(prompt + "\n\nRecent Reports:\n" + search_results[:2000])
 
-    analysis_chain = RunnableParallel(
-        carbon_calc=carbon_calc_chain,
-        reduction_insights=reduction_insights_chain,
-        web_carbon_trends=lambda x: web_carbon_trends_analysis(x["farm_str"])
+    async def aweb_carbon_trends_analysis(farm_str, search_results):
+        prompt = web_carbon_trends_prompt.format(farm_str=farm_str)
+        return await llm.ainvoke(prompt + "\n\nRecent Reports:\n" + search_results[:2000])
+
+    # The web search only needs the crop list, so it overlaps the carbon calculation
+    dag = StepDAG("carbon")
+    dag.add("farm_data", farm_rows)
+    dag.add("farm_str", lambda farm_data: distinct_crops(farm_data), ["farm_data"])
+    dag.add("carbon_result", compute_carbon_footprint, ["farm_data"])
+    # Prompts get per-crop totals plus a farm digest, together bounded by PROMPT_TOKEN_BUDGET, never the raw rows
+    dag.add(
+        "carbon_summary",
+        lambda carbon_result: compact_context(summarize_carbon_footprint(carbon_result), carbon_result["farm_data"], ["fertilizer_use", "pesticide_use", "carbon_footprint"], "carbon_footprint"),
+        ["carbon_result"]
+    )
+    dag.add("prompt_compaction", lambda farm_data, carbon_summary: compaction_report(farm_data, carbon_summary), ["farm_data", "carbon_summary"])
+    dag.add(
+        "carbon_calc",
+        lambda carbon_summary: carbon_calc_chain.invoke({"carbon_summary": carbon_summary}),
+        ["carbon_summary"],
+        afn=lambda carbon_summary: carbon_calc_chain.ainvoke({"carbon_summary": carbon_summary})
     )
+    dag.add(
+        "reduction_insights",
+        lambda carbon_summary: reduction_insights_chain.invoke({"carbon_summary": carbon_summary}),
+        ["carbon_summary"],
+        afn=lambda carbon_summary: reduction_insights_chain.ainvoke({"carbon_summary": carbon_summary})
+    )
+    dag.add("search_results", web_search, ["farm_str"])
+    dag.add("web_carbon_trends", web_carbon_trends_analysis, ["farm_str", "search_results"], afn=aweb_carbon_trends_analysis)
+    return dag
 
-    farm_data_str = str(farm_data)  
-    analysis_result = analysis_chain.invoke({
-        "farm_data": farm_data_str,
-        "farm_str": farm_str
-    })
+def _carbon_result(analysis_result):
+    carbon_result = analysis_result["carbon_result"]
 
     store_crux("carbon_footprint_agent_insight", analysis_result["carbon_calc"].content.strip(), update=True)
     store_crux("carbon_footprint_agent_recommendation", analysis_result["reduction_insights"].content.strip(), update=True)
@@ -133,7 +145,18 @@ def carbon_footprint_analyzer():
     print(analysis_result["web_carbon_trends"].content.strip())
 
     return {
+        "farm_data": carbon_result["farm_data"],
+        "total_carbon_footprint": carbon_result["total_carbon_footprint"],
+        "reductions": carbon_result["reductions"],
+        "emission_factors": carbon_result["emission_factors"],
+        "prompt_compaction": analysis_result["prompt_compaction"],
         "carbon_footprint_calculation": analysis_result["carbon_calc"].content.strip(),
         "reduction_insights": analysis_result["reduction_insights"].content.strip(),
         "web_carbon_trends": analysis_result["web_carbon_trends"].content.strip()
     }
+
+def carbon_footprint_analyzer(on_step_complete=None):
+    return _carbon_result(_carbon_dag().run(on_step_complete))
+
+async def acarbon_footprint_analyzer(on_step_complete=None):
+    return _carbon_result(await _carbon_dag().arun(on_step_complete))
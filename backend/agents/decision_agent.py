@@ -1,35 +1,40 @@
-from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
-from dotenv import load_dotenv
-import sqlite3
-import os
+from modules.registry import get_cached_llm
+from modules.db_manager import fetchall
+from modules.memory_handler import memory_version
+from modules.format_parser import parse_sustainability, parse_market, parse_carbon, parse_water
+import asyncio
 import json
 
-load_dotenv()
-groq_api_key = os.getenv("GROQ_API_KEY")
-
-llm = ChatGroq(
-    model_name="llama-3.3-70b-versatile",
-    temperature=0.7,
-    groq_api_key=groq_api_key
-)
+llm = get_cached_llm("llama-3.3-70b-versatile", namespace="decision")
 
 class DecisionAgent:
     def __init__(self, db_path):
         self.db_path = db_path
+        # (memory version, rows, context) from the last read of the memory table
+        self._memory_cache = (None, None, None)
+
+    def _load_memory(self):
+        version, memory_data, memory_context = self._memory_cache
+        current = memory_version()
+        if version != current:
+            memory_data = fetchall(self.db_path, "SELECT agent_name, crux FROM memory")
+            memory_context = None
+            self._memory_cache = (current, memory_data, memory_context)
+        return current, memory_data, memory_context
 
     def fetch_memory(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT agent_name, crux FROM memory")
-        memory_data = cursor.fetchall()
-        conn.close()
-        return memory_data
+        return self._load_memory()[1]
 
-    def analyze_and_clean(self, raw_output, sender):
-        memory_data = self.fetch_memory()
-        memory_context = "\n".join([f"{agent}: {crux}" for agent, crux in memory_data])
+    def memory_context(self):
+        """Memory rows rendered for prompting, rebuilt only after memory changes."""
+        version, memory_data, memory_context = self._load_memory()
+        if memory_context is None:
+            memory_context = "\n".join([f"{agent}: {crux}" for agent, crux in memory_data])
+            self._memory_cache = (version, memory_data, memory_context)
+        return memory_context
 
+    def analyze_and_clean(self, raw_output, sender):
         if sender == "sustainability":
             try:
                 if isinstance(raw_output, str):
@@ -96,32 +101,50 @@ class DecisionAgent:
                 return self._format_water_json({})
         else:
             # Original logic for other senders
-            prompt = PromptTemplate.from_template(
-                "Given the following memory context:\n{memory_context}\n\n and GIVE JUST ONLY JSON NOTHING ELSE"
-                "Analyze and structure the following raw output into a consistent JSON format. if you think any fields are empty and provide quotes even to true or false"
-                "Ensure the JSON is clean and well-structured:\n\n{raw_output}\n\n"
-                "Return the structured JSON:"
-            )
-            formatted_prompt = prompt.format(memory_context=memory_context, raw_output=raw_output)
-            response = llm.invoke(formatted_prompt).content.strip()
+            formatted_prompt = self._structure_prompt(self.memory_context(), raw_output)
+            return self._parse_structured(llm.invoke(formatted_prompt).content.strip())
 
-            if response.startswith("```json") and response.endswith("```"):
-                response = response[7:-3].strip()
-            elif response.startswith("```") and response.endswith("```"):
-                response = response[3:-3].strip()
+    async def aanalyze_and_clean(self, raw_output, sender):
+        """Async analyze_and_clean: the free-form branch awaits the LLM, template senders run in a worker thread."""
+        if sender in ("sustainability", "market", "carbon", "water"):
+            return await asyncio.to_thread(self.analyze_and_clean, raw_output, sender)
+        memory_context = await asyncio.to_thread(self.memory_context)
+        formatted_prompt = self._structure_prompt(memory_context, raw_output)
+        response = await llm.ainvoke(formatted_prompt)
+        return self._parse_structured(response.content.strip())
 
-            try:
-                structured_json = json.loads(response)
-                return structured_json
-            except json.JSONDecodeError:
-                print(f"LLM returned invalid JSON. Raw response: {response}")
-                return {
-                    "error": "Invalid JSON returned by LLM",
-                    "raw_response": response
-                }
+    def _structure_prompt(self, memory_context, raw_output):
+        prompt = PromptTemplate.from_template(
+            "Given the following memory context:\n{memory_context}\n\n and GIVE JUST ONLY JSON NOTHING ELSE"
+            "Analyze and structure the following raw output into a consistent JSON format. if you think any fields are empty and provide quotes even to true or false"
+            "Ensure the JSON is clean and well-structured:\n\n{raw_output}\n\n"
+            "Return the structured JSON:"
+        )
+        return prompt.format(memory_context=memory_context, raw_output=raw_output)
+
+    def _parse_structured(self, response):
+        if response.startswith("```json") and response.endswith("```"):
+            response = response[7:-3].strip()
+        elif response.startswith("```") and response.endswith("```"):
+            response = response[3:-3].strip()
+
+        try:
+            structured_json = json.loads(response)
+            return structured_json
+        except json.JSONDecodeError:
+            print(f"LLM returned invalid JSON. Raw response: {response}")
+            return {
+                "error": "Invalid JSON returned by LLM",
+                "raw_response": response
+            }
     
     def _format_sustainability_json(self, data):
         """Format sustainability data according to required template structure."""
+        # The agents' bullet formats map straight onto the template, the LLM is only a fallback
+        parsed = parse_sustainability(data) if isinstance(data, dict) else None
+        if parsed is not None:
+            return parsed
+
         template = {
             "sustainability_analysis": {
                 "analysis": "The sustainability score for Wheat is driven primarily by the Crop_Yield_ton, which is high in most cases, indicating good agricultural practices. The moderate to low Fertilizer_Usage_kg and Pesticide_Usage_kg also contribute to the high sustainability score, as they reduce the environmental impact of farming. However, the variability in Soil_pH and Soil_Moisture parameters may require more precise management to optimize crop growth and reduce waste.",
@@ -281,6 +304,11 @@ class DecisionAgent:
     
     def _format_market_json(self, data):
         """Format market data according to required template structure."""
+        # The agents' bullet formats map straight onto the template, the LLM is only a fallback
+        parsed = parse_market(data) if isinstance(data, dict) else None
+        if parsed is not None:
+            return parsed
+
         template = {
             "market_analysis": {
                 "analysis": {
@@ -450,6 +478,11 @@ class DecisionAgent:
     
     def _format_carbon_json(self, data):
         """Format carbon data according to required template structure."""
+        # The agents' bullet formats map straight onto the template, the LLM is only a fallback
+        parsed = parse_carbon(data) if isinstance(data, dict) else None
+        if parsed is not None:
+            return parsed
+
         template = {
             "carbon_footprint_calculation": {
                 "farm_data": [
@@ -568,7 +601,9 @@ class DecisionAgent:
                 "Return only the modified template as a valid JSON object. Do not include any explanation."
             )
             
-            formatted_prompt = prompt.format(template=json.dumps(template), raw_data=json.dumps(data))
+            # The per-farm rows are computed exactly by the carbon engine, keep them out of the prompt
+            raw_data = {key: value for key, value in data.items() if key not in ("farm_data", "reductions")}
+            formatted_prompt = prompt.format(template=json.dumps(template), raw_data=json.dumps(raw_data))
             try:
                 response = llm.invoke(formatted_prompt).content.strip()
                 
@@ -581,7 +616,7 @@ class DecisionAgent:
                 # Parse the modified template
                 modified_template = json.loads(response)
                 if isinstance(modified_template, dict):
-                    return modified_template
+                    return self._apply_computed_carbon(modified_template, data)
             except Exception as e:
                 print(f"Error tweaking carbon template values: {e}")
                 # Continue with manual merging if LLM modification fails
@@ -605,11 +640,35 @@ class DecisionAgent:
                 for key, value in data["web_carbon_trends"].items():
                     if key in template["web_carbon_trends"]:
                         template["web_carbon_trends"][key] = value
+
+            template = self._apply_computed_carbon(template, data)
         
         return template
+
+    def _apply_computed_carbon(self, template, data):
+        """Overwrite the numeric carbon fields with the values computed by the carbon engine."""
+        calculation = template.setdefault("carbon_footprint_calculation", {})
+        if not isinstance(calculation, dict):
+            calculation = template["carbon_footprint_calculation"] = {}
+        if isinstance(data.get("farm_data"), list):
+            calculation["farm_data"] = data["farm_data"]
+        if "total_carbon_footprint" in data:
+            calculation["total_carbon_footprint"] = data["total_carbon_footprint"]
+        if isinstance(data.get("reductions"), list):
+            template["reduction_insights"] = {"reductions": data["reductions"]}
+        if "emission_factors" in data:
+            template["emission_factors"] = data["emission_factors"]
+        if "prompt_compaction" in data:
+            template["prompt_compaction"] = data["prompt_compaction"]
+        return template
     
     def _format_water_json(self, data):
         """Format water data according to required template structure."""
+        # The agents' bullet formats map straight onto the template, the LLM is only a fallback
+        parsed = parse_water(data) if isinstance(data, dict) else None
+        if parsed is not None:
+            return parsed
+
         template = {
             "conservation_insights": [
                 {
@@ -718,7 +777,9 @@ class DecisionAgent:
                 "Return only the modified template as a valid JSON object. Do not include any explanation."
             )
             
-            formatted_prompt = prompt.format(template=json.dumps(template), raw_data=json.dumps(data))
+            # The per-farm rows are computed exactly by the water engine, keep them out of the prompt
+            raw_data = {key: value for key, value in data.items() if key != "farm_data"}
+            formatted_prompt = prompt.format(template=json.dumps(template), raw_data=json.dumps(raw_data))
             try:
                 response = llm.invoke(formatted_prompt).content.strip()
                 
@@ -729,7 +790,7 @@ class DecisionAgent:
                     
                 modified_template = json.loads(response)
                 if isinstance(modified_template, dict) and "conservation_insights" in modified_template:
-                    return modified_template
+                    return self._apply_computed_water(modified_template, data)
             except Exception as e:
                 print(f"Error tweaking water template values: {e}")
 
@@ -746,4 +807,18 @@ class DecisionAgent:
             if "water_conservation_strategies" in data and isinstance(data["water_conservation_strategies"], list):
                 template["water_conservation_strategies"] = data["water_conservation_strategies"]
         
+            template = self._apply_computed_water(template, data)
+
+        return template
+
+    def _apply_computed_water(self, template, data):
+        """Overwrite the numeric water fields with the values computed by the water engine."""
+        if isinstance(data.get("farm_data"), list):
+            template["farm_data"] = data["farm_data"]
+        if "total_water_usage_liters" in data:
+            template["total_water_usage_liters"] = data["total_water_usage_liters"]
+        if isinstance(data.get("water_usage_by_crop"), list):
+            template["conservation_insights"] = data["water_usage_by_crop"]
+        if "prompt_compaction" in data:
+            template["prompt_compaction"] = data["prompt_compaction"]
         return template
@@ -1,20 +1,10 @@
-from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
-from dotenv import load_dotenv
-import os
+from modules.registry import get_cached_llm
 import json
 
-load_dotenv()
-groq_api_key = os.getenv("GROQ_API_KEY")
-
-llm = ChatGroq(
-    model_name="llama3-70b-8192",
-    temperature=0.7,
-    groq_api_key=groq_api_key
-)
-
-def feedback_agent(query):
+llm = get_cached_llm("llama3-70b-8192", namespace="feedback")
 
+def _feedback_prompt(query):
     prompt_template = PromptTemplate(
         input_variables=["query"],
         template="""
@@ -31,10 +21,9 @@ def feedback_agent(query):
         """
     )
     
-    prompt = prompt_template.format(query=query)
-   
-    llm_response = llm.invoke(prompt)
+    return prompt_template.format(query=query)
 
+def _feedback_response(query, llm_response):
     try:
  
         content = llm_response.content
@@ -76,4 +65,10 @@ def feedback_agent(query):
         "success": True
     }
     
-    return response
\ No newline at end of file
+    return response
+
+def feedback_agent(query):
+    return _feedback_response(query, llm.invoke(_feedback_prompt(query)))
+
+async def afeedback_agent(query):
+    return _feedback_response(query, await llm.ainvoke(_feedback_prompt(query)))
@@ -1,50 +1,35 @@
-from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
-from langchain.schema.runnable import RunnableParallel
-from langchain_community.utilities import SQLDatabase
-from langchain_experimental.sql import SQLDatabaseChain 
-from langchain_community.tools import DuckDuckGoSearchRun
 from langchain.agents import Tool
-from dotenv import load_dotenv
-import os
+import functools
 import sys
 from pathlib import Path
 
-script_dir = Path(__file__).parent.absolute()
-db_path = script_dir.parent / "db" / "farming_memory.db"
-db = SQLDatabase.from_uri(f"sqlite:///{db_path}")
-
 sys.path.append(str(Path(__file__).parent.parent))
 from modules.query_extract_run import extract_sql_query, run_query
+from modules.sql_cache import get_sql
 from modules.memory_handler import store_crux  
+from modules.search_cache import cached
+from modules.step_dag import StepDAG
+from modules.registry import get_cached_llm, get_search, get_sql_chain
+from modules.prompt_compaction import distinct_crops
 
-load_dotenv()
-groq_api_key = os.getenv("GROQ_API_KEY")
-
-
-llm = ChatGroq(
-    model_name="llama3-70b-8192",
-    temperature=0.7,
-    groq_api_key=groq_api_key
-)
+llm = get_cached_llm("llama3-70b-8192", namespace="market")
 
-llm2 = ChatGroq(
-    model_name="llama-3.3-70b-versatile",
-    temperature=0.7,
-    groq_api_key=groq_api_key
-)
-
-search = DuckDuckGoSearchRun()
 search_tool = Tool(
     name="Web Search",
-    func=search.run,
+    func=cached(lambda query: get_search().run(query)),
     description="Useful for finding recent trends and data about crop market trends from web sources"
 )
 
-def market_trend_analyzer(crop_type):
-    querycropstr = ""
-    db_chain = SQLDatabaseChain.from_llm(llm2, db, verbose=True)
+# Steps the /stream endpoints send as soon as they finish, mapped to their key in the result
+STREAM_SECTIONS = {
+    "market_analysis": "market_analysis",
+    "top3_market_comparison": "top3_market_comparison",
+    "web_market_trends": "web_market_trends"
+}
 
+@functools.lru_cache(maxsize=None)
+def _market_trend_dag():
     # ✅ Safer prompt to avoid backticks or markdown
     query_prompt = {
         "query": """
@@ -55,15 +40,18 @@ def market_trend_analyzer(crop_type):
         """
     }
 
-    # ✅ Use invoke to avoid deprecation warning
-    qns1 = db_chain.invoke(query_prompt)
-
-    print(qns1['result'])
-    gen_query = extract_sql_query(qns1["result"])
-    querydata = run_query(gen_query)
+    def generate_sql(question):
+        db_chain = get_sql_chain()
+        # ✅ Use invoke to avoid deprecation warning
+        qns1 = db_chain.invoke({"query": question})
+        print(qns1['result'])
+        return extract_sql_query(qns1["result"])
 
-    for i in querydata:
-        querycropstr += " " + i[0]
+    def top_crops():
+        gen_query = get_sql(query_prompt["query"], generate_sql)
+        querydata = run_query(gen_query)
+        # The generated query may list every farm, so keep each crop once
+        return distinct_crops(querydata, 0)
 
     market_analysis_prompt = PromptTemplate(
         input_variables=["crop_type"],
@@ -73,6 +61,15 @@ def market_trend_analyzer(crop_type):
 
         Provide the response strictly in this format:
         - Rising or non rising index Analysis: <True (if rising)/False (if going down), reason 1 line>
+        - Parameter Trends:
+          - Market_Price_per_ton: <True (if rising)/False (if going down)>
+          - Demand_Index: <True/False>
+          - Supply_Index: <True/False>
+          - Competitor_Price_per_ton: <True/False>
+          - Economic_Indicator: <True/False>
+          - Weather_Impact_Score: <True/False>
+          - Seasonal_Factor: <True/False>
+          - Consumer_Trend_Index: <True/False>
         """
     )
 
@@ -115,23 +112,38 @@ def market_trend_analyzer(crop_type):
         """
     )
 
-    def web_market_trends_analysis(crop_type):
+    def web_search(crop_type):
         search_query = f"2024 market trends for {crop_type} compared to other crops site:.edu OR site:.gov OR site:.org"
-        search_results = search_tool.run(search_query)
-        
+        return search_tool.run(search_query)
+
+    def web_market_trends_analysis(crop_type, search_results):
         prompt = web_market_trends_prompt.format(crop_type=crop_type)
         return llm.invoke(prompt + "\n\nRecent Reports:\n" + search_results[:2000])
 
-    analysis_chain = RunnableParallel(
-        market_analysis=market_analysis_chain,
-        top3_market_comparison=top3_market_comparison_chain,
-        web_market_trends=lambda x: web_market_trends_analysis(x["crop_type"])
+    async def aweb_market_trends_analysis(crop_type, search_results):
+        prompt = web_market_trends_prompt.format(crop_type=crop_type)
+        return await llm.ainvoke(prompt + "\n\nRecent Reports:\n" + search_results[:2000])
+
+    # Only the top 3 comparison needs the SQL results, the other branches start right away
+    dag = StepDAG("market")
+    dag.add("querycropstr", top_crops)
+    dag.add(
+        "market_analysis",
+        lambda crop_type: market_analysis_chain.invoke({"crop_type": crop_type}),
+        ["crop_type"],
+        afn=lambda crop_type: market_analysis_chain.ainvoke({"crop_type": crop_type})
     )
+    dag.add(
+        "top3_market_comparison",
+        lambda crop_type, querycropstr: top3_market_comparison_chain.invoke({"crop_type": crop_type, "querycropstr": querycropstr}),
+        ["crop_type", "querycropstr"],
+        afn=lambda crop_type, querycropstr: top3_market_comparison_chain.ainvoke({"crop_type": crop_type, "querycropstr": querycropstr})
+    )
+    dag.add("search_results", web_search, ["crop_type"])
+    dag.add("web_market_trends", web_market_trends_analysis, ["crop_type", "search_results"], afn=aweb_market_trends_analysis)
+    return dag
 
-    analysis_result = analysis_chain.invoke({
-        "crop_type": crop_type,
-        "querycropstr": querycropstr.strip()
-    })
+def _market_trend_result(crop_type, analysis_result):
 
     # Store results
     store_crux("market_trend_agent_market_analysis", analysis_result["market_analysis"].content.strip(), update=True)
@@ -144,7 +156,14 @@ def market_trend_analyzer(crop_type):
     print(analysis_result["web_market_trends"].content.strip())
 
     return {
+        "crop_type": crop_type,
         "market_analysis": analysis_result["market_analysis"].content.strip(),
         "top3_market_comparison": analysis_result["top3_market_comparison"].content.strip(),
         "web_market_trends": analysis_result["web_market_trends"].content.strip()
     }
+
+def market_trend_analyzer(crop_type, on_step_complete=None):
+    return _market_trend_result(crop_type, _market_trend_dag().run(on_step_complete, crop_type=crop_type))
+
+async def amarket_trend_analyzer(crop_type, on_step_complete=None):
+    return _market_trend_result(crop_type, await _market_trend_dag().arun(on_step_complete, crop_type=crop_type))
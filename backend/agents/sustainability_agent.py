@@ -1,57 +1,49 @@
-from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
-from langchain.schema.runnable import RunnableParallel
-from langchain_community.utilities import SQLDatabase
-from langchain_experimental.sql import SQLDatabaseChain 
-from langchain_community.tools import DuckDuckGoSearchRun
 from langchain.agents import Tool
-from dotenv import load_dotenv
-import os
+import functools
 import sys
 from pathlib import Path
 
 
-script_dir = Path(__file__).parent.absolute()
-db_path = script_dir.parent / "db" / "farming_memory.db"
-db = SQLDatabase.from_uri(f"sqlite:///{db_path}")
-
-
 sys.path.append(str(Path(__file__).parent.parent))
 from modules.query_extract_run import extract_sql_query, run_query
+from modules.sql_cache import get_sql
 from modules.memory_handler import store_crux  
+from modules.search_cache import cached
+from modules.step_dag import StepDAG
+from modules.registry import get_cached_llm, get_search, get_sql_chain
+from modules.prompt_compaction import distinct_crops
 
 
-load_dotenv()
-groq_api_key = os.getenv("GROQ_API_KEY")
-
-llm = ChatGroq(
-    model_name="llama3-70b-8192",
-    temperature=0.7,
-    groq_api_key=groq_api_key
-)
+llm = get_cached_llm("llama3-70b-8192", namespace="sustainability")
 
-llm2 = ChatGroq(
-    model_name="llama-3.3-70b-versatile",
-    temperature=0.7,
-    groq_api_key=groq_api_key
-)
-
-search = DuckDuckGoSearchRun()
 search_tool = Tool(
     name="Web Search",
-    func=search.run,
+    func=cached(lambda query: get_search().run(query)),
     description="Useful for finding recent trends and data about crop sustainability from web sources"
 )
 
-def farm_advisor(crop_type):
-    querycropstr = ""
-    db_chain = SQLDatabaseChain.from_llm(llm2, db, verbose=True)
-    qns1 = db_chain("GIVE ONLY THE SQL QUERY to find the Crop_Type with respect to Crop_Yield_ton and Sustainability_Score in descending order")
-    print(qns1['result'])
-    gen_query = extract_sql_query(qns1["result"])
-    querydata = run_query(gen_query)
-    for i in querydata:
-        querycropstr = querycropstr + " " + i[0]  
+# Steps the /stream endpoints send as soon as they finish, mapped to their key in the result
+STREAM_SECTIONS = {
+    "sustainability": "sustainability_analysis",
+    "top3_comparison": "top3_comparison",
+    "web_trends": "web_trends"
+}
+
+# Built once: the prompts, chains and DAG hold no per-request state
+@functools.lru_cache(maxsize=None)
+def _farm_advisor_dag():
+    def generate_sql(question):
+        db_chain = get_sql_chain()
+        qns1 = db_chain(question)
+        print(qns1['result'])
+        return extract_sql_query(qns1["result"])
+
+    def top_crops():
+        gen_query = get_sql("GIVE ONLY THE SQL QUERY to find the Crop_Type with respect to Crop_Yield_ton and Sustainability_Score in descending order", generate_sql)
+        querydata = run_query(gen_query)
+        # One row per farm when the generated query is not grouped, only the distinct crops matter
+        return distinct_crops(querydata, 0)
 
     sustainability_analysis_prompt = PromptTemplate(
         input_variables=["crop_type"],
@@ -115,23 +107,38 @@ def farm_advisor(crop_type):
         """
     )
 
-    def web_trends_analysis(crop_type):
+    def web_search(crop_type):
         search_query = f"2024 sustainable agriculture trends {crop_type} compared to other crops best practices site:.edu OR site:.gov OR site:.org"
-        search_results = search_tool.run(search_query)
-        
+        return search_tool.run(search_query)
+
+    def web_trends_analysis(crop_type, search_results):
         prompt = web_trends_prompt.format(crop_type=crop_type)
         return llm.invoke(prompt + "\n\nRecent Reports:\n" + search_results[:2000])
 
-    analysis_chain = RunnableParallel(
-        sustainability=sustainability_analysis_chain,
-        top3_comparison=top3_comparison_chain,
-        web_trends=lambda x: web_trends_analysis(x["crop_type"])
+    async def aweb_trends_analysis(crop_type, search_results):
+        prompt = web_trends_prompt.format(crop_type=crop_type)
+        return await llm.ainvoke(prompt + "\n\nRecent Reports:\n" + search_results[:2000])
+
+    # Only the top 3 comparison needs the SQL results, the other branches start right away
+    dag = StepDAG("sustainability")
+    dag.add("querycropstr", top_crops)
+    dag.add(
+        "sustainability",
+        lambda crop_type: sustainability_analysis_chain.invoke({"crop_type": crop_type}),
+        ["crop_type"],
+        afn=lambda crop_type: sustainability_analysis_chain.ainvoke({"crop_type": crop_type})
     )
+    dag.add(
+        "top3_comparison",
+        lambda crop_type, querycropstr: top3_comparison_chain.invoke({"crop_type": crop_type, "querycropstr": querycropstr}),
+        ["crop_type", "querycropstr"],
+        afn=lambda crop_type, querycropstr: top3_comparison_chain.ainvoke({"crop_type": crop_type, "querycropstr": querycropstr})
+    )
+    dag.add("search_results", web_search, ["crop_type"])
+    dag.add("web_trends", web_trends_analysis, ["crop_type", "search_results"], afn=aweb_trends_analysis)
+    return dag
 
-    analysis_result = analysis_chain.invoke({
-        "crop_type": crop_type,
-        "querycropstr": querycropstr.strip()  
-    })
+def _farm_advisor_result(crop_type, analysis_result):
 
     store_crux("sustainability_agent", analysis_result["sustainability"].content.strip(),update=True)
     store_crux("sustainability_agent", analysis_result["top3_comparison"].content.strip(),update=True)
@@ -142,7 +149,14 @@ def farm_advisor(crop_type):
     print(analysis_result["web_trends"].content.strip())
 
     return {
+        "crop_type": crop_type,
         "sustainability_analysis": analysis_result["sustainability"].content.strip(),
         "top3_comparison": analysis_result["top3_comparison"].content.strip(),
         "web_trends": analysis_result["web_trends"].content.strip()
-    }
\ No newline at end of file
+    }
+
+def farm_advisor(crop_type, on_step_complete=None):
+    return _farm_advisor_result(crop_type, _farm_advisor_dag().run(on_step_complete, crop_type=crop_type))
+
+async def afarm_advisor(crop_type, on_step_complete=None):
+    return _farm_advisor_result(crop_type, await _farm_advisor_dag().arun(on_step_complete, crop_type=crop_type))
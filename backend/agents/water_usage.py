@@ -1,95 +1,75 @@
-from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
-from langchain.schema.runnable import RunnableParallel
-from langchain_community.utilities import SQLDatabase
-from langchain_experimental.sql import SQLDatabaseChain 
-from langchain_community.tools import DuckDuckGoSearchRun
 from langchain.agents import Tool
-from dotenv import load_dotenv
-import os
+import functools
 import sys
 from pathlib import Path
 
-script_dir = Path(__file__).parent.absolute()
-db_path = script_dir.parent / "db" / "farming_memory.db"
-db = SQLDatabase.from_uri(f"sqlite:///{db_path}")
-
 sys.path.append(str(Path(__file__).parent.parent))
 from modules.query_extract_run import extract_sql_query, run_query
+from modules.sql_cache import get_sql
 from modules.memory_handler import store_crux  
+from modules.search_cache import cached
+from modules.step_dag import StepDAG
+from modules.registry import get_cached_llm, get_search, get_sql_chain
+from modules.water_engine import compute_water_usage, summarize_water_usage
+from modules.prompt_compaction import compact_context, compaction_report, distinct_crops
 
-load_dotenv()
-groq_api_key = os.getenv("GROQ_API_KEY")
-
-llm = ChatGroq(
-    model_name="llama3-70b-8192",
-    temperature=0.7,
-    groq_api_key=groq_api_key
-)
-
-llm2 = ChatGroq(
-    model_name="llama-3.3-70b-versatile",
-    temperature=0.7,
-    groq_api_key=groq_api_key
-)
+llm = get_cached_llm("llama3-70b-8192", namespace="water")
 
-search = DuckDuckGoSearchRun()
 search_tool = Tool(
     name="Web Search",
-    func=search.run,
+    func=cached(lambda query: get_search().run(query)),
     description="Useful for finding recent data on water usage and conservation strategies in farming"
 )
 
-def water_usage_tracker_agent():
-    db_chain = SQLDatabaseChain.from_llm(llm2, db, verbose=True)
-    qns1 = db_chain("GIVE ONLY THE SQL QUERY to select Farm_ID, Crop_Type, Soil_Moisture, Rainfall_mm from farmer_advisor")
-    gen_query = extract_sql_query(qns1["result"])
-    farm_data = run_query(gen_query)
-    farm_str = " ".join([row[1] for row in farm_data])  
+# Steps the /stream endpoints send as soon as they finish, mapped to their key in the result
+STREAM_SECTIONS = {
+    "water_calc": "water_usage_calculation",
+    "conservation_insights": "conservation_insights",
+    "web_water_trends": "web_water_trends"
+}
+
+@functools.lru_cache(maxsize=None)
+def _water_dag():
+    def generate_sql(question):
+        db_chain = get_sql_chain()
+        qns1 = db_chain(question)
+        return extract_sql_query(qns1["result"])
+
+    def farm_rows():
+        gen_query = get_sql("GIVE ONLY THE SQL QUERY to select Farm_ID, Crop_Type, Soil_Moisture, Rainfall_mm from farmer_advisor", generate_sql)
+        return run_query(gen_query)
 
     water_calc_prompt = PromptTemplate(
-        input_variables=["farm_data"],
+        input_variables=["water_summary"],
         template="""
-        Given the following farm data from the farmer_advisor table: {farm_data}
-        Calculate the estimated water usage (in liters) for each farm based on:
-        - Soil_Moisture (%): Lower moisture increases irrigation needs
-        - Rainfall_mm: Higher rainfall reduces irrigation needs
-        - Crop_Type: Use approximate water needs (Wheat: 500 mm, Soybean: 450 mm, Corn: 600 mm, Rice: 1200 mm over growing season)
-        
-        Assumptions:
-        - Irrigation needed = Crop water need - Rainfall_mm
-        - If Soil_Moisture < 20%, increase irrigation by 20%
-        - Convert mm to liters assuming 1 mm = 10,000 liters/ha, assume 1 ha per farm
-        - If irrigation needed is negative, use 0
+        The irrigation water usage of the farms in the farmer_advisor table has already been calculated
+        (irrigation = crop water need - Rainfall_mm, +20% when Soil_Moisture < 20%, 1 mm = 10,000 liters/ha, 1 ha per farm):
+        {water_summary}
         
-        Do NOT generate Python code. Perform the calculations directly and provide the response strictly in this format:
-        - Farm Data: <list of (Farm_ID, Crop_Type, Water_Usage in liters)>
-        - Total Water Usage: <sum of all water usage in liters>
+        Do NOT recalculate or change any number. Narrate these results and provide the response strictly in this format:
+        - Summary: <2-3 lines describing which crops drive water usage and why>
+        - Total Water Usage: <total water usage in liters exactly as given>
         """
     )
 
     water_calc_chain = water_calc_prompt | llm
 
     conservation_insights_prompt = PromptTemplate(
-        input_variables=["farm_data"],
+        input_variables=["water_summary"],
         template="""
-        For the following farm data: {farm_data}
-        Provide water conservation insights based on Soil_Moisture, Rainfall_mm, and Crop_Type:
-        - If Soil_Moisture < 20%, suggest "Implement drip irrigation to reduce water use by 30%"
-        - If Rainfall_mm < 100, suggest "Use rainwater harvesting to supplement by 20%"
-        - If Crop_Type is Rice, suggest "Adopt alternate wetting and drying (AWD) to save 25%"
-        
-        Calculate potential water savings in liters:
-        - Drip irrigation: 30% of water usage
-        - Rainwater harvesting: 20% of water usage
-        - AWD for Rice: 25% of water usage
+        For the following computed water usage and potential savings per crop: {water_summary}
+        The strategies were applied with these rules:
+        - If Soil_Moisture < 20%, "Implement drip irrigation to reduce water use by 30%"
+        - If Rainfall_mm < 100, "Use rainwater harvesting to supplement by 20%"
+        - If Crop_Type is Rice, "Adopt alternate wetting and drying (AWD) to save 25%"
         
+        Do NOT recalculate or change any number.
         Provide the response strictly in this format avoid giving same crops give for differnt types:
         - Conservation Insights:
-          - <Farm_ID>:
-            - Crop_Type: <crop>
+          - <Crop_Type>:
             - Insights: <only 1 line of applicable strategies>
-            - Estimated_Savings: <total savings in liters>
+            - Estimated_Savings: <total savings in liters exactly as given>
         """
     )
 
@@ -114,40 +94,73 @@ def water_usage_tracker_agent():
         """
     )
 
-    def web_water_trends_analysis(farm_str):
+    def web_search(farm_str):
         search_query = f"2024 water conservation strategies for farming crops like {farm_str} site:.edu OR site:.gov OR site:.org"
-        search_results = search_tool.run(search_query)
-        
+        return search_tool.run(search_query)
+
+    def web_water_trends_analysis(farm_str, search_results):
         prompt = web_water_trends_prompt.format(farm_str=farm_str)
         return llm.invoke(prompt + "\n\nRecent Reports:\n" + search_results[:2000])
 
-    analysis_chain = RunnableParallel(
-        water_calc=water_calc_chain,
-        conservation_insights=conservation_insights_chain,
-        web_water_trends=lambda x: web_water_trends_analysis(x["farm_str"])
+    async def aweb_water_trends_analysis(farm_str, search_results):
+        prompt = web_water_trends_prompt.format(farm_str=farm_str)
+        return await llm.ainvoke(prompt + "\n\nRecent Reports:\n" + search_results[:2000])
+
+    # The web search only needs the crop list, so it overlaps the water calculation
+    dag = StepDAG("water")
+    dag.add("farm_data", farm_rows)
+    dag.add("farm_str", lambda farm_data: distinct_crops(farm_data), ["farm_data"])
+    dag.add("water_result", compute_water_usage, ["farm_data"])
+    # Prompts get per-crop totals plus a farm digest, together bounded by PROMPT_TOKEN_BUDGET, never the raw rows
+    dag.add(
+        "water_summary",
+        lambda water_result: compact_context(summarize_water_usage(water_result), water_result["farm_data"], ["soil_moisture", "rainfall_mm", "water_usage_liters"], "water_usage_liters"),
+        ["water_result"]
     )
+    dag.add("prompt_compaction", lambda farm_data, water_summary: compaction_report(farm_data, water_summary), ["farm_data", "water_summary"])
+    dag.add(
+        "water_calc",
+        lambda water_summary: water_calc_chain.invoke({"water_summary": water_summary}),
+        ["water_summary"],
+        afn=lambda water_summary: water_calc_chain.ainvoke({"water_summary": water_summary})
+    )
+    dag.add(
+        "conservation_insights",
+        lambda water_summary: conservation_insights_chain.invoke({"water_summary": water_summary}),
+        ["water_summary"],
+        afn=lambda water_summary: conservation_insights_chain.ainvoke({"water_summary": water_summary})
+    )
+    dag.add("search_results", web_search, ["farm_str"])
+    dag.add("web_water_trends", web_water_trends_analysis, ["farm_str", "search_results"], afn=aweb_water_trends_analysis)
+    return dag
 
-    farm_data_str = str(farm_data)  
-    analysis_result = analysis_chain.invoke({
-        "farm_data": farm_data_str,
-        "farm_str": farm_str
-    })
+def _water_result(analysis_result):
+    water_result = analysis_result["water_result"]
+    water_summary = analysis_result["water_summary"]
 
     # Store key insights into memory (update instead of adding new rows)
-    store_crux("water_usage_agent_farm_data", farm_data, update=True)
+    store_crux("water_usage_agent_farm_data", water_summary, update=True)
     store_crux("water_usage_agent_calculation", analysis_result["water_calc"].content.strip(), update=True)
     store_crux("water_usage_agent_conservation", analysis_result["conservation_insights"].content.strip(), update=True)
     store_crux("water_usage_agent_trends", analysis_result["web_water_trends"].content.strip(), update=True)
 
-    print("Farm Data:", farm_data)
+    print("Water Usage Summary:", water_summary)
     print("Water Usage Calculation:", analysis_result["water_calc"].content.strip())
     print("Conservation Insights:", analysis_result["conservation_insights"].content.strip())
     print("Web Water Trends:", analysis_result["web_water_trends"].content.strip())
 
     return {
-        "farm_data": farm_data,
+        "farm_data": water_result["farm_data"],
+        "total_water_usage_liters": water_result["total_water_usage_liters"],
+        "water_usage_by_crop": water_result["conservation_insights"],
+        "prompt_compaction": analysis_result["prompt_compaction"],
         "water_usage_calculation": analysis_result["water_calc"].content.strip(),
         "conservation_insights": analysis_result["conservation_insights"].content.strip(),
         "web_water_trends": analysis_result["web_water_trends"].content.strip()
     }
 
+def water_usage_tracker_agent(on_step_complete=None):
+    return _water_result(_water_dag().run(on_step_complete))
+
+async def awater_usage_tracker_agent(on_step_complete=None):
+    return _water_result(await _water_dag().arun(on_step_complete))
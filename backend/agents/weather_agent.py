@@ -1,37 +1,32 @@
-from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
-from langchain.schema.runnable import RunnableParallel
-from langchain_community.utilities import SQLDatabase
-from langchain_experimental.sql import SQLDatabaseChain 
 from dotenv import load_dotenv
 import os
 import json
+import functools
 import sys
 import os
 from pathlib import Path
 
-script_dir = Path(__file__).parent.absolute()
-db_path = script_dir.parent / "db" / "farming_memory.db"
-db = SQLDatabase.from_uri(f"sqlite:///{db_path}")
-
-
 sys.path.append(str(Path(__file__).parent.parent))
 from modules.query_extract_run import extract_sql_query, run_query
-from modules.weather_fetcher import fetcher
+from modules.sql_cache import get_sql
+from modules.weather_fetcher import fetcher, afetcher, fetch_many, afetch_many
 from modules.memory_handler import store_crux  
+from modules.registry import get_cached_llm, get_sql_chain
+from modules.step_dag import StepDAG
+from modules.weather_classifier import classify_weather, format_condition, format_recommendation
 
 load_dotenv()
-groq_api_key = os.getenv("GROQ_API_KEY")
-
 
+llm = get_cached_llm("llama-3.3-70b-versatile", namespace="weather")
 
-llm = ChatGroq(
-    model_name="llama-3.3-70b-versatile",
-    temperature=0.7,
-    groq_api_key=groq_api_key
-)
+# Simultaneous LLM calls when classifying a batch of locations
+BATCH_LLM_CONCURRENCY = int(os.getenv("WEATHER_BATCH_LLM_CONCURRENCY", "4"))
+# Classify with the LLM instead of the rule-based WMO classifier
+USE_LLM = os.getenv("WEATHER_USE_LLM", "").lower() in ("1", "true", "yes")
 
-def w_agent(location):
+@functools.lru_cache(maxsize=None)
+def _weather_chains():
     weather_classification_prompt = PromptTemplate(
         input_variables=["weather_data"],
         template="""
@@ -60,31 +55,139 @@ def w_agent(location):
 
     crop_recommendation_chain = crop_recommendation_prompt | llm
 
-    weather_to_crop_chain = RunnableParallel(
-        weather_condition=weather_classification_chain
-    )
-
-    sample_weather_data = fetcher(location)
-
-    weather_result = weather_to_crop_chain.invoke({"weather_data": json.dumps(sample_weather_data, indent=2)})
-
-    weather_condition = weather_result["weather_condition"].content.strip()
-
-    crop_result = crop_recommendation_chain.invoke({"weather_condition": weather_condition})
-
-    db_chain = SQLDatabaseChain.from_llm(llm, db, verbose=True)
-    qns1 = db_chain("Find the Crop_Type with respect to Crop_Yield_ton and Sustainability_Score in descending order")
-    print(qns1["result"])
-    gen_query = extract_sql_query(qns1["result"])
-    querydata = run_query(gen_query)
+    return weather_classification_chain, crop_recommendation_chain
+
+def _classify(weather_data):
+    """Rule-based (condition, crop recommendation) strings in the format the LLM prompts ask for."""
+    condition, explanation = classify_weather(weather_data)
+    return format_condition(condition, explanation), format_recommendation(condition)
+
+# One DAG per use_llm setting, reused across requests
+@functools.lru_cache(maxsize=None)
+def _w_agent_dag(use_llm):
+    def generate_sql(question):
+        db_chain = get_sql_chain()
+        qns1 = db_chain(question)
+        print(qns1["result"])
+        return extract_sql_query(qns1["result"])
+
+    def query_data():
+        gen_query = get_sql("Find the Crop_Type with respect to Crop_Yield_ton and Sustainability_Score in descending order", generate_sql)
+        return run_query(gen_query)
+
+    # The SQL branch does not depend on the weather, so it runs alongside the forecast fetch
+    dag = StepDAG("weather")
+    dag.add("weather_data", fetcher, ["location"], afn=afetcher)
+    dag.add("query_data", query_data)
+    if use_llm:
+        weather_classification_chain, crop_recommendation_chain = _weather_chains()
+
+        async def aclassify(weather_data):
+            response = await weather_classification_chain.ainvoke({"weather_data": json.dumps(weather_data, indent=2)})
+            return response.content.strip()
+
+        async def arecommend(weather_condition):
+            response = await crop_recommendation_chain.ainvoke({"weather_condition": weather_condition})
+            return response.content.strip()
+
+        dag.add(
+            "weather_condition",
+            lambda weather_data: weather_classification_chain.invoke({"weather_data": json.dumps(weather_data, indent=2)}).content.strip(),
+            ["weather_data"],
+            afn=aclassify
+        )
+        dag.add(
+            "crop_recommendation",
+            lambda weather_condition: crop_recommendation_chain.invoke({"weather_condition": weather_condition}).content.strip(),
+            ["weather_condition"],
+            afn=arecommend
+        )
+    else:
+        dag.add("classification", _classify, ["weather_data"])
+    return dag
+
+def _w_agent_result(result, use_llm):
+    if use_llm:
+        weather_condition, crop_recommendation = result["weather_condition"], result["crop_recommendation"]
+    else:
+        weather_condition, crop_recommendation = result["classification"]
+    querydata = result["query_data"]
 
     store_crux("weather_agent_weather_condition", weather_condition, update=True)
-    store_crux("weather_agent_crop_recommendation", crop_result.content.strip(), update=True)
+    store_crux("weather_agent_crop_recommendation", crop_recommendation, update=True)
 
-    print("weather_condition=", weather_condition, "crop_recommendation=", crop_result.content.strip(), "query_data=", querydata)
+    print("weather_condition=", weather_condition, "crop_recommendation=", crop_recommendation, "query_data=", querydata)
 
     return {
         "weather_condition": weather_condition,
-        "crop_recommendation": crop_result.content.strip(),
+        "crop_recommendation": crop_recommendation,
         "query_data": querydata
     }
+
+def w_agent(location, use_llm=None):
+    if use_llm is None:
+        use_llm = USE_LLM
+    return _w_agent_result(_w_agent_dag(use_llm).run(location=location), use_llm)
+
+async def aw_agent(location, use_llm=None):
+    if use_llm is None:
+        use_llm = USE_LLM
+    return _w_agent_result(await _w_agent_dag(use_llm).arun(location=location), use_llm)
+
+def _batch_result(forecasts, classified):
+    classified = iter(classified)
+    results = []
+    for forecast in forecasts:
+        if "error" in forecast:
+            results.append(forecast)
+            continue
+        weather_condition, crop_recommendation = next(classified)
+        results.append({
+            "location": forecast["location"],
+            "forecast": forecast["forecast"],
+            "weather_condition": weather_condition,
+            "crop_recommendation": crop_recommendation
+        })
+
+    return {"locations": results}
+
+def w_agent_batch(locations, use_llm=None):
+    """Fetch forecasts for many locations concurrently and classify each one."""
+    if use_llm is None:
+        use_llm = USE_LLM
+    forecasts = fetch_many(locations)
+    fetched = [forecast for forecast in forecasts if "error" not in forecast]
+
+    if not use_llm:
+        return _batch_result(forecasts, [_classify(forecast) for forecast in fetched])
+
+    weather_classification_chain, crop_recommendation_chain = _weather_chains()
+    config = {"max_concurrency": BATCH_LLM_CONCURRENCY}
+    conditions = weather_classification_chain.batch(
+        [{"weather_data": json.dumps(forecast, indent=2)} for forecast in fetched], config
+    )
+    conditions = [condition.content.strip() for condition in conditions]
+    crops = crop_recommendation_chain.batch(
+        [{"weather_condition": condition} for condition in conditions], config
+    )
+    return _batch_result(forecasts, zip(conditions, [crop.content.strip() for crop in crops]))
+
+async def aw_agent_batch(locations, use_llm=None):
+    if use_llm is None:
+        use_llm = USE_LLM
+    forecasts = await afetch_many(locations)
+    fetched = [forecast for forecast in forecasts if "error" not in forecast]
+
+    if not use_llm:
+        return _batch_result(forecasts, [_classify(forecast) for forecast in fetched])
+
+    weather_classification_chain, crop_recommendation_chain = _weather_chains()
+    config = {"max_concurrency": BATCH_LLM_CONCURRENCY}
+    conditions = await weather_classification_chain.abatch(
+        [{"weather_data": json.dumps(forecast, indent=2)} for forecast in fetched], config
+    )
+    conditions = [condition.content.strip() for condition in conditions]
+    crops = await crop_recommendation_chain.abatch(
+        [{"weather_condition": condition} for condition in conditions], config
+    )
+    return _batch_result(forecasts, zip(conditions, [crop.content.strip() for crop in crops]))
@@ -0,0 +1,367 @@
+"""Async (aiohttp) serving mode with the same routes and response shapes as main.py.
+
+Agent pipelines are awaited instead of holding a thread per request, so a single
+process can keep hundreds of analyses in flight while they wait on Groq,
+DuckDuckGo and Open-Meteo. Run with ``python async_server.py``.
+"""
+import asyncio
+import functools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from agents.sustainability_agent import farm_advisor, afarm_advisor, STREAM_SECTIONS as sustainability_sections
+from agents.weather_agent import aw_agent, aw_agent_batch
+from agents.market_trend_agent import market_trend_analyzer, amarket_trend_analyzer, STREAM_SECTIONS as market_sections
+from agents.carbon_footprint_agent import carbon_footprint_analyzer, acarbon_footprint_analyzer, STREAM_SECTIONS as carbon_sections
+from agents.water_usage import water_usage_tracker_agent, awater_usage_tracker_agent, STREAM_SECTIONS as water_sections
+from agents.feedback_agent import afeedback_agent
+from agents.decision_agent import DecisionAgent
+from modules.auth_handler import register_user, login_user
+from modules.ticket_handler import create_ticket, get_all_tickets
+from modules.response_handler import get_responses
+from modules.sql_cache import sql_cache_stats
+from modules.llm_cache import llm_cache_stats, bypass_cache
+from modules.memory_handler import memory_queue_stats
+from modules.weather_fetcher import geocode_cache_stats, forecast_cache_stats, aclose_client, uncached_locations
+from modules.step_dag import dag_stats
+from modules.search_cache import search_cache_stats
+from modules.registry import registry_stats
+from modules.rate_governor import rate_governor_stats
+from modules.cassette import cassette_stats
+from modules.snapshot_store import register_snapshot, aserve_snapshot, cached_snapshot, save_snapshot, start_scheduler, snapshot_stats, farm_crop_types, GLOBAL_KEY
+from modules.request_coalescing import acoalesce, coalescing_stats
+from modules.agent_stream import SSE_HEADERS, sse_event, astream_sections
+
+db_path = os.path.join(os.path.dirname(__file__), 'db', 'memory.db')
+decision_agent = DecisionAgent(db_path)
+
+WEATHER_BATCH_LIMIT = int(os.getenv("WEATHER_BATCH_LIMIT", "100"))
+# Each location missing from the geocode cache costs a second of Nominatim's rate limit
+WEATHER_BATCH_UNCACHED_LIMIT = int(os.getenv("WEATHER_BATCH_UNCACHED_LIMIT", "10"))
+# Worker threads for the blocking pieces (SQLite, SQL generation, web search)
+ASYNC_WORKER_THREADS = int(os.getenv("ASYNC_WORKER_THREADS", "64"))
+
+# Background refreshes run the blocking agents in scheduler threads, misses await the async ones
+register_snapshot("sustainability", lambda crop_type: decision_agent.analyze_and_clean(farm_advisor(crop_type), "sustainability"), keys=farm_crop_types)
+register_snapshot("market", lambda crop_type: decision_agent.analyze_and_clean(market_trend_analyzer(crop_type), "market"), keys=farm_crop_types)
+register_snapshot("carbon", lambda: decision_agent.analyze_and_clean(carbon_footprint_analyzer(), "carbon"))
+register_snapshot("water", lambda: decision_agent.analyze_and_clean(water_usage_tracker_agent(), "water"))
+
+routes = web.RouteTableDef()
+refresh_task_key = web.AppKey("refresh_task", asyncio.Task)
+response_cache = {}
+
+
+def jsonify(data, status=200):
+    # Sorted keys, like Flask's jsonify
+    return web.json_response(data, status=status, dumps=functools.partial(json.dumps, sort_keys=True))
+
+
+async def json_body(request):
+    try:
+        data = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+async def analyze(agent_result, sender):
+    return await decision_agent.aanalyze_and_clean(await agent_result, sender)
+
+
+def refresh_requested(request):
+    return request.query.get('refresh', '').lower() in ('1', 'true', 'yes')
+
+
+async def stream_analysis(request, endpoint, key, sections, aagent):
+    """Server-sent events like main.stream_analysis, awaiting aagent(on_step_complete) on a miss."""
+    refresh = refresh_requested(request)
+    cached = None if refresh else (await asyncio.to_thread(cached_snapshot, endpoint, key))[0]
+
+    async def run(on_step_complete):
+        with bypass_cache(refresh):
+            result = await analyze(aagent(on_step_complete), endpoint)
+        await asyncio.to_thread(save_snapshot, endpoint, key, result)
+        return result
+
+    response = web.StreamResponse(headers={**SSE_HEADERS, 'Content-Type': 'text/event-stream'})
+    await response.prepare(request)
+    if cached is not None:
+        await response.write(sse_event("result", cached).encode())
+    else:
+        async for event, data in astream_sections(run, sections):
+            await response.write(sse_event(event, data).encode())
+    await response.write_eof()
+    return response
+
+
+async def refresh_cache(app):
+    """Background task to refresh the response cache every 5 seconds."""
+    global response_cache
+    file_path = os.path.join(os.path.dirname(__file__), 'db', 'response.json')
+    while True:
+        try:
+            response_cache = await asyncio.to_thread(_read_json, file_path)
+        except Exception as e:
+            print(f"Error refreshing cache: {e}")
+        await asyncio.sleep(5)
+
+
+def _read_json(file_path):
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+
+@routes.get('/')
+async def health_check(request):
+    return jsonify({"status": "alive", "message": "Service is running"})
+
+
+@routes.get('/cached-response')
+async def get_cached_response(request):
+    if response_cache:
+        return jsonify({"success": True, "data": response_cache})
+    return jsonify({"success": False, "message": "Cache is empty"}, 500)
+
+
+@routes.get('/metrics')
+async def metrics(request):
+    return jsonify({
+        "sql_cache": sql_cache_stats(),
+        "llm_cache": llm_cache_stats(),
+        "memory_queue": memory_queue_stats(),
+        "geocode_cache": geocode_cache_stats(),
+        "forecast_cache": forecast_cache_stats(),
+        "search_cache": search_cache_stats(),
+        "snapshots": snapshot_stats(),
+        "coalescing": coalescing_stats(),
+        "registry": registry_stats(),
+        "rate_governor": rate_governor_stats(),
+        "cassette": cassette_stats(),
+        "agent_steps": dag_stats()
+    })
+
+
+@routes.get('/weather')
+async def weather(request):
+    location = request.query.get('location', 'Kolkata')
+    refresh = refresh_requested(request)
+    with bypass_cache(refresh):
+        cleaned_result = await acoalesce(
+            "weather",
+            {"location": location, "refresh": refresh},
+            lambda: analyze(aw_agent(location), "weather")
+        )
+    if "error" in cleaned_result:
+        print(f"Error in DecisionAgent: {cleaned_result['raw_response']}")
+        return jsonify({"status": "error", "message": cleaned_result["error"], "details": cleaned_result["raw_response"]}, 500)
+    return jsonify(cleaned_result)
+
+
+@routes.route('*', '/weather/batch')
+async def weather_batch(request):
+    if request.method == 'POST':
+        locations = (await json_body(request)).get('locations', [])
+    elif request.method == 'GET':
+        locations = request.query.getall('location', [])
+    else:
+        raise web.HTTPMethodNotAllowed(request.method, ['GET', 'POST'])
+
+    locations = [location.strip() for location in locations if isinstance(location, str) and location.strip()]
+    if not locations:
+        return jsonify({"status": "error", "message": "At least one location is required"}, 400)
+    if len(locations) > WEATHER_BATCH_LIMIT:
+        return jsonify({"status": "error", "message": f"At most {WEATHER_BATCH_LIMIT} locations per batch"}, 400)
+    uncached = await asyncio.to_thread(uncached_locations, locations)
+    if len(uncached) > WEATHER_BATCH_UNCACHED_LIMIT:
+        return jsonify({"status": "error", "message": f"{len(uncached)} locations are not geocoded yet, at most {WEATHER_BATCH_UNCACHED_LIMIT} per batch; seed them with python -m modules.weather_fetcher"}, 400)
+
+    with bypass_cache(refresh_requested(request)):
+        result = await aw_agent_batch(locations)
+    return jsonify(result)
+
+
+@routes.get('/sustainability')
+async def sustainability(request):
+    crop_type = request.query.get('crop_type', 'Wheat')
+    refresh = refresh_requested(request)
+    with bypass_cache(refresh):
+        cleaned_result = await acoalesce(
+            "sustainability",
+            {"crop_type": crop_type, "refresh": refresh},
+            lambda: aserve_snapshot("sustainability", crop_type, lambda: analyze(afarm_advisor(crop_type), "sustainability"), refresh=refresh)
+        )
+    return jsonify(cleaned_result)
+
+
+@routes.get('/market-trends')
+async def market_trends(request):
+    crop_type = request.query.get('crop_type', 'Wheat')
+    refresh = refresh_requested(request)
+    with bypass_cache(refresh):
+        cleaned_result = await acoalesce(
+            "market",
+            {"crop_type": crop_type, "refresh": refresh},
+            lambda: aserve_snapshot("market", crop_type, lambda: analyze(amarket_trend_analyzer(crop_type), "market"), refresh=refresh)
+        )
+    return jsonify(cleaned_result)
+
+
+@routes.get('/carbon-footprint')
+async def carbon_footprint(request):
+    refresh = refresh_requested(request)
+    with bypass_cache(refresh):
+        cleaned_result = await acoalesce(
+            "carbon",
+            {"refresh": refresh},
+            lambda: aserve_snapshot("carbon", acompute=lambda: analyze(acarbon_footprint_analyzer(), "carbon"), refresh=refresh)
+        )
+    return jsonify(cleaned_result)
+
+
+@routes.get('/water-usage')
+async def water_usage(request):
+    refresh = refresh_requested(request)
+    with bypass_cache(refresh):
+        cleaned_result = await acoalesce(
+            "water",
+            {"refresh": refresh},
+            lambda: aserve_snapshot("water", acompute=lambda: analyze(awater_usage_tracker_agent(), "water"), refresh=refresh)
+        )
+    return jsonify(cleaned_result)
+
+
+@routes.get('/sustainability/stream')
+async def sustainability_stream(request):
+    crop_type = request.query.get('crop_type', 'Wheat')
+    return await stream_analysis(request, "sustainability", crop_type, sustainability_sections, lambda on_step_complete: afarm_advisor(crop_type, on_step_complete))
+
+
+@routes.get('/market-trends/stream')
+async def market_trends_stream(request):
+    crop_type = request.query.get('crop_type', 'Wheat')
+    return await stream_analysis(request, "market", crop_type, market_sections, lambda on_step_complete: amarket_trend_analyzer(crop_type, on_step_complete))
+
+
+@routes.get('/carbon-footprint/stream')
+async def carbon_footprint_stream(request):
+    return await stream_analysis(request, "carbon", GLOBAL_KEY, carbon_sections, acarbon_footprint_analyzer)
+
+
+@routes.get('/water-usage/stream')
+async def water_usage_stream(request):
+    return await stream_analysis(request, "water", GLOBAL_KEY, water_sections, awater_usage_tracker_agent)
+
+
+@routes.route('*', '/feedback')
+async def process_feedback(request):
+    if request.method == 'POST':
+        query = (await json_body(request)).get('query', '')
+        if not query:
+            return jsonify({"success": False, "message": "Query is required"}, 400)
+    elif request.method == 'GET':
+        query = request.query.get('query', '')
+        if not query:
+            return jsonify({"success": False, "message": "Query parameter is required"}, 400)
+    else:
+        raise web.HTTPMethodNotAllowed(request.method, ['GET', 'POST'])
+
+    result = await afeedback_agent(query)
+    return jsonify({"success": True, "data": result})
+
+
+@routes.post('/api/register')
+async def register(request):
+    data = await json_body(request)
+    name = data.get('name', '')
+    email = data.get('email', '')
+    password = data.get('password', '')
+
+    if not all([name, email, password]):
+        return jsonify({"success": False, "message": "All fields are required"}, 400)
+
+    result = await asyncio.to_thread(register_user, name, email, password)
+    return jsonify(result, 201 if result["success"] else 400)
+
+
+@routes.post('/api/login')
+async def login(request):
+    data = await json_body(request)
+    email = data.get('email', '')
+    password = data.get('password', '')
+
+    if not all([email, password]):
+        return jsonify({"success": False, "message": "Email and password are required"}, 400)
+
+    result = await asyncio.to_thread(login_user, email, password)
+    return jsonify(result, 200 if result["success"] else 401)
+
+
+@routes.route('*', '/api/tickets')
+async def tickets(request):
+    if request.method == 'POST':
+        data = await json_body(request)
+        user_id = data.get('user_id', '')
+        title = data.get('title', '')
+        description = data.get('description', '')
+
+        if not all([user_id, title, description]):
+            return jsonify({"success": False, "message": "All fields are required"}, 400)
+
+        result = await asyncio.to_thread(create_ticket, user_id, title, description)
+        return jsonify(result, 201 if result["success"] else 400)
+    if request.method == 'GET':
+        tickets = await asyncio.to_thread(get_all_tickets)
+        return jsonify({"success": True, "tickets": tickets})
+    raise web.HTTPMethodNotAllowed(request.method, ['GET', 'POST'])
+
+
+@routes.get('/api/responses')
+async def responses(request):
+    responses = await asyncio.to_thread(get_responses)
+    if responses:
+        return jsonify({"success": True, "responses": responses})
+    return jsonify({"success": False, "message": "No responses found"}, 404)
+
+
+@web.middleware
+async def cors(request, handler):
+    # Same open CORS policy as flask_cors' CORS(app)
+    if request.method == 'OPTIONS':
+        response = web.Response()
+        response.headers['Access-Control-Allow-Methods'] = request.headers.get('Access-Control-Request-Method', '*')
+        response.headers['Access-Control-Allow-Headers'] = request.headers.get('Access-Control-Request-Headers', '*')
+        return response
+    return await handler(request)
+
+
+async def cors_headers(request, response):
+    # Added as the response is prepared so streamed responses get it too
+    response.headers['Access-Control-Allow-Origin'] = '*'
+
+
+async def on_startup(app):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=ASYNC_WORKER_THREADS))
+    app[refresh_task_key] = asyncio.create_task(refresh_cache(app))
+    if os.getenv("SNAPSHOT_SCHEDULER", "1").lower() not in ("0", "false", "no"):
+        start_scheduler()
+
+
+async def on_cleanup(app):
+    app[refresh_task_key].cancel()
+    await aclose_client()
+
+
+def create_app():
+    app = web.Application(middlewares=[cors])
+    app.add_routes(routes)
+    app.on_response_prepare.append(cors_headers)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host='0.0.0.0', port=int(os.getenv("PORT", "5000")))
@@ -0,0 +1,145 @@
+"""Per-request CPU time and allocation peak of the agents, with and without reusing their pipelines.
+
+The LLM, web search, SQL generation and forecast fetch are replaced by instant
+stubs, so what is left is the agents' own work: building (or reusing) prompts,
+chains and the step DAG, running it and shaping the result.
+
+    python benchmarks/chain_build_bench.py --requests 50
+
+"rebuild" clears the agents' memoized builders before every request, which is
+what each request used to pay; "reuse" keeps them.
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+os.environ.setdefault("GROQ_API_KEY", "chain-build-bench")
+sys.path.append(str(Path(__file__).parent.parent))
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from modules import db_manager, llm_cache
+import agents.sustainability_agent as sustainability_agent
+import agents.market_trend_agent as market_trend_agent
+import agents.carbon_footprint_agent as carbon_footprint_agent
+import agents.water_usage as water_usage
+import agents.weather_agent as weather_agent
+
+CROP_QUERY = "SELECT DISTINCT Crop_Type FROM farm_advisory"
+FARM_QUERY = "SELECT Farm_ID, Crop_Type, {} FROM farm_advisory LIMIT {}"
+
+# (name, one request, memoized builders, a call that builds everything a request needs)
+AGENTS = [
+    ("sustainability", lambda: sustainability_agent.farm_advisor("Wheat"), [sustainability_agent._farm_advisor_dag], sustainability_agent._farm_advisor_dag),
+    ("market", lambda: market_trend_agent.market_trend_analyzer("Wheat"), [market_trend_agent._market_trend_dag], market_trend_agent._market_trend_dag),
+    ("carbon", carbon_footprint_agent.carbon_footprint_analyzer, [carbon_footprint_agent._carbon_dag], carbon_footprint_agent._carbon_dag),
+    ("water", water_usage.water_usage_tracker_agent, [water_usage._water_dag], water_usage._water_dag),
+    (
+        "weather",
+        lambda: weather_agent.w_agent("Kolkata", use_llm=True),
+        [weather_agent._w_agent_dag, weather_agent._weather_chains],
+        lambda: weather_agent._w_agent_dag(True)
+    )
+]
+
+
+def _stub(rows):
+    llm_cache.CACHE_DISABLED = True
+    carbon_query = FARM_QUERY.format("Fertilizer_Usage_kg, Pesticide_Usage_kg", rows)
+    water_query = FARM_QUERY.format("Soil_Moisture, Rainfall_mm", rows)
+    for module, query in [
+        (sustainability_agent, CROP_QUERY),
+        (market_trend_agent, CROP_QUERY),
+        (carbon_footprint_agent, carbon_query),
+        (water_usage, water_query),
+        (weather_agent, CROP_QUERY)
+    ]:
+        module.llm.client = FakeListChatModel(responses=["- Analysis: stub"])
+        module.get_sql = lambda question, generate, query=query: query
+        module.store_crux = lambda *args, **kwargs: None
+        if hasattr(module, "search_tool"):
+            module.search_tool.func = lambda query: "stub search results"
+    weather_agent.fetcher = lambda location: {"location": location, "forecast": []}
+
+
+def _measure(call, builders, requests, rebuild):
+    cpu = []
+    peaks = []
+    for traced in (False, True):
+        if traced:
+            tracemalloc.start()
+        for _ in range(requests):
+            if rebuild:
+                for builder in builders:
+                    builder.cache_clear()
+            if traced:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+            started = time.process_time()
+            with contextlib.redirect_stdout(io.StringIO()):
+                call()
+            if traced:
+                peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+            else:
+                cpu.append(time.process_time() - started)
+        if traced:
+            tracemalloc.stop()
+    return sum(cpu) / len(cpu) * 1000, sum(peaks) / len(peaks) / 1024
+
+
+def _build_cost(builders, build, requests):
+    """CPU time and allocation peak of building an agent's pipeline from scratch, i.e. what reuse saves."""
+    cpu = 0.0
+    peak = 0
+    tracemalloc.start()
+    for _ in range(requests):
+        for builder in builders:
+            builder.cache_clear()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        started = time.process_time()
+        build()
+        cpu += time.process_time() - started
+        peak += tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return cpu / requests * 1000, peak / requests / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--rows", type=int, default=200, help="farm rows fed to the carbon and water engines")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Work on a copy so the tracked database is never switched to WAL or touched
+        farming = Path(directory) / "farming_memory.db"
+        shutil.copy(db_manager.DB_PATHS["farming"], farming)
+        db_manager.DB_PATHS["farming"] = farming
+        db_manager.DB_PATHS["cache"] = Path(directory) / "cache.db"
+        _stub(args.rows)
+
+        print(f"requests={args.requests} rows={args.rows}")
+        print("Per request: CPU ms and allocation peak KiB; build = cost of constructing the pipeline alone")
+        print(f"{'agent':<15}{'build ms':>10}{'build KiB':>11}{'rebuild ms':>12}{'reuse ms':>10}{'rebuild KiB':>13}{'reuse KiB':>11}")
+        for name, call, builders, build in AGENTS:
+            with contextlib.redirect_stdout(io.StringIO()):
+                call()  # warm imports and connections
+            rebuild_cpu, rebuild_peak = _measure(call, builders, args.requests, rebuild=True)
+            reuse_cpu, reuse_peak = _measure(call, builders, args.requests, rebuild=False)
+            build_cpu, build_peak = _build_cost(builders, build, args.requests)
+            print(
+                f"{name:<15}{build_cpu:>10.2f}{build_peak:>11.1f}"
+                f"{rebuild_cpu:>12.2f}{reuse_cpu:>10.2f}{rebuild_peak:>13.1f}{reuse_peak:>11.1f}"
+            )
+        db_manager.close_thread_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""Offline benchmarks for every route in main.py and the functions behind them.
+
+Groq, DuckDuckGo, Nominatim and Open-Meteo are replaced by the stand-ins in
+stubs.py, each with a configurable latency, and the databases and tickets file
+are copied to a temporary directory, so runs are repeatable and leave the tree
+untouched:
+
+    python benchmarks/run_benchmarks.py --output before.json
+    python benchmarks/run_benchmarks.py --output after.json --compare before.json
+    python benchmarks/run_benchmarks.py --only weather --llm-latency 0
+
+Each benchmark records wall and CPU time per call (CPU covers every thread in
+the process, so the agents' parallel steps count), the allocation peak of one
+traced call, and how many calls each stand-in served per call, including the
+memory summaries the request queued. LLM responses, search results and
+snapshots are recomputed on every call (the LLM cache is off, the search cache
+is cleared and analysis routes get ?refresh=true); the SQL, geocode and
+forecast caches warm up during the warmup calls, as in a running server.
+
+To measure with real payloads instead of the canned ones, record the live
+services once (needs GROQ_API_KEY and network access) and replay them later:
+
+    python benchmarks/run_benchmarks.py --record-cassette real.jsonl --output recorded.json
+    python benchmarks/run_benchmarks.py --cassette real.jsonl --cassette-latency zero
+
+Replays are keyed on the exact request, so use the same --iterations,
+--warmup and --only as the recording; a changed prompt has no recording and
+its benchmark fails with CassetteMiss. Memory summaries are batched by
+timing, so a few of them may miss when replaying at a different latency;
+the writer logs those and they are never timed.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BACKEND = Path(__file__).parent.parent
+sys.path.append(str(BACKEND))
+sys.path.append(str(Path(__file__).parent))
+os.environ.setdefault("GROQ_API_KEY", "offline-benchmarks")
+
+LOCATIONS = ["Kolkata", "Pune", "Nagpur", "Ludhiana", "Guntur", "Nashik", "Indore", "Patna"]
+
+
+class _CassetteCalls:
+    """Stand-in for stubs.Stubs when the services come from a cassette (or are live and being recorded)."""
+
+    def counts(self):
+        from modules.cassette import cassette_stats
+        return cassette_stats()["by_kind"]
+
+    def close(self):
+        pass
+
+
+def _services(args):
+    from modules import cassette
+    if args.record_cassette:
+        cassette.configure(cassette.RECORD, args.record_cassette)
+        return _CassetteCalls()
+    if args.cassette:
+        cassette.configure(cassette.REPLAY, args.cassette, args.cassette_latency)
+        return _CassetteCalls()
+    import stubs
+    return stubs.install(args.llm_latency, args.search_latency, args.http_latency)
+
+
+def _setup(directory, args):
+    """Point every file the backend writes at copies in directory, then import the app with its services in place."""
+    from modules import db_manager, llm_cache, ticket_handler
+    for name in ("farming", "memory"):
+        copy = Path(directory) / db_manager.DB_PATHS[name].name
+        shutil.copy(db_manager.DB_PATHS[name], copy)
+        db_manager.DB_PATHS[name] = copy
+    db_manager.DB_PATHS["cache"] = Path(directory) / "cache.db"
+    tickets = Path(directory) / "tickets.json"
+    shutil.copy(ticket_handler.TICKETS_FILE, tickets)
+    ticket_handler.TICKETS_FILE = str(tickets)
+    llm_cache.CACHE_DISABLED = True
+
+    installed = _services(args)
+    import main
+    main.decision_agent.db_path = str(db_manager.DB_PATHS["memory"])
+    return main, installed
+
+
+def _endpoints(main):
+    client = main.app.test_client()
+    users = itertools.count()
+
+    def register():
+        return client.post("/api/register", json={"name": "Bench", "email": f"bench{next(users)}@example.com", "password": "secret"})
+
+    client.post("/api/register", json={"name": "Bench", "email": "login@example.com", "password": "secret"})
+    batch = "&".join(f"location={location}" for location in LOCATIONS)
+    return [
+        ("GET /", lambda: client.get("/")),
+        ("GET /cached-response", lambda: client.get("/cached-response")),
+        ("GET /metrics", lambda: client.get("/metrics")),
+        ("GET /weather", lambda: client.get("/weather?location=Kolkata&refresh=true")),
+        ("GET /weather/batch", lambda: client.get(f"/weather/batch?{batch}")),
+        ("POST /weather/batch", lambda: client.post("/weather/batch", json={"locations": LOCATIONS})),
+        ("GET /sustainability", lambda: client.get("/sustainability?crop_type=Wheat&refresh=true")),
+        ("GET /sustainability (snapshot)", lambda: client.get("/sustainability?crop_type=Wheat")),
+        ("GET /market-trends", lambda: client.get("/market-trends?crop_type=Wheat&refresh=true")),
+        ("GET /market-trends (snapshot)", lambda: client.get("/market-trends?crop_type=Wheat")),
+        ("GET /carbon-footprint", lambda: client.get("/carbon-footprint?refresh=true")),
+        ("GET /carbon-footprint (snapshot)", lambda: client.get("/carbon-footprint")),
+        ("GET /water-usage", lambda: client.get("/water-usage?refresh=true")),
+        ("GET /water-usage (snapshot)", lambda: client.get("/water-usage")),
+        ("GET /sustainability/stream", lambda: client.get("/sustainability/stream?crop_type=Wheat&refresh=true")),
+        ("GET /market-trends/stream", lambda: client.get("/market-trends/stream?crop_type=Wheat&refresh=true")),
+        ("GET /carbon-footprint/stream", lambda: client.get("/carbon-footprint/stream?refresh=true")),
+        ("GET /water-usage/stream", lambda: client.get("/water-usage/stream?refresh=true")),
+        ("GET /feedback", lambda: client.get("/feedback?query=How can I improve wheat yield?")),
+        ("POST /feedback", lambda: client.post("/feedback", json={"query": "How can I improve wheat yield?"})),
+        ("POST /api/register", register),
+        ("POST /api/login", lambda: client.post("/api/login", json={"email": "login@example.com", "password": "secret"})),
+        ("POST /api/tickets", lambda: client.post("/api/tickets", json={"user_id": 1, "title": "Irrigation", "description": "Pump schedule"})),
+        ("GET /api/tickets", lambda: client.get("/api/tickets")),
+        ("GET /api/responses", lambda: client.get("/api/responses"))
+    ]
+
+
+def _functions(main):
+    """(name, call, prepare) triples; prepare() builds a benchmark's inputs and only runs if it is selected."""
+    from agents import sustainability_agent, market_trend_agent, carbon_footprint_agent, water_usage, weather_agent, feedback_agent
+    from modules import carbon_engine, water_engine, weather_fetcher, weather_classifier
+    from modules.query_extract_run import run_query
+    import stubs
+
+    agents = [
+        ("farm_advisor", lambda: sustainability_agent.farm_advisor("Wheat"), "sustainability"),
+        ("market_trend_analyzer", lambda: market_trend_agent.market_trend_analyzer("Wheat"), "market"),
+        ("carbon_footprint_analyzer", carbon_footprint_agent.carbon_footprint_analyzer, "carbon"),
+        ("water_usage_tracker_agent", water_usage.water_usage_tracker_agent, "water")
+    ]
+    inputs = {}
+
+    def prepared(key, build):
+        return lambda: inputs.setdefault(key, build())
+
+    benchmarks = [(name, call, None) for name, call, _ in agents]
+    benchmarks += [
+        ("w_agent", lambda: weather_agent.w_agent("Kolkata", use_llm=False), None),
+        ("w_agent (llm)", lambda: weather_agent.w_agent("Kolkata", use_llm=True), None),
+        ("w_agent_batch", lambda: weather_agent.w_agent_batch(LOCATIONS, use_llm=False), None),
+        ("w_agent_batch (llm)", lambda: weather_agent.w_agent_batch(LOCATIONS, use_llm=True), None),
+        ("feedback_agent", lambda: feedback_agent.feedback_agent("How can I improve wheat yield?"), None)
+    ]
+    # Agent results are captured once, so the DecisionAgent is measured on its own
+    benchmarks += [
+        (
+            f"analyze_and_clean ({sender})",
+            lambda sender=sender: main.decision_agent.analyze_and_clean(inputs[sender], sender),
+            prepared(sender, call)
+        )
+        for _, call, sender in agents
+    ]
+    benchmarks += [
+        (
+            "compute_carbon_footprint",
+            lambda: carbon_engine.compute_carbon_footprint(inputs["carbon_rows"]),
+            prepared("carbon_rows", lambda: run_query(stubs.CARBON_QUERY))
+        ),
+        (
+            "compute_water_usage",
+            lambda: water_engine.compute_water_usage(inputs["water_rows"]),
+            prepared("water_rows", lambda: run_query(stubs.WATER_QUERY))
+        ),
+        (
+            "classify_weather",
+            lambda: weather_classifier.classify_weather(inputs["forecast"]),
+            prepared("forecast", lambda: weather_fetcher.fetcher("Kolkata")["forecast"])
+        )
+    ]
+    return benchmarks
+
+
+def _settle():
+    # Queued memory summaries are part of a request's cost, but are not timed
+    from modules.memory_handler import flush_memory
+    flush_memory()
+
+
+def _reset():
+    from modules.search_cache import clear_search_cache
+    clear_search_cache()
+
+
+def _summary(values):
+    return {
+        "mean": round(statistics.mean(values), 3),
+        "median": round(statistics.median(values), 3),
+        "min": round(min(values), 3),
+        "max": round(max(values), 3)
+    }
+
+
+def _measure(call, services, iterations, warmup):
+    for _ in range(warmup):
+        _reset()
+        call()
+        _settle()
+
+    wall = []
+    cpu = []
+    status = None
+    before = services.counts()
+    for _ in range(iterations):
+        _reset()
+        started_wall = time.perf_counter()
+        started_cpu = time.process_time()
+        result = call()
+        if hasattr(result, "get_data"):
+            result.get_data()  # drains streamed responses
+            status = result.status_code
+        wall.append((time.perf_counter() - started_wall) * 1000)
+        cpu.append((time.process_time() - started_cpu) * 1000)
+        _settle()
+    after = services.counts()
+
+    # Allocations come from a separate call so tracing does not slow the timed ones
+    _reset()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    result = call()
+    if hasattr(result, "get_data"):
+        result.get_data()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    _settle()
+
+    measured = {
+        "wall_ms": _summary(wall),
+        "cpu_ms": _summary(cpu),
+        "alloc_peak_kib": round((peak - baseline) / 1024, 1),
+        "alloc_retained_kib": round((current - baseline) / 1024, 1),
+        "calls": {
+            name: round((count - before.get(name, 0)) / iterations, 2)
+            for name, count in sorted(after.items())
+            if count != before.get(name, 0)
+        }
+    }
+    if status is not None:
+        measured["status"] = status
+    return measured
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _services_label(args):
+    if args.record_cassette:
+        return f"live, recorded to {args.record_cassette}"
+    if args.cassette:
+        return f"cassette {args.cassette} ({args.cassette_latency} latency)"
+    return "stubs"
+
+
+def _print_results(benchmarks):
+    print(f"{'benchmark':<36}{'wall ms':>10}{'cpu ms':>10}{'peak KiB':>11}{'llm':>6}{'search':>8}{'http':>6}")
+    for name, result in benchmarks.items():
+        calls = result["calls"]
+        print(
+            f"{name:<36}{result['wall_ms']['median']:>10.2f}{result['cpu_ms']['median']:>10.2f}"
+            f"{result['alloc_peak_kib']:>11.1f}{calls.get('llm', 0):>6g}{calls.get('search', 0):>8g}{calls.get('http', 0):>6g}"
+        )
+
+
+def _change(before, after):
+    if not before:
+        return "    n/a"
+    return f"{(after - before) / before * 100:+6.1f}%"
+
+
+def _print_comparison(baseline, benchmarks):
+    print(f"\nAgainst {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}), medians:")
+    print(f"{'benchmark':<36}{'wall ms':>20}{'cpu ms':>20}{'peak KiB':>20}{'llm calls':>12}")
+    for name, result in benchmarks.items():
+        old = baseline["benchmarks"].get(name)
+        if old is None:
+            print(f"{name:<36}{'new':>20}")
+            continue
+        columns = []
+        for before, after in (
+            (old["wall_ms"]["median"], result["wall_ms"]["median"]),
+            (old["cpu_ms"]["median"], result["cpu_ms"]["median"]),
+            (old["alloc_peak_kib"], result["alloc_peak_kib"])
+        ):
+            columns.append(f"{after:>10.1f} {_change(before, after)}")
+        calls = f"{old['calls'].get('llm', 0):g}->{result['calls'].get('llm', 0):g}"
+        print(f"{name:<36}" + "".join(f"{column:>20}" for column in columns) + f"{calls:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5, help="timed calls per benchmark")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed calls before timing")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per stub LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="seconds per stub web search")
+    parser.add_argument("--http-latency", type=float, default=0.02, help="seconds per stub geocode or forecast request")
+    parser.add_argument("--cassette", help="replay Groq, search and weather responses from this recording instead of the stubs")
+    parser.add_argument("--cassette-latency", choices=["recorded", "zero"], default="recorded", help="sleep as long as each recorded call took, or not at all")
+    parser.add_argument("--record-cassette", help="run against the live services and record them to this file")
+    parser.add_argument("--only", help="run benchmarks whose name contains this text")
+    parser.add_argument("--output", default=str(Path(__file__).parent / "results.json"), help="JSON results file to write")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+    if args.cassette and args.record_cassette:
+        parser.error("--cassette and --record-cassette are mutually exclusive")
+
+    # The agents print every prompt result; only the report below goes to stdout
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        app, services = _setup(directory, args)
+        suites = [
+            ("endpoint", [(name, call, None) for name, call in _endpoints(app)]),
+            ("function", _functions(app))
+        ]
+        benchmarks = {}
+        for kind, entries in suites:
+            for name, call, prepare in entries:
+                if args.only and args.only not in name:
+                    continue
+                print(f"running {name}", file=sys.stderr)
+                if prepare:
+                    prepare()
+                benchmarks[name] = dict(kind=kind, **_measure(call, services, args.iterations, args.warmup))
+        services.close()
+        from modules import db_manager
+        db_manager.close_thread_connections()
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "services": _services_label(args),
+            "latency_s": {"llm": args.llm_latency, "search": args.search_latency, "http": args.http_latency}
+        },
+        "benchmarks": benchmarks
+    }
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    _print_results(benchmarks)
+    print(f"\nwrote {args.output}")
+    if args.compare:
+        with open(args.compare) as file:
+            _print_comparison(json.load(file), benchmarks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Measure cold-start cost of the Flask backend: import time, first request and peak RSS.
+
+Each run starts a fresh interpreter that imports main.py and serves GET / and
+GET /metrics through the test client, so nothing is shared between runs:
+
+    python benchmarks/startup_bench.py --runs 5
+    python benchmarks/startup_bench.py --eager    # also build every shared client up front
+
+--eager creates all registry instances right after import, which is roughly
+what importing the agents used to cost.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).parent.parent
+
+CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+if {eager}:
+    from modules import registry
+    for model in ("llama3-70b-8192", "llama-3.3-70b-versatile"):
+        registry.get_chat_model(model)
+    registry.get_search()
+    registry.get_sql_database()
+client = main.app.test_client()
+first = client.get("/")
+served = time.perf_counter()
+metrics = client.get("/metrics").get_json()
+print(json.dumps({{
+    "import_s": imported - started,
+    "first_request_s": served - started,
+    "status": first.status_code,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "registry": metrics["registry"]
+}}))
+"""
+
+
+def run_once(eager):
+    env = dict(os.environ)
+    env.setdefault("GROQ_API_KEY", "startup-bench")
+    completed = subprocess.run(
+        [sys.executable, "-c", CHILD.format(eager=eager)],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--eager", action="store_true", help="create every shared client right after import")
+    args = parser.parse_args()
+
+    results = [run_once(args.eager) for _ in range(args.runs)]
+    for key in ("import_s", "first_request_s", "rss_mb"):
+        values = [result[key] for result in results]
+        print(f"{key:>16}: median {statistics.median(values):8.3f}  min {min(values):8.3f}  max {max(values):8.3f}")
+    print(f"{'registry':>16}: {results[-1]['registry'] or 'nothing created'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""Local stand-ins for Groq, DuckDuckGo, Nominatim and Open-Meteo, so the backend runs offline.
+
+    stubs = install(llm_latency=0.3, search_latency=0.5, http_latency=0.1)
+    ...                      # exercise agents or the Flask app
+    stubs.counts()           # calls each stand-in has served
+    stubs.close()
+
+The chat model answers every prompt the backend sends with a canned reply in
+the format that prompt asks for, so responses go through the same parsers as
+real ones (the DecisionAgent never needs its LLM fallback). The weather APIs
+are served by a real HTTP server on localhost, which keeps the requests
+session, the httpx clients and their connection pools in the measured path.
+"""
+import ast
+import asyncio
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from modules import registry, weather_fetcher
+
+CROP_QUERY = (
+    "SELECT Crop_Type, AVG(Crop_Yield_ton), AVG(Sustainability_Score) FROM farm_advisory "
+    "GROUP BY Crop_Type ORDER BY AVG(Crop_Yield_ton) DESC, AVG(Sustainability_Score) DESC"
+)
+MARKET_QUERY = (
+    "SELECT f.Crop_Type, m.Market_Price_per_ton, m.Demand_Index, m.Supply_Index "
+    "FROM farm_advisory f JOIN market_research m ON f.Crop_Type = m.Product "
+    "ORDER BY m.Market_Price_per_ton DESC, m.Demand_Index DESC, m.Supply_Index DESC LIMIT 5"
+)
+CARBON_QUERY = "SELECT Farm_ID, Crop_Type, Fertilizer_Usage_kg, Pesticide_Usage_kg FROM farm_advisory"
+WATER_QUERY = "SELECT Farm_ID, Crop_Type, Soil_Moisture, Rainfall_mm FROM farm_advisory"
+
+SUSTAINABILITY_PARAMETERS = "Soil_pH (6.5), Soil_Moisture (28%), Temperature_C (24), Rainfall_mm (650), Fertilizer_Usage_kg (120), Pesticide_Usage_kg (4), Crop_Yield_ton (3.2)"
+MARKET_PARAMETER_NAMES = ("Market_Price_per_ton", "Demand_Index", "Supply_Index", "Competitor_Price_per_ton", "Economic_Indicator", "Weather_Impact_Score", "Seasonal_Factor", "Consumer_Trend_Index")
+MARKET_PARAMETERS = "Market_Price_per_ton (310), Demand_Index (140), Supply_Index (90), Competitor_Price_per_ton (295), Economic_Indicator (1.1), Weather_Impact_Score (55), Seasonal_Factor (Medium), Consumer_Trend_Index (118)"
+
+SEARCH_RESULTS = (
+    "Extension services report growing adoption of cover cropping, reduced tillage and precision "
+    "nutrient management. Drought-tolerant millets and pulses are gaining market share while wheat "
+    "and rice prices remain stable. Drip irrigation and alternate wetting and drying cut water use "
+    "by 25-40%, and split fertilizer application lowers nitrous oxide emissions by up to 20%."
+)
+
+
+def _sql_for(question):
+    if "Fertilizer_Usage_kg, Pesticide_Usage_kg" in question:
+        return CARBON_QUERY
+    if "Soil_Moisture, Rainfall_mm" in question:
+        return WATER_QUERY
+    if "Market_Price_per_ton" in question:
+        return MARKET_QUERY
+    return CROP_QUERY
+
+
+def _sql(prompt):
+    if prompt.rstrip().endswith("Answer:"):
+        # SQLDatabaseChain's second call: echo the query it ran, which extract_sql_query reads back
+        sql = prompt.rsplit("SQLQuery:", 1)[-1].split("\nSQLResult:", 1)[0].strip()
+        return f"SQLQuery: {sql}"
+    return _sql_for(prompt.rsplit("Question:", 1)[-1])
+
+
+def _structured(prompt):
+    """The DecisionAgent's free-form branch: the agent result it quotes, as JSON."""
+    raw = prompt.split("well-structured:", 1)[-1].rsplit("Return the structured JSON:", 1)[0].strip()
+    try:
+        return json.dumps(ast.literal_eval(raw))
+    except (ValueError, SyntaxError):
+        return json.dumps({"raw_output": raw})
+
+
+def _summaries(prompt):
+    count = len(re.findall(r"^\[\d+\] \(", prompt, flags=re.M))
+    return json.dumps({str(i): f"Stored insight {i}: key figures and recommendations for later reference." for i in range(1, count + 1)})
+
+
+def _trending(crop, parameters, extra=""):
+    return (
+        f"  - {crop}:\n"
+        f"    - Parameters: {crop}: {parameters}\n"
+        f"    - Strength: steady yields under variable rainfall\n"
+        f"{extra}"
+        f"    - Source: FAO"
+    )
+
+
+def _prompt_crop(prompt, pattern):
+    match = re.search(pattern, prompt)
+    return match.group(1).strip() if match else "Wheat"
+
+
+def _web_trends(prompt):
+    crop = _prompt_crop(prompt, r"focusing on (.+?) and identify")
+    return "- Trending Crops:\n" + "\n".join(_trending(name, SUSTAINABILITY_PARAMETERS) for name in (crop, "Millet", "Sorghum"))
+
+
+def _web_market_trends(prompt):
+    crop = _prompt_crop(prompt, r"focusing on (.+?) and identify")
+    rising = "    - Rising percentage: 12%\n"
+    return "- Trending Crops:\n" + "\n".join(_trending(name, MARKET_PARAMETERS, rising) for name in (crop, "Millet", "Sorghum"))
+
+
+def _strategies(section, percentage_key):
+    return (
+        f"- {section}:\n"
+        f"  - Strategy 1:\n"
+        f"    - Description: Precision application guided by soil testing\n"
+        f"    - {percentage_key}: 20%\n"
+        f"    - Source: USDA\n"
+        f"  - Strategy 2:\n"
+        f"    - Description: Cover crops and reduced tillage\n"
+        f"    - {percentage_key}: 15%\n"
+        f"    - Source: FAO"
+    )
+
+
+# (marker in the prompt, reply or callable(prompt) -> reply), first match wins. Prompts that
+# embed other replies (memory summaries, SQL results) are matched before the markers they quote.
+RESPONSES = [
+    ("Return ONLY a JSON object mapping each number", _summaries),
+    ("Summarize this in one to two sentences", "Stored insight: key figures and recommendations for later reference."),
+    ("Return the structured JSON:", _structured),
+    ("SQLQuery:", _sql),
+    ("actionable feedback points", lambda prompt: json.dumps([f"Point {i}: Rotate crops and test soil before the next season" for i in range(1, 9)])),
+    ("Sustainability Scores:", (
+        "- Sustainability Scores: 72.5, 68.1, 75.3\n"
+        f"- Parameters: {SUSTAINABILITY_PARAMETERS}\n"
+        "- Analysis: Moderate fertilizer use and stable yields keep the score high."
+    )),
+    ("average sustainability score", (
+        "- Top 3 Crops: Soybean (78.2), Corn (74.6), Rice (71.9)\n"
+        "- Parameters Comparison:\n"
+        + "\n".join(f"  - {crop}:\n    - Parameters: {crop}: {SUSTAINABILITY_PARAMETERS}" for crop in ("Soybean", "Corn", "Rice"))
+        + "\n- Insights: Soybean scores best thanks to lower fertilizer needs."
+    )),
+    ("Rising percentage:", _web_market_trends),
+    ("Trending Crops:", _web_trends),
+    ("Rising or non rising", (
+        "- Rising or non rising index Analysis: True, demand is growing faster than supply\n"
+        "- Parameter Trends:\n"
+        + "\n".join(f"  - {name}: {name != 'Supply_Index'}" for name in MARKET_PARAMETER_NAMES)
+    )),
+    ("average market performance", (
+        "- Top 3 Crops: Soybean (320), Corn (305), Rice (298)\n"
+        "- Parameters Comparison:\n"
+        + "\n".join(f"  - {crop}: Parameters: {crop}: {MARKET_PARAMETERS}" for crop in ("Soybean", "Corn", "Rice"))
+        + "\n- Insights: Soybean leads on price and demand."
+    )),
+    ("Reduction Insights:", "- Reduction Insights:\n  - Rice:\n    - Insights: Reduce fertilizer use by 20% with precision farming\n    - Estimated_Reduction: as given"),
+    ("Reduction Strategies:", lambda prompt: _strategies("Reduction Strategies", "Reduction_Percentage")),
+    ("Total Carbon Footprint:", "- Summary: Fertilizer use on rice and corn drives most emissions.\n- Total Carbon Footprint: as given"),
+    ("Conservation Insights:", "- Conservation Insights:\n  - Rice:\n    - Insights: Adopt alternate wetting and drying\n    - Estimated_Savings: as given"),
+    ("Conservation Strategies:", lambda prompt: _strategies("Conservation Strategies", "Savings_Percentage")),
+    ("Total Water Usage:", "- Summary: Rice paddies account for most irrigation demand.\n- Total Water Usage: as given"),
+    # The recommendation prompt quotes the condition reply, so it is matched first
+    ("Plantation Crops:", "- Plantation Crops: Wheat, Mustard, Peas\n- Harvestation Crops: Rice, Maize\n- Cool, moist conditions favour rabi sowing."),
+    ("Weather condition:", "- Weather condition: Moderate\n- Mild temperatures with light, regular rainfall."),
+]
+DEFAULT_RESPONSE = "{}"
+
+_calls_lock = threading.Lock()
+
+
+def _prompt_text(messages):
+    return "\n".join(str(message.content) for message in messages)
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model with a fixed latency per call that answers from RESPONSES."""
+
+    latency: float = 0.0
+    calls: Any = None
+
+    @property
+    def _llm_type(self):
+        return "stub-chat"
+
+    def _reply(self, messages):
+        prompt = _prompt_text(messages)
+        for marker, response in RESPONSES:
+            if marker in prompt:
+                kind = marker.rstrip(":")
+                content = response(prompt) if callable(response) else response
+                break
+        else:
+            kind, content = "default", DEFAULT_RESPONSE
+        with _calls_lock:
+            self.calls[kind] += 1
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=content))],
+            llm_output={"token_usage": {"total_tokens": (len(prompt) + len(content)) // 4}}
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._reply(messages)
+
+
+class StubSearch:
+    """DuckDuckGoSearchRun replacement: the same results for every query after latency seconds."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def run(self, query):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return SEARCH_RESULTS
+
+
+def _location_index(location):
+    # Stable, well spread coordinates per location name so each lands in its own forecast cell
+    return sum(ord(char) for char in location) % 400
+
+
+def _geocode_payload(location):
+    index = _location_index(location)
+    return [{"lat": str(8 + index * 0.07), "lon": str(68 + index * 0.07), "display_name": location}]
+
+
+def _forecast_payload():
+    days = [f"2025-01-{day:02d}" for day in range(1, 8)]
+    return {
+        "daily": {
+            "time": days,
+            "temperature_2m_max": [29.5, 30.1, 31.0, 30.4, 28.9, 29.7, 30.2],
+            "temperature_2m_min": [19.8, 20.3, 21.0, 20.6, 19.5, 19.9, 20.1],
+            "precipitation_sum": [0.0, 1.2, 4.5, 0.3, 0.0, 2.1, 0.0],
+            "weathercode": [1, 3, 61, 2, 0, 51, 1]
+        }
+    }
+
+
+class WeatherServer:
+    """Nominatim /search and Open-Meteo /v1/forecast on localhost, with a fixed latency per request."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                time.sleep(server.latency)
+                if url.path == "/search":
+                    server.calls["geocode"] += 1
+                    payload = _geocode_payload(query.get("q", [""])[0])
+                elif url.path == "/v1/forecast":
+                    server.calls["forecast"] += 1
+                    payload = _forecast_payload()
+                else:
+                    self.send_error(404)
+                    return
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        threading.Thread(target=self._httpd.serve_forever, name="stub-weather", daemon=True).start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class Stubs:
+    def __init__(self, chat, search, weather):
+        self.chat = chat
+        self.search = search
+        self.weather = weather
+
+    def counts(self):
+        """Calls served so far, per stand-in (and per prompt kind for the chat model)."""
+        counts = {f"llm:{kind}": count for kind, count in self.chat.calls.items()}
+        counts["llm"] = sum(self.chat.calls.values())
+        counts["search"] = self.search.calls
+        counts.update({f"http:{kind}": count for kind, count in self.weather.calls.items()})
+        counts["http"] = sum(self.weather.calls.values())
+        return counts
+
+    def close(self):
+        self.weather.close()
+
+
+def install(llm_latency=0.0, search_latency=0.0, http_latency=0.0):
+    """Route the registry's chat models and search, and the weather fetcher's URLs, to the stand-ins.
+
+    Call before the first request: agents resolve their shared clients
+    lazily, so seeding the registry is enough even after they are imported.
+    """
+    chat = StubChatModel(latency=llm_latency, calls=Counter())
+    search = StubSearch(search_latency)
+    weather = WeatherServer(http_latency)
+
+    for model in ("llama3-70b-8192", "llama-3.3-70b-versatile"):
+        registry._instances[("chat", model, registry.DEFAULT_TEMPERATURE)] = chat
+    registry._instances[("search",)] = search
+    weather_fetcher._geocode_url = lambda location: f"{weather.url}/search?format=json&q={location}"
+    weather_fetcher._forecast_url = lambda lat, lon: (
+        f"{weather.url}/v1/forecast?latitude={lat}&longitude={lon}"
+        f"&daily=temperature_2m_max,temperature_2m_min,precipitation_sum,weathercode&timezone=auto"
+    )
+    # Nominatim's one-request-per-second policy does not apply to the local server
+    weather_fetcher.NOMINATIM_INTERVAL = 0
+    return Stubs(chat, search, weather)
@@ -0,0 +1,119 @@
+"""Compare sequential fetcher() calls with the concurrent fetch_many() batch path.
+
+Upstream APIs are replaced by in-process fakes with a fixed latency, so the
+numbers reflect request scheduling rather than network conditions:
+
+    python benchmarks/weather_batch_bench.py --locations 200 --latency 0.05
+
+The first comparison lifts Nominatim's one request per second limit to
+measure scheduling alone; the second keeps it for --uncached locations
+that miss the geocode cache, which is what a cold batch really costs.
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+sys.path.append(str(Path(__file__).parent.parent))
+from modules import db_manager
+from modules import weather_fetcher
+
+
+def _payload(url):
+    query = parse_qs(urlparse(str(url)).query)
+    if "q" in query:
+        # Spread the fake villages far enough apart that each gets its own forecast cell
+        index = int(query["q"][0].split()[-1])
+        return [{"lat": str(10 + index * 0.5), "lon": str(70 + index * 0.5)}]
+    return {
+        "daily": {
+            "time": ["2025-01-01"],
+            "temperature_2m_max": [30.0],
+            "temperature_2m_min": [20.0],
+            "precipitation_sum": [1.2],
+            "weathercode": [3]
+        }
+    }
+
+
+class FakeResponse:
+    def __init__(self, url):
+        self.url = url
+
+    def json(self):
+        return _payload(self.url)
+
+
+def _reset(directory, run):
+    db_manager.close_thread_connections()
+    db_manager.DB_PATHS["cache"] = Path(directory) / f"cache_{run}.db"
+    weather_fetcher._table_ready = False
+    weather_fetcher._forecasts.clear()
+    weather_fetcher._last_geocode = 0.0
+
+
+def bench_sequential(locations, latency):
+    def get(url, **kwargs):
+        time.sleep(latency)
+        return FakeResponse(url)
+
+    weather_fetcher._session.get = get
+    start = time.perf_counter()
+    results = [weather_fetcher.fetcher(location) for location in locations]
+    return time.perf_counter() - start, results
+
+
+def bench_batch(locations, latency, concurrency):
+    async def handler(request):
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json=_payload(request.url))
+
+    start = time.perf_counter()
+    results = weather_fetcher.fetch_many(locations, concurrency, transport=httpx.MockTransport(handler))
+    return time.perf_counter() - start, results
+
+
+def compare(directory, name, locations, latency, concurrency):
+    _reset(directory, f"{name}_sequential")
+    sequential, sequential_results = bench_sequential(locations, latency)
+    _reset(directory, f"{name}_batch")
+    batch, batch_results = bench_batch(locations, latency, concurrency)
+    db_manager.close_thread_connections()
+    assert [r["forecast"] for r in sequential_results] == [r["forecast"] for r in batch_results]
+    return sequential, batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--locations", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake upstream request")
+    parser.add_argument("--concurrency", type=int, default=weather_fetcher.BATCH_CONCURRENCY)
+    parser.add_argument("--uncached", type=int, default=5, help="locations for the run paced by Nominatim's limit")
+    args = parser.parse_args()
+
+    interval = weather_fetcher.NOMINATIM_INTERVAL
+    with tempfile.TemporaryDirectory() as directory:
+        # Nominatim's limit would dominate both runs, so it is lifted to compare scheduling alone
+        weather_fetcher.NOMINATIM_INTERVAL = 0
+        locations = [f"Village {i}" for i in range(args.locations)]
+        sequential, batch = compare(directory, "scheduling", locations, args.latency, args.concurrency)
+
+        weather_fetcher.NOMINATIM_INTERVAL = interval
+        uncached = [f"Village {i}" for i in range(args.uncached)]
+        bound_sequential, bound_batch = compare(directory, "geocode", uncached, args.latency, args.concurrency)
+
+    print(f"locations={args.locations} latency={args.latency}s concurrency={args.concurrency}")
+    print(f"sequential fetcher: {sequential:.2f}s")
+    print(f"batch fetch_many:   {batch:.2f}s ({sequential / batch:.1f}x faster)")
+    print(f"geocode-bound, {args.uncached} uncached locations at {interval}s per Nominatim request:")
+    print(f"sequential fetcher: {bound_sequential:.2f}s")
+    print(f"batch fetch_many:   {bound_batch:.2f}s ({bound_sequential / bound_batch:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,27 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from agents.sustainability_agent import farm_advisor
-from agents.weather_agent import w_agent
-from agents.market_trend_agent import market_trend_analyzer
-from agents.carbon_footprint_agent import carbon_footprint_analyzer
-from agents.water_usage import water_usage_tracker_agent
+from agents.sustainability_agent import farm_advisor, STREAM_SECTIONS as sustainability_sections
+from agents.weather_agent import w_agent, w_agent_batch
+from agents.market_trend_agent import market_trend_analyzer, STREAM_SECTIONS as market_sections
+from agents.carbon_footprint_agent import carbon_footprint_analyzer, STREAM_SECTIONS as carbon_sections
+from agents.water_usage import water_usage_tracker_agent, STREAM_SECTIONS as water_sections
 from agents.feedback_agent import feedback_agent
 from agents.decision_agent import DecisionAgent
 from modules.auth_handler import register_user, login_user
 from modules.ticket_handler import create_ticket, get_all_tickets 
 from modules.response_handler import get_responses 
+from modules.sql_cache import sql_cache_stats
+from modules.llm_cache import llm_cache_stats, bypass_cache
+from modules.memory_handler import memory_queue_stats
+from modules.weather_fetcher import geocode_cache_stats, forecast_cache_stats, uncached_locations
+from modules.step_dag import dag_stats
+from modules.search_cache import search_cache_stats
+from modules.registry import registry_stats
+from modules.rate_governor import rate_governor_stats
+from modules.cassette import cassette_stats
+from modules.snapshot_store import register_snapshot, serve_snapshot, cached_snapshot, save_snapshot, start_scheduler, snapshot_stats, farm_crop_types, GLOBAL_KEY
+from modules.request_coalescing import coalesce, coalescing_stats
+from modules.agent_stream import SSE_HEADERS, sse_event, stream_sections
 import os
 import threading
 import time
@@ -21,6 +33,11 @@ CORS(app)
 db_path = os.path.join(os.path.dirname(__file__), 'db', 'memory.db')
 decision_agent = DecisionAgent(db_path)
 
+# Largest number of locations accepted by /weather/batch
+WEATHER_BATCH_LIMIT = int(os.getenv("WEATHER_BATCH_LIMIT", "100"))
+# Each location missing from the geocode cache costs a second of Nominatim's rate limit
+WEATHER_BATCH_UNCACHED_LIMIT = int(os.getenv("WEATHER_BATCH_UNCACHED_LIMIT", "10"))
+
 # Cache for response.json
 response_cache = {}
 
@@ -40,6 +57,12 @@ def refresh_cache():
 cache_thread = threading.Thread(target=refresh_cache, daemon=True)
 cache_thread.start()
 
+# Analysis endpoints are served from precomputed snapshots, refreshed in the background
+register_snapshot("sustainability", lambda crop_type: decision_agent.analyze_and_clean(farm_advisor(crop_type), "sustainability"), keys=farm_crop_types)
+register_snapshot("market", lambda crop_type: decision_agent.analyze_and_clean(market_trend_analyzer(crop_type), "market"), keys=farm_crop_types)
+register_snapshot("carbon", lambda: decision_agent.analyze_and_clean(carbon_footprint_analyzer(), "carbon"))
+register_snapshot("water", lambda: decision_agent.analyze_and_clean(water_usage_tracker_agent(), "water"))
+
 @app.route('/', methods=['GET'])
 def health_check():
     return jsonify({"status": "alive", "message": "Service is running"}), 200
@@ -52,42 +75,145 @@ def get_cached_response():
     else:
         return jsonify({"success": False, "message": "Cache is empty"}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Endpoint to fetch cache counters."""
+    return jsonify({
+        "sql_cache": sql_cache_stats(),
+        "llm_cache": llm_cache_stats(),
+        "memory_queue": memory_queue_stats(),
+        "geocode_cache": geocode_cache_stats(),
+        "forecast_cache": forecast_cache_stats(),
+        "search_cache": search_cache_stats(),
+        "snapshots": snapshot_stats(),
+        "coalescing": coalescing_stats(),
+        "registry": registry_stats(),
+        "rate_governor": rate_governor_stats(),
+        "cassette": cassette_stats(),
+        "agent_steps": dag_stats()
+    }), 200
+
+def refresh_requested():
+    """Whether the caller asked to bypass cached LLM responses with ?refresh=true."""
+    return request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+
+def stream_analysis(endpoint, key, sections, agent):
+    """Server-sent events: each agent section as it finishes, then the cleaned result.
+
+    A usable snapshot is sent straight away as the result. Otherwise
+    agent(on_step_complete) runs and its cleaned result becomes the new snapshot.
+    """
+    refresh = refresh_requested()
+    cached = None if refresh else cached_snapshot(endpoint, key)[0]
+
+    def run(on_step_complete):
+        with bypass_cache(refresh):
+            result = decision_agent.analyze_and_clean(agent(on_step_complete), endpoint)
+        save_snapshot(endpoint, key, result)
+        return result
+
+    def events():
+        if cached is not None:
+            yield sse_event("result", cached)
+            return
+        for event, data in stream_sections(run, sections):
+            yield sse_event(event, data)
+
+    return Response(events(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
 @app.route('/weather', methods=['GET'])
 def weather():
     location = request.args.get('location', 'Kolkata')
-    result = w_agent("Kolkata")
-    cleaned_result = decision_agent.analyze_and_clean(result,"weather")
+    refresh = refresh_requested()
+    with bypass_cache(refresh):
+        cleaned_result = coalesce(
+            "weather",
+            {"location": location, "refresh": refresh},
+            lambda: decision_agent.analyze_and_clean(w_agent(location),"weather")
+        )
     if "error" in cleaned_result:
         print(f"Error in DecisionAgent: {cleaned_result['raw_response']}")
         return jsonify({"status": "error", "message": cleaned_result["error"], "details": cleaned_result["raw_response"]}), 500
     return jsonify(cleaned_result)
 
+@app.route('/weather/batch', methods=['GET', 'POST'])
+def weather_batch():
+    """Endpoint to fetch and classify forecasts for many locations in one call."""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        locations = data.get('locations', [])
+    else:
+        locations = request.args.getlist('location')
+
+    locations = [location.strip() for location in locations if isinstance(location, str) and location.strip()]
+    if not locations:
+        return jsonify({"status": "error", "message": "At least one location is required"}), 400
+    if len(locations) > WEATHER_BATCH_LIMIT:
+        return jsonify({"status": "error", "message": f"At most {WEATHER_BATCH_LIMIT} locations per batch"}), 400
+    uncached = uncached_locations(locations)
+    if len(uncached) > WEATHER_BATCH_UNCACHED_LIMIT:
+        return jsonify({"status": "error", "message": f"{len(uncached)} locations are not geocoded yet, at most {WEATHER_BATCH_UNCACHED_LIMIT} per batch; seed them with python -m modules.weather_fetcher"}), 400
+
+    with bypass_cache(refresh_requested()):
+        result = w_agent_batch(locations)
+    return jsonify(result)
+
 @app.route('/sustainability', methods=['GET'])
 def sustainability():
     crop_type = request.args.get('crop_type', 'Wheat')
-    result = farm_advisor(crop_type)
-    cleaned_result = decision_agent.analyze_and_clean(result,"sustainability")
+    refresh = refresh_requested()
+    with bypass_cache(refresh):
+        cleaned_result = coalesce(
+            "sustainability",
+            {"crop_type": crop_type, "refresh": refresh},
+            lambda: serve_snapshot("sustainability", crop_type, refresh=refresh)
+        )
     return jsonify(cleaned_result)
 
 @app.route('/market-trends', methods=['GET'])
 def market_trends():
     crop_type = request.args.get('crop_type', 'Wheat')
-    result = market_trend_analyzer(crop_type)
-    cleaned_result = decision_agent.analyze_and_clean(result,"market")
+    refresh = refresh_requested()
+    with bypass_cache(refresh):
+        cleaned_result = coalesce(
+            "market",
+            {"crop_type": crop_type, "refresh": refresh},
+            lambda: serve_snapshot("market", crop_type, refresh=refresh)
+        )
     return jsonify(cleaned_result)
 
 @app.route('/carbon-footprint', methods=['GET'])
 def carbon_footprint():
-    result = carbon_footprint_analyzer()
-    cleaned_result = decision_agent.analyze_and_clean(result,"carbon")
+    refresh = refresh_requested()
+    with bypass_cache(refresh):
+        cleaned_result = coalesce("carbon", {"refresh": refresh}, lambda: serve_snapshot("carbon", refresh=refresh))
     return jsonify(cleaned_result)
 
 @app.route('/water-usage', methods=['GET'])
 def water_usage():
-    result = water_usage_tracker_agent()
-    cleaned_result = decision_agent.analyze_and_clean(result,"water")
+    refresh = refresh_requested()
+    with bypass_cache(refresh):
+        cleaned_result = coalesce("water", {"refresh": refresh}, lambda: serve_snapshot("water", refresh=refresh))
     return jsonify(cleaned_result)
 
+@app.route('/sustainability/stream', methods=['GET'])
+def sustainability_stream():
+    crop_type = request.args.get('crop_type', 'Wheat')
+    return stream_analysis("sustainability", crop_type, sustainability_sections, lambda on_step_complete: farm_advisor(crop_type, on_step_complete))
+
+@app.route('/market-trends/stream', methods=['GET'])
+def market_trends_stream():
+    crop_type = request.args.get('crop_type', 'Wheat')
+    return stream_analysis("market", crop_type, market_sections, lambda on_step_complete: market_trend_analyzer(crop_type, on_step_complete))
+
+@app.route('/carbon-footprint/stream', methods=['GET'])
+def carbon_footprint_stream():
+    return stream_analysis("carbon", GLOBAL_KEY, carbon_sections, carbon_footprint_analyzer)
+
+@app.route('/water-usage/stream', methods=['GET'])
+def water_usage_stream():
+    return stream_analysis("water", GLOBAL_KEY, water_sections, water_usage_tracker_agent)
+
 @app.route('/feedback', methods=['GET', 'POST'])
 def process_feedback():
     if request.method == 'POST':
@@ -174,4 +300,7 @@ def responses():
         return jsonify({"success": False, "message": "No responses found"}), 404
 
 if __name__ == "__main__":
+    # The debug reloader runs this block in a watcher process too; only the child it spawns (WERKZEUG_RUN_MAIN) serves requests
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true" and os.getenv("SNAPSHOT_SCHEDULER", "1").lower() not in ("0", "false", "no"):
+        start_scheduler()
     app.run(debug=True,host='0.0.0.0')
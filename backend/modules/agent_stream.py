@@ -0,0 +1,71 @@
+import asyncio
+import contextvars
+import json
+import queue
+import threading
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _section(sections, name, value):
+    return sections[name], value.content.strip() if hasattr(value, "content") else value
+
+
+def stream_sections(run, sections):
+    """Yield (event, data) pairs while run(on_step_complete) works in a background thread.
+
+    Each step named in sections is yielded as soon as it finishes, under its
+    result key, followed by ("result", run's return value) or ("error", ...).
+    The thread keeps going if the client disconnects, so run should store
+    anything worth keeping itself.
+    """
+    events = queue.Queue()
+
+    def on_step_complete(name, value):
+        if name in sections:
+            events.put(_section(sections, name, value))
+
+    def worker():
+        try:
+            events.put(("result", run(on_step_complete)))
+        except Exception as e:
+            print(f"Error streaming agent results: {e}")
+            events.put(("error", {"message": str(e)}))
+        finally:
+            events.put(None)
+
+    # Carry the caller's context (e.g. bypass_cache) into the worker thread
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(worker,), name="agent-stream", daemon=True).start()
+    while True:
+        event = events.get()
+        if event is None:
+            return
+        yield event
+
+
+async def astream_sections(arun, sections):
+    """Async stream_sections: awaits arun(on_step_complete) as a task on the running loop."""
+    events = asyncio.Queue()
+
+    def on_step_complete(name, value):
+        if name in sections:
+            events.put_nowait(_section(sections, name, value))
+
+    task = asyncio.ensure_future(arun(on_step_complete))
+    task.add_done_callback(lambda _: events.put_nowait(None))
+    while True:
+        event = await events.get()
+        if event is None:
+            break
+        yield event
+    try:
+        yield "result", task.result()
+    except Exception as e:
+        print(f"Error streaming agent results: {e}")
+        yield "error", {"message": str(e)}
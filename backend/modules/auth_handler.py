@@ -1,7 +1,5 @@
-import sqlite3
-import os
 import hashlib
-from pathlib import Path
+from modules.db_manager import fetchone, transaction
 
 def hash_password(password):
     """Hash a password for storing."""
@@ -10,27 +8,22 @@ def hash_password(password):
 def register_user(name, email, password):
     """Register a new user in the database."""
     try:
-        script_dir = Path(__file__).parent.absolute()
-        db_path = script_dir.parent / "db" / "farming_memory.db"
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Check if email already exists
-        cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
-        if cursor.fetchone():
-            conn.close()
-            return {"success": False, "message": "Email already registered"}
-        
-        # Hash the password before storing
-        hashed_password = hash_password(password)
-        
-        # Insert new user
-        cursor.execute(
-            "INSERT INTO users (name, email, password) VALUES (?, ?, ?)",
-            (name, email, hashed_password)
-        )
-        conn.commit()
-        conn.close()
+        with transaction("farming") as conn:
+            cursor = conn.cursor()
+            
+            # Check if email already exists
+            cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
+            if cursor.fetchone():
+                return {"success": False, "message": "Email already registered"}
+            
+            # Hash the password before storing
+            hashed_password = hash_password(password)
+            
+            # Insert new user
+            cursor.execute(
+                "INSERT INTO users (name, email, password) VALUES (?, ?, ?)",
+                (name, email, hashed_password)
+            )
         return {"success": True, "message": "Registration successful"}
     except Exception as e:
         return {"success": False, "message": f"Registration failed: {str(e)}"}
@@ -38,17 +31,10 @@ def register_user(name, email, password):
 def login_user(email, password):
     """Authenticate a user."""
     try:
-        script_dir = Path(__file__).parent.absolute()
-        db_path = script_dir.parent / "db" / "farming_memory.db"
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
         hashed_password = hash_password(password)
 
-        cursor.execute("SELECT id, name FROM users WHERE email = ? AND password = ?", 
-                      (email, hashed_password))
-        user = cursor.fetchone()
-        conn.close()
+        user = fetchone("farming", "SELECT id, name FROM users WHERE email = ? AND password = ?", 
+                        (email, hashed_password))
         
         if user:
             return {"success": True, "message": "Login successful", "user_id": user[0], "name": user[1]}
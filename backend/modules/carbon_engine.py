@@ -0,0 +1,138 @@
+import os
+import numpy as np
+
+# Emission factors in kg CO2e per kg applied, with the reduction rules that go with them.
+# Add a new version instead of editing an existing one so past results stay reproducible.
+EMISSION_FACTORS = {
+    "v1": {
+        "fertilizer": 5.2,
+        "pesticide": 16.6,
+        "fertilizer_threshold_kg": 50,
+        "fertilizer_reduction": 0.20,
+        "pesticide_threshold_kg": 5,
+        "pesticide_reduction": 0.30
+    }
+}
+DEFAULT_FACTORS_VERSION = os.getenv("CARBON_FACTORS_VERSION", "v1")
+
+PRECISION_FARMING = "Reduce fertilizer use by 20% with precision farming"
+ORGANIC_PESTICIDES = "Switch to organic pesticides, reducing emissions by 30%"
+
+
+def get_emission_factors(version=None, overrides=None):
+    """Return the emission factors for a version, optionally with some values overridden."""
+    version = version or DEFAULT_FACTORS_VERSION
+    if version not in EMISSION_FACTORS:
+        raise ValueError(f"Unknown emission factors version: {version}")
+    factors = dict(EMISSION_FACTORS[version])
+    if overrides:
+        factors.update(overrides)
+        version = f"{version}+custom"
+    factors["version"] = version
+    return factors
+
+
+def _amount(value):
+    """None for a NaN (a NULL usage column), so per-farm rows stay valid JSON."""
+    return None if np.isnan(value) else value
+
+
+def compute_carbon_footprint(farm_data, factors=None):
+    """Compute per-farm CO2e and reduction estimates for rows of
+    (Farm_ID, Crop_Type, Fertilizer_Usage_kg, Pesticide_Usage_kg)."""
+    factors = factors or get_emission_factors()
+    if not farm_data:
+        return {
+            "farm_data": [],
+            "reductions": [],
+            "crop_totals": [],
+            "total_carbon_footprint": 0.0,
+            "total_estimated_reduction": 0.0,
+            "emission_factors": factors
+        }
+
+    farm_ids = np.array([row[0] for row in farm_data])
+    crop_types = np.array([str(row[1]) for row in farm_data])
+    fertilizer = np.array([row[2] for row in farm_data], dtype=float)
+    pesticide = np.array([row[3] for row in farm_data], dtype=float)
+
+    fertilizer_co2e = fertilizer * factors["fertilizer"]
+    pesticide_co2e = pesticide * factors["pesticide"]
+    footprint = fertilizer_co2e + pesticide_co2e
+
+    reduce_fertilizer = fertilizer > factors["fertilizer_threshold_kg"]
+    reduce_pesticide = pesticide > factors["pesticide_threshold_kg"]
+    reduction = (
+        np.where(reduce_fertilizer, fertilizer_co2e * factors["fertilizer_reduction"], 0)
+        + np.where(reduce_pesticide, pesticide_co2e * factors["pesticide_reduction"], 0)
+    )
+
+    footprint = np.round(footprint, 2)
+    reduction = np.round(reduction, 2)
+    # Farms missing a usage figure have no footprint; crop and overall totals skip them
+    footprint_totals = np.nan_to_num(footprint)
+
+    rows = []
+    reductions = []
+    for farm_id, crop, fert, pest, co2e, saved, cut_fert, cut_pest in zip(
+        farm_ids.tolist(), crop_types.tolist(), fertilizer.tolist(), pesticide.tolist(),
+        footprint.tolist(), reduction.tolist(), reduce_fertilizer.tolist(), reduce_pesticide.tolist()
+    ):
+        rows.append({
+            "carbon_footprint": _amount(co2e),
+            "crop_type": crop,
+            "farm_id": int(farm_id),
+            "fertilizer_use": _amount(fert),
+            "pesticide_use": _amount(pest)
+        })
+        insights = []
+        if cut_fert:
+            insights.append(PRECISION_FARMING)
+        if cut_pest:
+            insights.append(ORGANIC_PESTICIDES)
+        reductions.append({
+            "crop_type": crop,
+            "estimated_reduction": saved,
+            "farm_id": int(farm_id),
+            "insights": insights
+        })
+
+    crops, crop_index = np.unique(crop_types, return_inverse=True)
+    crop_footprint = np.bincount(crop_index, weights=footprint_totals, minlength=len(crops))
+    crop_reduction = np.bincount(crop_index, weights=reduction, minlength=len(crops))
+    crop_farms = np.bincount(crop_index, minlength=len(crops))
+    crop_totals = [
+        {
+            "crop_type": crop,
+            "farms": int(crop_farms[i]),
+            "carbon_footprint": round(float(crop_footprint[i]), 2),
+            "estimated_reduction": round(float(crop_reduction[i]), 2)
+        }
+        for i, crop in enumerate(crops.tolist())
+    ]
+
+    return {
+        "farm_data": rows,
+        "reductions": reductions,
+        "crop_totals": crop_totals,
+        "total_carbon_footprint": round(float(footprint_totals.sum()), 2),
+        "total_estimated_reduction": round(float(reduction.sum()), 2),
+        "emission_factors": factors
+    }
+
+
+def summarize_carbon_footprint(result):
+    """Render the per-crop totals of a compute_carbon_footprint result for prompting."""
+    factors = result["emission_factors"]
+    lines = [
+        f"- Emission factors ({factors['version']}): Fertilizer {factors['fertilizer']} kg CO2e/kg, "
+        f"Pesticide {factors['pesticide']} kg CO2e/kg"
+    ]
+    lines.extend(
+        f"- {item['crop_type']}: {item['farms']} farms, {item['carbon_footprint']} kg CO2e, "
+        f"{item['estimated_reduction']} kg CO2e potential reduction"
+        for item in result["crop_totals"]
+    )
+    lines.append(f"- Total Carbon Footprint: {result['total_carbon_footprint']} kg CO2e")
+    lines.append(f"- Total Potential Reduction: {result['total_estimated_reduction']} kg CO2e")
+    return "\n".join(lines)
@@ -0,0 +1,200 @@
+"""Record real Groq, web search and weather API interactions once, then replay them offline.
+
+CASSETTE_MODE=record appends every request/response pair, with how long the
+call took, to CASSETTE_PATH (one JSON object per line). CASSETTE_MODE=replay
+answers the same requests from that file, keyed by a hash of the request,
+without touching the network; a request that was never recorded raises
+CassetteMiss. Replays sleep for the recorded duration unless
+CASSETTE_LATENCY=zero.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+
+MODE = os.getenv("CASSETTE_MODE", OFF).lower() or OFF
+PATH = Path(os.getenv("CASSETTE_PATH", Path(__file__).parent.parent / "db" / "cassette.jsonl"))
+# "recorded" sleeps as long as the original call took, "zero" replays instantly
+LATENCY = os.getenv("CASSETTE_LATENCY", "recorded").lower()
+
+_lock = threading.Lock()
+_recordings = None
+_positions = {}
+_stats = {"recorded": 0, "replayed": 0, "misses": 0}
+_by_kind = {}
+
+
+class CassetteMiss(LookupError):
+    """A replayed request that is not in the cassette."""
+
+
+def configure(mode=None, path=None, latency=None):
+    """Change mode, file or replay latency at runtime; call before the first request is made."""
+    global MODE, PATH, LATENCY, _recordings
+    with _lock:
+        if mode is not None:
+            MODE = mode
+        if path is not None:
+            PATH = Path(path)
+        if latency is not None:
+            LATENCY = latency
+        _recordings = None
+        _positions.clear()
+
+
+def enabled():
+    return MODE in (RECORD, REPLAY)
+
+
+def request_key(kind, request):
+    """Stable hash of a request; dict keys are sorted so argument order does not matter."""
+    text = json.dumps([kind, request], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _load():
+    global _recordings
+    if _recordings is None:
+        recordings = {}
+        if PATH.exists():
+            with open(PATH, encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        recordings.setdefault(entry["key"], []).append(entry)
+        _recordings = recordings
+    return _recordings
+
+
+def _next_recording(kind, request):
+    key = request_key(kind, request)
+    with _lock:
+        entries = _load().get(key)
+        if not entries:
+            _stats["misses"] += 1
+            raise CassetteMiss(f"No recorded {kind} response for {json.dumps(request, default=str)[:200]}")
+        # Identical requests get their recordings in the order they were made, then start over
+        position = _positions.get(key, 0)
+        _positions[key] = position + 1
+        _stats["replayed"] += 1
+        _by_kind[kind] = _by_kind.get(kind, 0) + 1
+    return entries[position % len(entries)]
+
+
+def _delay(entry):
+    return 0 if LATENCY == "zero" else entry["elapsed_s"]
+
+
+def _record(kind, request, response, elapsed):
+    entry = {
+        "kind": kind,
+        "key": request_key(kind, request),
+        "request": request,
+        "response": response,
+        "elapsed_s": round(elapsed, 4),
+        "recorded_at": round(time.time(), 3)
+    }
+    line = json.dumps(entry, default=str)
+    with _lock:
+        PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(PATH, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+        _stats["recorded"] += 1
+        _by_kind[kind] = _by_kind.get(kind, 0) + 1
+
+
+def call(kind, request, fn, encode=None, decode=None):
+    """Run fn() through the cassette: passed through when off, recorded, or answered from the file.
+
+    request is the JSON-serialisable description the recording is keyed on;
+    encode and decode convert fn's result to JSON data and back.
+    """
+    if MODE == REPLAY:
+        entry = _next_recording(kind, request)
+        time.sleep(_delay(entry))
+        return decode(entry["response"]) if decode else entry["response"]
+    if MODE != RECORD:
+        return fn()
+    started = time.perf_counter()
+    result = fn()
+    _record(kind, request, encode(result) if encode else result, time.perf_counter() - started)
+    return result
+
+
+async def acall(kind, request, afn, encode=None, decode=None):
+    """call() for coroutines: afn is awaited when recording or off, replays sleep on the event loop."""
+    if MODE == REPLAY:
+        entry = await asyncio.to_thread(_next_recording, kind, request)
+        await asyncio.sleep(_delay(entry))
+        return decode(entry["response"]) if decode else entry["response"]
+    if MODE != RECORD:
+        return await afn()
+    started = time.perf_counter()
+    result = await afn()
+    await asyncio.to_thread(_record, kind, request, encode(result) if encode else result, time.perf_counter() - started)
+    return result
+
+
+def chat_request(model, temperature, messages, stop, kwargs):
+    return {
+        "model": model,
+        "temperature": temperature,
+        "messages": [[message.type, message.content] for message in messages],
+        "stop": stop,
+        "kwargs": kwargs
+    }
+
+
+def encode_chat_result(result):
+    return {
+        "generations": [
+            {"content": generation.message.content, "generation_info": generation.generation_info}
+            for generation in result.generations
+        ],
+        "llm_output": result.llm_output
+    }
+
+
+def decode_chat_result(data):
+    return ChatResult(
+        generations=[
+            ChatGeneration(message=AIMessage(content=generation["content"]), generation_info=generation["generation_info"])
+            for generation in data["generations"]
+        ],
+        llm_output=data["llm_output"]
+    )
+
+
+class CassetteSearch:
+    """Search client whose run() goes through the cassette; the real client is only built to record."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+
+    def run(self, query):
+        def search():
+            if self._client is None:
+                self._client = self._factory()
+            return self._client.run(query)
+        return call("search", {"query": query}, search)
+
+
+def cassette_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["by_kind"] = dict(_by_kind)
+    stats["mode"] = MODE
+    if MODE == REPLAY:
+        stats["latency"] = LATENCY
+    return stats
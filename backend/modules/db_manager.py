@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+script_dir = Path(__file__).parent.absolute()
+DB_PATHS = {
+    "farming": script_dir.parent / "db" / "farming_memory.db",
+    "memory": script_dir.parent / "db" / "memory.db",
+    "cache": script_dir.parent / "db" / "cache.db"
+}
+
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+STATEMENT_CACHE_SIZE = 256
+LOCK_RETRIES = 3
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY"
+)
+
+_local = threading.local()
+
+
+def _resolve(db):
+    return os.path.realpath(DB_PATHS.get(db, db))
+
+
+def get_connection(db):
+    """Return this thread's pooled connection to a database name ("farming", "memory", "cache") or path."""
+    path = _resolve(db)
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        connections[path] = conn
+    return conn
+
+
+def _is_locked(error):
+    return "locked" in str(error) or "busy" in str(error)
+
+
+@contextmanager
+def transaction(db):
+    """Run a block in a transaction on the pooled connection, committing on success."""
+    conn = get_connection(db)
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def execute_write(db, fn):
+    """Run fn(conn) in a transaction, retrying if the database stays locked past the busy timeout."""
+    for attempt in range(LOCK_RETRIES):
+        try:
+            with transaction(db) as conn:
+                return fn(conn)
+        except sqlite3.OperationalError as e:
+            if not _is_locked(e) or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(0.05 * 2 ** attempt)
+
+
+def fetchall(db, sql, params=()):
+    return get_connection(db).execute(sql, params).fetchall()
+
+
+def fetchone(db, sql, params=()):
+    return get_connection(db).execute(sql, params).fetchone()
+
+
+def fetchall_readonly(db, sql, params=()):
+    """fetchall for untrusted SQL (e.g. LLM-generated): writes are refused and nothing is left open on the pooled connection."""
+    conn = get_connection(db)
+    conn.execute("PRAGMA query_only=ON")
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute("PRAGMA query_only=OFF")
+
+
+def close_thread_connections():
+    """Close the calling thread's pooled connections."""
+    connections = getattr(_local, "connections", {})
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
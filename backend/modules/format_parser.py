@@ -0,0 +1,300 @@
+import re
+
+# Deterministic parsers for the bullet formats the agents ask their LLMs for.
+# Each parse_* function maps an agent result onto the DecisionAgent template
+# schema, or returns None so the caller can fall back to LLM formatting.
+
+BULLET = re.compile(r"^(\s*)(?:[-*•]\s*|\d+[.)]\s+)(.+)$")
+PARAMETER = re.compile(r"([A-Za-z][A-Za-z_ ]*?)\s*\(([^()]*)\)")
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+RANKED_CROP = re.compile(r"([A-Za-z][A-Za-z \-]*?)\s*(?:\(|:|-)\s*[A-Za-z_ ]*:?\s*(\d+(?:\.\d+)?)")
+
+MARKET_PARAMETERS = (
+    "Competitor_Price_per_ton",
+    "Consumer_Trend_Index",
+    "Demand_Index",
+    "Economic_Indicator",
+    "Market_Price_per_ton",
+    "Seasonal_Factor",
+    "Supply_Index",
+    "Weather_Impact_Score"
+)
+
+
+def parse_bullets(text):
+    """Parse indented "- Key: value" lines into a tree of {"key", "value", "children"} nodes."""
+    root = {"key": None, "value": "", "children": []}
+    stack = [(-1, root)]
+    for raw_line in str(text).splitlines():
+        line = raw_line.replace("\t", "    ").replace("**", "").replace("`", "").rstrip()
+        if not line.strip():
+            continue
+        match = BULLET.match(line)
+        if not match:
+            node = stack[-1][1]
+            if node is not root:
+                node["value"] = (node["value"] + " " + line.strip()).strip()
+            continue
+
+        indent = len(match.group(1))
+        key, sep, value = match.group(2).partition(":")
+        if not sep:
+            key, value = match.group(2), ""
+        node = {"key": key.strip().strip("<>").strip(), "value": value.strip(), "children": []}
+        while stack[-1][0] >= indent:
+            stack.pop()
+        stack[-1][1]["children"].append(node)
+        stack.append((indent, node))
+    return root["children"]
+
+
+def _normalize(key):
+    return re.sub(r"[^a-z0-9]", "", key.lower())
+
+
+def find(nodes, name):
+    """Depth-first search for the first node whose key starts with name, ignoring case and punctuation."""
+    target = _normalize(name)
+    for node in nodes:
+        if _normalize(node["key"]).startswith(target):
+            return node
+    for node in nodes:
+        found = find(node["children"], name)
+        if found:
+            return found
+    return None
+
+
+def _text(node):
+    if node is None:
+        return ""
+    return node["value"].strip().strip("<>").strip()
+
+
+def _number(text):
+    text = text.strip().rstrip("%").strip()
+    if re.fullmatch(r"-?\d+", text):
+        return int(text)
+    if re.fullmatch(r"-?\d+\.\d+", text):
+        return float(text)
+    return text
+
+
+def _parameters(node, as_lists=False):
+    """Read "Name (value)" pairs from a node's value, or "Name: value" children."""
+    parameters = {}
+    if node is None:
+        return parameters
+    for name, value in PARAMETER.findall(node["value"]):
+        name = name.strip().replace(" ", "_")
+        if as_lists:
+            parameters[name] = [float(n) for n in NUMBER.findall(value)]
+        else:
+            parameters[name] = _number(value)
+    for child in node["children"]:
+        name = child["key"].replace(" ", "_")
+        if as_lists:
+            parameters[name] = [float(n) for n in NUMBER.findall(child["value"])]
+        else:
+            parameters[name] = _number(child["value"])
+    return parameters
+
+
+def _crop_name(key):
+    # Drop numbering such as "Crop 1: Soybean" or "1. Soybean"
+    key = re.sub(r"^(crop\s*\d+|\d+[.)])\s*", "", key.strip(), flags=re.I)
+    return key.strip().strip("<>:").strip()
+
+
+def _ranked_crops(node):
+    """Read "Soybean (8.2), Corn (7.9)" style rankings, inline or as child bullets."""
+    if node is None:
+        return []
+    lines = [node["value"]] + [f"{child['key']}: {child['value']}" for child in node["children"]]
+    ranked = []
+    for line in lines:
+        for name, score in RANKED_CROP.findall(line):
+            ranked.append((_crop_name(name), float(score)))
+    if not ranked:
+        names = [name for line in lines for name in re.split(r",|\band\b", line)]
+        ranked = [(_crop_name(name), None) for name in names if _crop_name(name)]
+    return [(name, score) for name, score in ranked if name]
+
+
+def _crop_children(node, parameter_key="Parameters"):
+    """Map each crop child of node to (crop, parameters node, child node)."""
+    crops = []
+    if node is None:
+        return crops
+    for child in node["children"]:
+        crop = _crop_name(child["key"])
+        if not crop:
+            continue
+        if _normalize(crop) == _normalize(parameter_key) and crops:
+            # "- Parameters:" written as a sibling of its crop line instead of nested under it
+            previous = crops[-1]
+            crops[-1] = (previous[0], child, previous[2])
+            continue
+        parameters = find(child["children"], parameter_key)
+        if parameters is None and child["value"]:
+            # "- Corn: Parameters: Corn: Market_Price_per_ton (300), ..." on one line
+            parameters = {"key": parameter_key, "value": child["value"], "children": []}
+        crops.append((crop, parameters, child))
+    return crops
+
+
+def _lookup(mapping, crop):
+    for name, value in mapping.items():
+        if name.lower() == crop.lower():
+            return value
+    return None
+
+
+def parse_sustainability(data):
+    analysis_nodes = parse_bullets(data.get("sustainability_analysis", ""))
+    comparison_nodes = parse_bullets(data.get("top3_comparison", ""))
+    trend_nodes = parse_bullets(data.get("web_trends", ""))
+
+    analysis = _text(find(analysis_nodes, "Analysis"))
+    scores_node = find(analysis_nodes, "Sustainability Scores")
+    ranking = _ranked_crops(find(comparison_nodes, "Top 3 Crops"))
+    trending = _crop_children(find(trend_nodes, "Trending Crops"))
+    if not analysis or scores_node is None or not ranking or not trending:
+        return None
+
+    compared = {
+        crop: _parameters(parameters)
+        for crop, parameters, _ in _crop_children(find(comparison_nodes, "Parameters Comparison"))
+    }
+    return {
+        "sustainability_analysis": {
+            "analysis": analysis,
+            "crop": data.get("crop_type", trending[0][0]),
+            "parameters": _parameters(find(analysis_nodes, "Parameters"), as_lists=True),
+            "sustainability_scores": [float(n) for n in NUMBER.findall(scores_node["value"])]
+        },
+        "top3_comparison": {
+            "insights": _text(find(comparison_nodes, "Insights")),
+            "top_crops": [
+                {
+                    "crop": crop,
+                    "parameters": _lookup(compared, crop) or {},
+                    "score": score if score is not None else 0.0
+                }
+                for crop, score in ranking[:3]
+            ]
+        },
+        "web_trends": {
+            "trending_crops": [
+                {
+                    "crop": crop,
+                    "parameters": _parameters(parameters),
+                    "source": _text(find(child["children"], "Source")),
+                    "strength": _text(find(child["children"], "Strength"))
+                }
+                for crop, parameters, child in trending
+            ]
+        }
+    }
+
+
+def _parameter_trends(node):
+    """Each market parameter's "True"/"False" rising flag, or "Unknown" when the model gave none."""
+    flags = {}
+    for child in (node or {"children": []})["children"]:
+        match = re.match(r"(true|false)\b", _text(child), re.I)
+        if match:
+            flags[_normalize(child["key"])] = match.group(1).capitalize()
+    return {name: flags.get(_normalize(name), "Unknown") for name in MARKET_PARAMETERS}
+
+
+def parse_market(data):
+    analysis_nodes = parse_bullets(data.get("market_analysis", ""))
+    comparison_nodes = parse_bullets(data.get("top3_market_comparison", ""))
+    trend_nodes = parse_bullets(data.get("web_market_trends", ""))
+
+    rising_node = find(analysis_nodes, "Rising") or find(analysis_nodes, "Analysis")
+    ranking = _ranked_crops(find(comparison_nodes, "Top 3 Crops"))
+    trending = _crop_children(find(trend_nodes, "Trending Crops"))
+    if rising_node is None or not ranking or not trending:
+        return None
+    flag, _, reason = _text(rising_node).partition(",")
+    if flag.strip().lower() not in ("true", "false"):
+        return None
+
+    rising = flag.strip().lower() == "true"
+    crops = {}
+    for crop, parameters, child in trending:
+        crops[crop] = _parameters(parameters)
+        crops[crop]["rising_percentage"] = _text(find(child["children"], "Rising percentage"))
+        crops[crop]["source"] = _text(find(child["children"], "Source"))
+        crops[crop]["strength"] = _text(find(child["children"], "Strength"))
+
+    return {
+        "market_analysis": {
+            "analysis": _parameter_trends(find(analysis_nodes, "Parameter Trends")),
+            "overall_trend": f"{'Rising' if rising else 'Non-rising'} ({rising}): {reason.strip()}".rstrip(": ")
+        },
+        "top3_market_comparison": {
+            "insights": _text(find(comparison_nodes, "Insights")),
+            "parameters_comparison": {
+                crop: _parameters(parameters)
+                for crop, parameters, _ in _crop_children(find(comparison_nodes, "Parameters Comparison"))
+            },
+            "top_crops": [crop for crop, _ in ranking[:3]]
+        },
+        "web_market_trends": {
+            "crops": crops
+        }
+    }
+
+
+def _strategies(text, section, percentage_key):
+    strategies = []
+    for child in (find(parse_bullets(text), section) or {"children": []})["children"]:
+        description = _text(find(child["children"], "Description"))
+        if not description:
+            continue
+        strategies.append({
+            "description": description,
+            percentage_key.lower(): _text(find(child["children"], percentage_key)),
+            "source": _text(find(child["children"], "Source"))
+        })
+    return strategies
+
+
+def parse_carbon(data):
+    strategies = _strategies(data.get("web_carbon_trends", ""), "Reduction Strategies", "Reduction_Percentage")
+    if not strategies or not isinstance(data.get("farm_data"), list) or "total_carbon_footprint" not in data:
+        return None
+    return {
+        "carbon_footprint_calculation": {
+            "farm_data": data["farm_data"],
+            "summary": data.get("carbon_footprint_calculation", ""),
+            "total_carbon_footprint": data["total_carbon_footprint"]
+        },
+        "reduction_insights": {
+            "reductions": data.get("reductions", []),
+            "summary": data.get("reduction_insights", "")
+        },
+        "web_carbon_trends": {
+            "reduction_strategies": strategies
+        },
+        "emission_factors": data.get("emission_factors"),
+        "prompt_compaction": data.get("prompt_compaction")
+    }
+
+
+def parse_water(data):
+    strategies = _strategies(data.get("web_water_trends", ""), "Conservation Strategies", "Savings_Percentage")
+    if not strategies or not isinstance(data.get("farm_data"), list) or "total_water_usage_liters" not in data:
+        return None
+    return {
+        "conservation_insights": data.get("water_usage_by_crop", []),
+        "conservation_summary": data.get("conservation_insights", ""),
+        "farm_data": data["farm_data"],
+        "total_water_usage_liters": data["total_water_usage_liters"],
+        "water_conservation_strategies": strategies,
+        "water_usage_summary": data.get("water_usage_calculation", ""),
+        "prompt_compaction": data.get("prompt_compaction")
+    }
@@ -0,0 +1,213 @@
+import asyncio
+import contextvars
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import Runnable
+from modules.db_manager import get_connection, execute_write
+
+# Seconds a cached response stays valid, per namespace
+NAMESPACE_TTLS = {
+    "default": 6 * 3600,
+    "sustainability": 12 * 3600,
+    "market": 6 * 3600,
+    "carbon": 12 * 3600,
+    "water": 12 * 3600,
+    "weather": 3600,
+    "decision": 6 * 3600,
+    "memory": 24 * 3600,
+    "feedback": 24 * 3600
+}
+MEMORY_CACHE_SIZE = int(os.getenv("LLM_CACHE_MEMORY_SIZE", "256"))
+DISK_CACHE_SIZE = int(os.getenv("LLM_CACHE_DISK_SIZE", "5000"))
+CACHE_DISABLED = os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes")
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "evictions": 0}
+_bypass = contextvars.ContextVar("llm_cache_bypass", default=False)
+_table_ready = False
+
+
+@contextmanager
+def bypass_cache(enabled=True):
+    """Skip cache lookups (but still store fresh responses) inside this block."""
+    token = _bypass.set(enabled)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def _connect():
+    global _table_ready
+    conn = get_connection("cache")
+    if _table_ready:
+        return conn
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            namespace TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+    conn.commit()
+    _table_ready = True
+    return conn
+
+
+def _prompt_text(prompt):
+    if hasattr(prompt, "to_string"):
+        return prompt.to_string()
+    if isinstance(prompt, list):
+        return repr([(getattr(m, "type", ""), getattr(m, "content", m)) for m in prompt])
+    return str(prompt)
+
+
+def cache_key(model, temperature, prompt, **kwargs):
+    text = _prompt_text(prompt)
+    if kwargs:
+        text += repr(sorted(kwargs.items()))
+    prompt_hash = hashlib.sha256(text.encode()).hexdigest()
+    return f"{model}:{temperature}:{prompt_hash}"
+
+
+def _lookup(namespace, key):
+    ttl = NAMESPACE_TTLS.get(namespace, NAMESPACE_TTLS["default"])
+    now = time.time()
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            if now - entry[1] < ttl:
+                _memory.move_to_end(key)
+                _stats["memory_hits"] += 1
+                return entry[0]
+            del _memory[key]
+
+    row = _connect().execute(
+        "SELECT content, created_at FROM llm_cache WHERE key = ? AND namespace = ?",
+        (key, namespace)
+    ).fetchone()
+    if row and now - row[1] < ttl:
+        _remember(key, row[0], row[1])
+        with _lock:
+            _stats["disk_hits"] += 1
+        return row[0]
+    return None
+
+
+def _remember(key, content, created_at):
+    with _lock:
+        _memory[key] = (content, created_at)
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_CACHE_SIZE:
+            _memory.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def _store(namespace, key, content):
+    created_at = time.time()
+    _remember(key, content, created_at)
+
+    def write(conn):
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, namespace, content, created_at) VALUES (?, ?, ?, ?)",
+            (key, namespace, content, created_at)
+        )
+        return conn.execute(
+            "DELETE FROM llm_cache WHERE key IN "
+            "(SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (DISK_CACHE_SIZE,)
+        ).rowcount
+
+    _connect()
+    evicted = execute_write("cache", write)
+    if evicted:
+        with _lock:
+            _stats["evictions"] += evicted
+
+
+def clear_llm_cache(namespace=None):
+    """Drop cached responses, either everything or a single namespace."""
+    with _lock:
+        _memory.clear()
+    conn = _connect()
+    if namespace:
+        conn.execute("DELETE FROM llm_cache WHERE namespace = ?", (namespace,))
+    else:
+        conn.execute("DELETE FROM llm_cache")
+    conn.commit()
+
+
+def llm_cache_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["memory_entries"] = len(_memory)
+    hits = stats["memory_hits"] + stats["disk_hits"]
+    lookups = hits + stats["misses"]
+    stats["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+    return stats
+
+
+class CachedLLM(Runnable):
+    """Content-addressed cache around a chat model, usable anywhere the model was.
+
+    Instead of a client, a factory can be given together with the model and
+    temperature used in cache keys; it is only called on the first cache miss.
+    """
+
+    def __init__(self, client=None, namespace="default", factory=None, model=None, temperature=None):
+        self._client = client
+        self._factory = factory
+        self.namespace = namespace
+        self.model = model or getattr(client, "model_name", type(client).__name__)
+        self.temperature = temperature if temperature is not None else getattr(client, "temperature", None)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._factory()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def invoke(self, input, config=None, bypass=False, **kwargs):
+        key = cache_key(self.model, self.temperature, input, **kwargs)
+        if CACHE_DISABLED or bypass or _bypass.get():
+            with _lock:
+                _stats["bypassed"] += 1
+        else:
+            content = _lookup(self.namespace, key)
+            if content is not None:
+                return AIMessage(content=content)
+            with _lock:
+                _stats["misses"] += 1
+
+        response = self.client.invoke(input, config, **kwargs)
+        _store(self.namespace, key, response.content)
+        return response
+
+    async def ainvoke(self, input, config=None, bypass=False, **kwargs):
+        key = cache_key(self.model, self.temperature, input, **kwargs)
+        if CACHE_DISABLED or bypass or _bypass.get():
+            with _lock:
+                _stats["bypassed"] += 1
+        else:
+            # SQLite lookups and writes stay off the event loop
+            content = await asyncio.to_thread(_lookup, self.namespace, key)
+            if content is not None:
+                return AIMessage(content=content)
+            with _lock:
+                _stats["misses"] += 1
+
+        response = await self.client.ainvoke(input, config, **kwargs)
+        await asyncio.to_thread(_store, self.namespace, key, response.content)
+        return response
@@ -1,37 +1,255 @@
-import sqlite3
 import os
-from langchain_groq import ChatGroq
+import json
+import atexit
+import queue
+import threading
+import time
 from langchain.prompts import PromptTemplate
-from dotenv import load_dotenv
+from modules.registry import get_cached_llm
+from modules.db_manager import execute_write
+from modules.rate_governor import BACKGROUND, priority
 
-load_dotenv()
-groq_api_key = os.getenv("GROQ_API_KEY")
+llm = get_cached_llm("llama-3.3-70b-versatile", namespace="memory")
 
-llm = ChatGroq(
-    model_name="llama-3.3-70b-versatile",
-    temperature=0.7,
-    groq_api_key=groq_api_key
-)
+WRITE_BEHIND = os.getenv("MEMORY_WRITE_BEHIND", "1").lower() not in ("0", "false", "no")
+QUEUE_SIZE = int(os.getenv("MEMORY_QUEUE_SIZE", "256"))
+BATCH_SIZE = int(os.getenv("MEMORY_BATCH_SIZE", "16"))
+ENQUEUE_TIMEOUT = 0.5
+BATCH_LINGER = 0.05
+WRITE_RETRIES = int(os.getenv("MEMORY_WRITE_RETRIES", "3"))
+WRITE_RETRY_DELAY = 0.2
 
-def store_crux(agent_name, crux, update=False):
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_worker = None
+_worker_lock = threading.Lock()
+_metrics_lock = threading.Lock()
+_memory_version = 0
+_metrics = {
+    "enqueued": 0,
+    "written": 0,
+    "coalesced": 0,
+    "failed": 0,
+    "unsummarized": 0,
+    "write_retries": 0,
+    "sync_writes": 0,
+    "batches": 0,
+    "last_lag_s": 0.0,
+    "max_lag_s": 0.0
+}
+
+
+def summarize_crux(crux):
     prompt = PromptTemplate.from_template("Summarize this in one to two sentences keeping the most important context that can be used to reference later: {text}")
-    formatted_prompt = prompt.format(text=crux) 
-    short_crux = llm.invoke(formatted_prompt).content.strip()  
-    db_path = os.path.join(os.path.dirname(__file__), '..', 'db', 'memory.db')
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    if update:
-        cursor.execute('''
-            INSERT INTO memory (agent_name, crux)
-            VALUES (?, ?)
-            ON CONFLICT(agent_name) DO UPDATE SET crux=excluded.crux, timestamp=CURRENT_TIMESTAMP
-        ''', (agent_name, short_crux))
-    else:
-        cursor.execute('''
-            INSERT INTO memory (agent_name, crux)
-            VALUES (?, ?)
-        ''', (agent_name, short_crux))
-
-    conn.commit()
-    conn.close()
+    formatted_prompt = prompt.format(text=crux)
+    return llm.invoke(formatted_prompt).content.strip()
+
+
+def _summary_or_raw(agent_name, crux):
+    """summarize_crux, keeping the insight as given when the LLM call fails."""
+    try:
+        return summarize_crux(crux)
+    except Exception as e:
+        print(f"Summarizing {agent_name} insight failed, storing it unsummarized: {e}")
+        with _metrics_lock:
+            _metrics["unsummarized"] += 1
+        return crux
+
+
+def summarize_cruxes(items):
+    """Summarize (agent_name, crux) pairs in a single LLM call.
+
+    Returns a list of {"agent_name", "summary"} dicts in the order of items,
+    falling back to one call per item if the batched output can't be parsed,
+    and to the raw crux for an item whose own call fails.
+    """
+    if len(items) <= 1:
+        return [{"agent_name": agent_name, "summary": _summary_or_raw(agent_name, crux)} for agent_name, crux in items]
+
+    sections = "\n\n".join(
+        f"[{i}] ({agent_name})\n{crux}" for i, (agent_name, crux) in enumerate(items, start=1)
+    )
+    prompt = PromptTemplate.from_template(
+        "Summarize each numbered text below in one to two sentences keeping the most important context that can be used to reference later.\n"
+        "Return ONLY a JSON object mapping each number to its summary, like {{\"1\": \"...\", \"2\": \"...\"}}.\n\n{sections}"
+    )
+    formatted_prompt = prompt.format(sections=sections)
+    try:
+        response = llm.invoke(formatted_prompt).content.strip()
+        if response.startswith("```json") and response.endswith("```"):
+            response = response[7:-3].strip()
+        elif response.startswith("```") and response.endswith("```"):
+            response = response[3:-3].strip()
+        summaries = json.loads(response)
+        results = []
+        for i, (agent_name, _) in enumerate(items, start=1):
+            summary = summaries[str(i)]
+            if not isinstance(summary, str) or not summary.strip():
+                raise ValueError(f"Missing summary for item {i}")
+            results.append({"agent_name": agent_name, "summary": summary.strip()})
+        return results
+    except Exception as e:
+        print(f"Batched summarization failed, summarizing items one by one: {e}")
+        return [{"agent_name": agent_name, "summary": _summary_or_raw(agent_name, crux)} for agent_name, crux in items]
+
+
+def _write_rows(rows):
+    """Write (agent_name, short_crux, update) rows in a single transaction."""
+    def write(conn):
+        cursor = conn.cursor()
+        for agent_name, short_crux, update in rows:
+            if update:
+                cursor.execute('''
+                    INSERT INTO memory (agent_name, crux)
+                    VALUES (?, ?)
+                    ON CONFLICT(agent_name) DO UPDATE SET crux=excluded.crux, timestamp=CURRENT_TIMESTAMP
+                ''', (agent_name, short_crux))
+            else:
+                cursor.execute('''
+                    INSERT INTO memory (agent_name, crux)
+                    VALUES (?, ?)
+                ''', (agent_name, short_crux))
+
+    execute_write("memory", write)
+    _bump_memory_version()
+
+
+def _bump_memory_version():
+    global _memory_version
+    with _metrics_lock:
+        _memory_version += 1
+
+
+def memory_version():
+    """Counter bumped after every write to the memory table, used to invalidate readers' caches."""
+    return _memory_version
+
+
+def _coalesce(entries):
+    """Drop updates that a later update to the same agent_name would overwrite anyway."""
+    last_update = {}
+    for i, (agent_name, _, update, _) in enumerate(entries):
+        if update:
+            last_update[agent_name] = i
+    return [
+        entry for i, entry in enumerate(entries)
+        if not entry[2] or last_update[entry[0]] == i
+    ]
+
+
+def _write_with_retry(rows):
+    """Write rows, retrying a failed transaction (usually a locked database) with a growing delay."""
+    for attempt in range(WRITE_RETRIES + 1):
+        try:
+            _write_rows(rows)
+            return
+        except Exception:
+            if attempt == WRITE_RETRIES:
+                raise
+            with _metrics_lock:
+                _metrics["write_retries"] += 1
+            time.sleep(WRITE_RETRY_DELAY * 2 ** attempt)
+
+
+def _write_batch(rows):
+    """Write rows in one transaction, or row by row if it keeps failing; returns the rows that could not be written."""
+    try:
+        _write_with_retry(rows)
+        return []
+    except Exception as e:
+        if len(rows) == 1:
+            print(f"Error writing memory for {rows[0][0]}: {e}")
+            return rows
+        print(f"Error writing memory batch, writing its {len(rows)} rows one by one: {e}")
+    failed = []
+    for row in rows:
+        failed.extend(_write_batch([row]))
+    return failed
+
+
+def _process(entries, raise_errors=False):
+    kept = _coalesce(entries)
+    summaries = summarize_cruxes([(agent_name, crux) for agent_name, crux, _, _ in kept])
+    rows = [(item["agent_name"], item["summary"], entry[2]) for item, entry in zip(summaries, kept)]
+    failed = _write_batch(rows)
+    if failed:
+        with _metrics_lock:
+            _metrics["failed"] += len(failed)
+        if raise_errors:
+            raise RuntimeError(f"Could not write memory for {', '.join(row[0] for row in failed)}")
+
+    lag = time.time() - min(entry[3] for entry in entries)
+    with _metrics_lock:
+        _metrics["written"] += len(kept) - len(failed)
+        _metrics["coalesced"] += len(entries) - len(kept)
+        _metrics["batches"] += 1
+        _metrics["last_lag_s"] = round(lag, 3)
+        _metrics["max_lag_s"] = round(max(_metrics["max_lag_s"], lag), 3)
+
+
+def _run_worker():
+    while True:
+        entries = [_queue.get()]
+        # Agents store several insights back to back, linger briefly so they share one batch
+        deadline = time.time() + BATCH_LINGER
+        while len(entries) < BATCH_SIZE:
+            try:
+                entries.append(_queue.get(timeout=max(deadline - time.time(), 0)))
+            except queue.Empty:
+                break
+        try:
+            # Summaries can wait; requests someone is waiting on get the Groq budget first
+            with priority(BACKGROUND):
+                _process(entries)
+        finally:
+            for _ in entries:
+                _queue.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name="memory-writer", daemon=True)
+            _worker.start()
+
+
+def store_crux(agent_name, crux, update=False):
+    """Queue an insight to be summarized and persisted by the background writer."""
+    entry = (agent_name, crux, update, time.time())
+    if not WRITE_BEHIND:
+        _process([entry], raise_errors=True)
+        return
+
+    _ensure_worker()
+    try:
+        _queue.put(entry, timeout=ENQUEUE_TIMEOUT)
+        with _metrics_lock:
+            _metrics["enqueued"] += 1
+    except queue.Full:
+        # Apply backpressure to the caller instead of dropping the insight
+        with _metrics_lock:
+            _metrics["sync_writes"] += 1
+        _process([entry])
+
+
+def flush_memory(timeout=30):
+    """Block until queued insights are written, or the timeout expires."""
+    deadline = time.time() + timeout
+    with _queue.all_tasks_done:
+        while _queue.unfinished_tasks:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            _queue.all_tasks_done.wait(remaining)
+    return True
+
+
+def memory_queue_stats():
+    with _metrics_lock:
+        stats = dict(_metrics)
+    stats["queue_depth"] = _queue.qsize()
+    stats["queue_capacity"] = QUEUE_SIZE
+    return stats
+
+
+atexit.register(flush_memory)
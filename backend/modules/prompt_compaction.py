@@ -0,0 +1,107 @@
+import math
+import os
+
+import numpy as np
+
+# Upper bound, in estimated tokens, on the farm context (per-crop summary plus digest) interpolated into a prompt
+TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "600"))
+# Most outlier farms listed in a digest, budget permitting
+TOP_K_OUTLIERS = int(os.getenv("PROMPT_TOP_K_OUTLIERS", "10"))
+QUANTILES = (10, 50, 90)
+
+
+def estimate_tokens(text):
+    """Rough token count: about 4 characters per token for English text and numbers."""
+    return math.ceil(len(text) / 4)
+
+
+def distinct_crops(rows, column=1):
+    """Space-separated distinct crop names from query rows, in first-seen order."""
+    return " ".join(dict.fromkeys(str(row[column]) for row in rows))
+
+
+def _format(value):
+    # NULL readings arrive as None (or NaN once in an array)
+    if value is None or np.isnan(value):
+        return "n/a"
+    return f"{value:.2f}"
+
+
+def _crop_line(crop, values, fields, quantiles):
+    parts = []
+    for field in fields:
+        known = values[field][~np.isnan(values[field])]
+        if not len(known):
+            parts.append(f"{field} n/a")
+            continue
+        part = f"{field} mean {known.mean():.2f}"
+        if quantiles:
+            points = np.percentile(known, QUANTILES)
+            part += " [" + ", ".join(f"p{q} {p:.2f}" for q, p in zip(QUANTILES, points)) + "]"
+        parts.append(part)
+    return f"- {crop} ({len(values[fields[0]])} farms): " + "; ".join(parts)
+
+
+def _fits(lines, budget):
+    return estimate_tokens("\n".join(lines)) <= budget
+
+
+def compact_farm_rows(rows, fields, score, budget=None, top_k=None):
+    """Digest per-farm result rows (dicts with crop_type, farm_id and fields) in at most budget tokens.
+
+    Per-crop means and p10/p50/p90 come first, then the farms with the highest
+    score. Quantiles, then outliers, are dropped when they do not fit, so the
+    digest stays the same size however many rows the table has. Statistics
+    use the known values only; missing ones are listed as n/a.
+    """
+    budget = TOKEN_BUDGET if budget is None else budget
+    top_k = TOP_K_OUTLIERS if top_k is None else top_k
+    if not rows:
+        return ""
+
+    crops = np.array([str(row["crop_type"]) for row in rows])
+    columns = {field: np.array([np.nan if row[field] is None else row[field] for row in rows], dtype=float) for field in fields}
+    by_crop = [(crop, {field: columns[field][crops == crop] for field in fields}) for crop in np.unique(crops).tolist()]
+
+    lines = [_crop_line(crop, values, fields, True) for crop, values in by_crop]
+    if not _fits(lines, budget):
+        lines = [_crop_line(crop, values, fields, False) for crop, values in by_crop]
+    while lines and not _fits(lines, budget):
+        lines.pop()
+
+    header = f"- Farms with the highest {score}:"
+    outliers = []
+    # Farms without a score sort last and are never listed as outliers
+    ranked = [i for i in np.argsort(-columns[score], kind="stable").tolist() if not np.isnan(columns[score][i])]
+    for i in ranked[:top_k]:
+        row = rows[i]
+        line = f"  - Farm {row['farm_id']} ({row['crop_type']}): " + ", ".join(f"{field} {_format(row[field])}" for field in fields)
+        if not _fits(lines + [header] + outliers + [line], budget):
+            break
+        outliers.append(line)
+    if outliers:
+        lines += [header] + outliers
+    return "\n".join(lines)
+
+
+def compact_context(summary, rows, fields, score, budget=None, top_k=None):
+    """The per-crop summary followed by a farm digest, the two together within budget tokens.
+
+    The digest gets whatever the summary leaves; a summary that alone
+    exceeds the budget is sent without a digest.
+    """
+    budget = TOKEN_BUDGET if budget is None else budget
+    remaining = budget - estimate_tokens(summary + "\n")
+    digest = compact_farm_rows(rows, fields, score, remaining, top_k) if remaining > 0 else ""
+    return summary + "\n" + digest if digest else summary
+
+
+def compaction_report(farm_data, prompt_text):
+    """Prompt size against interpolating the raw query rows, as reported in responses."""
+    raw_tokens = estimate_tokens(str(farm_data))
+    prompt_tokens = estimate_tokens(prompt_text)
+    return {
+        "raw_tokens": raw_tokens,
+        "prompt_tokens": prompt_tokens,
+        "compaction_ratio": round(raw_tokens / max(prompt_tokens, 1), 1)
+    }
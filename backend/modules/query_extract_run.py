@@ -1,5 +1,4 @@
-from pathlib import Path
-import sqlite3
+from modules.db_manager import fetchall_readonly
 
 def extract_sql_query(input_string):
     start_keyword = "SQLQuery:"
@@ -13,11 +12,5 @@ def extract_sql_query(input_string):
     return sql_query
 
 def run_query(sent_query):
-    script_dir = Path(__file__).parent.absolute()
-    db_path = script_dir.parent / "db" / "farming_memory.db"
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(sent_query)
-    result = cursor.fetchall()
-    conn.close()
+    result = fetchall_readonly("farming", sent_query)
     return(result)
\ No newline at end of file
@@ -0,0 +1,329 @@
+"""Per-model request and token budgets for Groq, shared by every ChatGroq call in the process.
+
+Each model has a token bucket for requests per minute, another for tokens per
+minute and a cap on calls in flight. Callers queue by priority class, so a
+user waiting on an analysis goes ahead of memory summarization or snapshot
+refreshes, and a 429 pauses the whole model for a jittered backoff instead of
+letting every caller retry at once.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from langchain_groq import ChatGroq
+
+from modules import cassette
+from modules.prompt_compaction import estimate_tokens
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Groq free-tier limits; GROQ_RPM / GROQ_TPM override them for every model on larger plans
+MODEL_LIMITS = {
+    "llama3-70b-8192": {"rpm": 30, "tpm": 6000},
+    "llama-3.3-70b-versatile": {"rpm": 30, "tpm": 12000}
+}
+DEFAULT_LIMITS = {"rpm": 30, "tpm": 6000}
+MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "4"))
+MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("GROQ_BACKOFF_BASE", "1.0"))
+BACKOFF_MAX = float(os.getenv("GROQ_BACKOFF_MAX", "30"))
+# Completion tokens reserved per call when the model has no max_tokens; trued up from the response usage
+COMPLETION_ESTIMATE = 300
+
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+_governors = {}
+_lock = threading.Lock()
+
+
+@contextmanager
+def priority(level):
+    """Run the LLM calls made inside this block (and in steps it starts) at the given priority class."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Refills continuously at per_minute / 60 per second up to per_minute; may go negative after a true-up."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount can be taken (never more than the bucket holds)."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(missing, 0) / self.rate
+
+    def take(self, amount):
+        self.tokens -= amount
+
+    def give(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ModelGovernor:
+    def __init__(self, model, rpm, tpm, concurrency):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = concurrency
+        self.active = 0
+        self.paused_until = 0.0
+        self._waiting = []
+        self._wakeups = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stats = {"calls": 0, "rate_limited": 0, "wait_s": 0.0, "max_wait_s": 0.0}
+        self._by_priority = {name: 0 for name in PRIORITY_NAMES.values()}
+
+    def _wake(self):
+        """With the lock held: wake every thread and coroutine waiting to start a call."""
+        self._cond.notify_all()
+        wakeups, self._wakeups = self._wakeups, []
+        for loop, wakeup in wakeups:
+            try:
+                loop.call_soon_threadsafe(_set_wakeup, wakeup)
+            except RuntimeError:
+                pass
+
+    def _leave(self, ticket):
+        """With the lock held: give up a queued ticket that will not start, e.g. a cancelled wait."""
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self._wake()
+
+    def _try_start(self, ticket, estimate, started):
+        """With the lock held: start the call and return 0, or return how long to wait (None until woken)."""
+        if self._waiting[0] != ticket or self.active >= self.concurrency:
+            return None
+        now = time.monotonic()
+        delay = max(
+            self.paused_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(estimate, now)
+        )
+        if delay > 0:
+            return delay
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self.requests.take(1)
+        self.tokens.take(estimate)
+        self.active += 1
+        waited = now - started
+        self._stats["calls"] += 1
+        self._stats["wait_s"] += waited
+        self._stats["max_wait_s"] = max(self._stats["max_wait_s"], waited)
+        self._by_priority[PRIORITY_NAMES.get(ticket[0], str(ticket[0]))] += 1
+        # The next ticket may be able to start right away
+        self._wake()
+        return 0
+
+    def acquire(self, estimate, level=INTERACTIVE):
+        """Block until this call may start: first in priority order, a free slot and enough budget."""
+        ticket = (level, next(self._seq))
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    delay = self._try_start(ticket, estimate, started)
+                    if delay == 0:
+                        return
+                    self._cond.wait(delay)
+            except BaseException:
+                self._leave(ticket)
+                raise
+
+    async def aacquire(self, estimate, level=INTERACTIVE):
+        """acquire() for coroutines, waiting on the event loop; a cancelled wait leaves the queue without a slot."""
+        ticket = (level, next(self._seq))
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._try_start(ticket, estimate, started)
+                    if delay == 0:
+                        return
+                    wakeup = loop.create_future()
+                    self._wakeups.append((loop, wakeup))
+                try:
+                    await asyncio.wait_for(wakeup, delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._cond:
+                self._leave(ticket)
+            raise
+
+    def release(self, estimate, used=None):
+        """Free the slot, correcting the token bucket with the usage the API reported."""
+        with self._cond:
+            self.active -= 1
+            if used is not None:
+                self.tokens.give(estimate - used)
+            self._wake()
+
+    def backoff(self, attempt, retry_after=None):
+        """Pause the model after a 429 and return the delay: Retry-After if sent, else full-jitter exponential."""
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+        delay = random.uniform(0, delay)
+        if retry_after is not None:
+            delay += retry_after
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self._stats["rate_limited"] += 1
+            self._wake()
+        return delay
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["by_priority"] = dict(self._by_priority)
+            stats["active"] = self.active
+            stats["waiting"] = len(self._waiting)
+            stats["request_tokens"] = round(self.requests.tokens, 1)
+            stats["tpm_tokens"] = round(self.tokens.tokens, 1)
+        stats["avg_wait_ms"] = round(stats["wait_s"] / stats["calls"] * 1000, 1) if stats["calls"] else 0.0
+        stats["wait_s"] = round(stats["wait_s"], 3)
+        stats["max_wait_s"] = round(stats["max_wait_s"], 3)
+        return stats
+
+
+def _set_wakeup(wakeup):
+    if not wakeup.done():
+        wakeup.set_result(None)
+
+
+def governor(model):
+    """The ModelGovernor for model, created with its configured limits on first use."""
+    with _lock:
+        if model not in _governors:
+            limits = dict(MODEL_LIMITS.get(model, DEFAULT_LIMITS))
+            if os.getenv("GROQ_RPM"):
+                limits["rpm"] = int(os.getenv("GROQ_RPM"))
+            if os.getenv("GROQ_TPM"):
+                limits["tpm"] = int(os.getenv("GROQ_TPM"))
+            _governors[model] = ModelGovernor(model, limits["rpm"], limits["tpm"], MAX_CONCURRENCY)
+        return _governors[model]
+
+
+def _is_rate_limited(error):
+    return getattr(error, "status_code", None) == 429
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _used_tokens(result):
+    try:
+        return result.llm_output["token_usage"]["total_tokens"]
+    except (AttributeError, KeyError, TypeError):
+        return None
+
+
+def governed_call(model, estimate, fn):
+    """Run fn() under the model's budgets, retrying rate-limited calls after a backoff."""
+    gov = governor(model)
+    for attempt in range(MAX_RETRIES + 1):
+        gov.acquire(estimate, _priority.get())
+        used = None
+        try:
+            result = fn()
+            used = _used_tokens(result)
+            return result
+        except Exception as e:
+            if not _is_rate_limited(e) or attempt == MAX_RETRIES:
+                raise
+            delay = gov.backoff(attempt, _retry_after(e))
+            print(f"Groq rate limit on {model}, retrying in {delay:.1f}s")
+        finally:
+            gov.release(estimate, used)
+
+
+async def agoverned_call(model, estimate, afn):
+    """governed_call for coroutines; waiting for a slot never ties up a thread."""
+    gov = governor(model)
+    for attempt in range(MAX_RETRIES + 1):
+        await gov.aacquire(estimate, _priority.get())
+        used = None
+        try:
+            result = await afn()
+            used = _used_tokens(result)
+            return result
+        except Exception as e:
+            if not _is_rate_limited(e) or attempt == MAX_RETRIES:
+                raise
+            delay = gov.backoff(attempt, _retry_after(e))
+            print(f"Groq rate limit on {model}, retrying in {delay:.1f}s")
+        finally:
+            gov.release(estimate, used)
+
+
+class GovernedChatGroq(ChatGroq):
+    """ChatGroq whose API calls wait for the model's rate budget; retries are left to the governor.
+
+    Calls also go through the cassette, so replayed responses never use the budget.
+    """
+
+    def _estimate(self, messages):
+        prompt = sum(estimate_tokens(str(message.content)) for message in messages)
+        return prompt + (self.max_tokens or COMPLETION_ESTIMATE)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return cassette.call(
+            "llm",
+            cassette.chat_request(self.model_name, self.temperature, messages, stop, kwargs),
+            lambda: governed_call(
+                self.model_name,
+                self._estimate(messages),
+                lambda: super(GovernedChatGroq, self)._generate(messages, stop, run_manager, **kwargs)
+            ),
+            encode=cassette.encode_chat_result,
+            decode=cassette.decode_chat_result
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        return await cassette.acall(
+            "llm",
+            cassette.chat_request(self.model_name, self.temperature, messages, stop, kwargs),
+            lambda: agoverned_call(
+                self.model_name,
+                self._estimate(messages),
+                lambda: super(GovernedChatGroq, self)._agenerate(messages, stop, run_manager, **kwargs)
+            ),
+            encode=cassette.encode_chat_result,
+            decode=cassette.decode_chat_result
+        )
+
+
+def rate_governor_stats():
+    with _lock:
+        governors = dict(_governors)
+    return {model: gov.stats() for model, gov in governors.items()}
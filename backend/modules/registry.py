@@ -0,0 +1,87 @@
+"""Process-wide LLM clients, web search and SQLDatabase handles, created on first use and shared by every agent."""
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from langchain_community.tools import DuckDuckGoSearchRun
+from langchain_community.utilities import SQLDatabase
+from langchain_experimental.sql import SQLDatabaseChain
+
+from modules import cassette
+from modules.db_manager import DB_PATHS
+from modules.llm_cache import CachedLLM
+from modules.rate_governor import GovernedChatGroq
+
+DEFAULT_TEMPERATURE = 0.7
+
+load_dotenv()
+
+_instances = {}
+_created = {}
+_key_locks = {}
+_lock = threading.Lock()
+
+
+def shared(key, factory):
+    """Return the instance stored under key, calling factory() to create it the first time.
+
+    Each key has its own creation lock, so a slow factory (SQLDatabase
+    reflects the schema) only blocks callers of the same key, and a factory
+    may ask for other shared instances.
+    """
+    instance = _instances.get(key)
+    if instance is not None:
+        return instance
+    with _lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        if key not in _instances:
+            started = time.perf_counter()
+            instance = factory()
+            with _lock:
+                _instances[key] = instance
+                _created[key] = round((time.perf_counter() - started) * 1000, 1)
+        return _instances[key]
+
+
+def get_chat_model(model_name, temperature=DEFAULT_TEMPERATURE):
+    """Shared Groq client; its calls go through the rate governor, which also owns retries."""
+    return shared(("chat", model_name, temperature), lambda: GovernedChatGroq(
+        model_name=model_name,
+        temperature=temperature,
+        groq_api_key=os.getenv("GROQ_API_KEY"),
+        max_retries=0
+    ))
+
+
+def get_cached_llm(model_name, namespace, temperature=DEFAULT_TEMPERATURE):
+    """A CachedLLM for the namespace whose shared client is only created on a cache miss."""
+    return CachedLLM(
+        namespace=namespace,
+        factory=lambda: get_chat_model(model_name, temperature),
+        model=model_name,
+        temperature=temperature
+    )
+
+
+def get_search():
+    """Shared DuckDuckGo client, wrapped for recording or replay when a cassette is active."""
+    return shared(("search",), lambda: cassette.CassetteSearch(DuckDuckGoSearchRun) if cassette.enabled() else DuckDuckGoSearchRun())
+
+
+def get_sql_database(path=None):
+    """SQLDatabase handle for SQL generation; reflects the schema on first use."""
+    path = path or DB_PATHS["farming"]
+    return shared(("sql", str(path)), lambda: SQLDatabase.from_uri(f"sqlite:///{path}"))
+
+
+def get_sql_chain(model_name="llama-3.3-70b-versatile"):
+    """SQLDatabaseChain that writes SQL for farming_memory.db with the given model."""
+    return shared(("sql_chain", model_name), lambda: SQLDatabaseChain.from_llm(get_chat_model(model_name), get_sql_database(), verbose=True))
+
+
+def registry_stats():
+    """Instances created so far and how long each took to build, in milliseconds."""
+    with _lock:
+        return {":".join(str(part) for part in key): elapsed for key, elapsed in _created.items()}
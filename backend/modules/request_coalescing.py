@@ -0,0 +1,29 @@
+from modules.single_flight import AsyncSingleFlight, SingleFlight
+
+_flight = SingleFlight()
+_aflight = AsyncSingleFlight()
+
+
+def request_key(endpoint, args):
+    """Requests with the same arguments share a key, in any order.
+
+    Values are compared exactly: the leader saves its result under its own
+    snapshot key, so only requests for that same key may share it.
+    """
+    return (endpoint,) + tuple(sorted((name, str(value)) for name, value in args.items()))
+
+
+def coalesce(endpoint, args, fn):
+    """Run fn() for a request, or wait for an identical request already running it and share its result."""
+    return _flight.do(request_key(endpoint, args), fn)
+
+
+async def acoalesce(endpoint, args, afn):
+    return await _aflight.do(request_key(endpoint, args), afn)
+
+
+def coalescing_stats():
+    """Requests that ran a computation vs. those merged into one already in flight."""
+    stats = _flight.stats()
+    astats = _aflight.stats()
+    return {name: stats[name] + astats[name] for name in stats}
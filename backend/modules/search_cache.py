@@ -0,0 +1,90 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from modules.single_flight import SingleFlight
+
+# Search results barely change within a day
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", str(24 * 3600)))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "512"))
+
+_results = OrderedDict()
+_lock = threading.Lock()
+_flight = SingleFlight()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "errors": 0}
+
+
+def normalize_query(query):
+    """Collapse case and whitespace so reformatted queries share a cache entry."""
+    return re.sub(r"\s+", " ", str(query)).strip().casefold()
+
+
+def _lookup(key):
+    with _lock:
+        entry = _results.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[1] >= SEARCH_CACHE_TTL:
+            del _results[key]
+            return None
+        _results.move_to_end(key)
+        _stats["hits"] += 1
+        return entry[0]
+
+
+def _store(key, result):
+    with _lock:
+        _results[key] = (result, time.time())
+        _results.move_to_end(key)
+        while len(_results) > SEARCH_CACHE_SIZE:
+            _results.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def cached_search(query, search):
+    """Return search(query) from the shared cache, running one search per query at a time."""
+    key = normalize_query(query)
+    result = _lookup(key)
+    if result is not None:
+        return result
+
+    def run():
+        # Another caller may have stored the result while this one waited to lead
+        result = _lookup(key)
+        if result is not None:
+            return result
+        with _lock:
+            _stats["misses"] += 1
+        try:
+            result = search(query)
+        except Exception:
+            # Failures (e.g. rate limiting) are not cached
+            with _lock:
+                _stats["errors"] += 1
+            raise
+        _store(key, result)
+        return result
+
+    return _flight.do(key, run)
+
+
+def cached(search):
+    """Wrap a search function (e.g. DuckDuckGoSearchRun().run) with the shared cache."""
+    def run(query):
+        return cached_search(query, search)
+    return run
+
+
+def clear_search_cache():
+    with _lock:
+        _results.clear()
+
+
+def search_cache_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["entries"] = len(_results)
+    stats["merged"] = _flight.stats()["merged"]
+    return stats
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first caller for a key runs fn(), and callers arriving while it is in
+    flight wait for and share its result (or exception). Nothing is kept once
+    the call finishes, so this pairs with a cache rather than replacing one.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.merged = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                call.waiters += 1
+                self.merged += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {"executed": self.executed, "merged": self.merged, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines running on one event loop.
+
+    The first caller's coroutine runs as a task that later callers await too.
+    The task is shielded, so a client disconnecting does not cancel the work
+    the other callers are waiting on.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executed = 0
+        self.merged = 0
+
+    async def do(self, key, afn):
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(afn())
+            task.add_done_callback(lambda t: self._finished(key, t))
+            self.executed += 1
+        else:
+            self.merged += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller went away
+            task.exception()
+
+    def stats(self):
+        return {"executed": self.executed, "merged": self.merged, "in_flight": len(self._calls)}
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+from modules.db_manager import execute_write, fetchall, get_connection
+from modules.llm_cache import bypass_cache
+from modules.rate_governor import BACKGROUND, priority
+from modules.single_flight import SingleFlight
+
+# Snapshots older than this are still served, but refreshed in the background
+REFRESH_AFTER = int(os.getenv("SNAPSHOT_REFRESH_AFTER", str(30 * 60)))
+# Past this age a snapshot is too stale to serve and is recomputed inline
+MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE", str(24 * 3600)))
+# How often the scheduler looks for snapshots that need refreshing
+SCHEDULER_INTERVAL = int(os.getenv("SNAPSHOT_INTERVAL", str(5 * 60)))
+# Key used by endpoints that take no input, like /carbon-footprint
+GLOBAL_KEY = ""
+
+_producers = {}
+_flight = SingleFlight()
+_refreshing = set()
+_lock = threading.Lock()
+_scheduler = None
+_stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+_table_ready = False
+
+
+def _connect():
+    global _table_ready
+    conn = get_connection("cache")
+    if _table_ready:
+        return conn
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS snapshots (
+            endpoint TEXT NOT NULL,
+            key TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (endpoint, key)
+        )
+    ''')
+    conn.commit()
+    _table_ready = True
+    return conn
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def farm_crop_types():
+    """Distinct crop types in farm_advisory, the inputs worth precomputing."""
+    return [row[0] for row in fetchall("farming", "SELECT DISTINCT Crop_Type FROM farm_advisory ORDER BY Crop_Type")]
+
+
+def register_snapshot(endpoint, compute, keys=None):
+    """Register compute(key) -> JSON-serializable result for an endpoint.
+
+    keys() lists the inputs the scheduler precomputes; endpoints without
+    inputs use the single GLOBAL_KEY and compute() is called with no argument.
+    """
+    _producers[endpoint] = (compute, keys)
+
+
+def _compute(endpoint, key):
+    compute, keys = _producers[endpoint]
+    return compute(key) if keys else compute()
+
+
+def _load(endpoint, key):
+    row = _connect().execute(
+        "SELECT payload, updated_at FROM snapshots WHERE endpoint = ? AND key = ?",
+        (endpoint, key)
+    ).fetchone()
+    if row is None:
+        return None, None
+    return json.loads(row[0]), time.time() - row[1]
+
+
+def _persistable(endpoint, key):
+    # Only the keys an endpoint precomputes are stored, so arbitrary user
+    # inputs cannot grow the table; other keys are computed on every miss
+    _, keys = _producers.get(endpoint, (None, None))
+    if not keys:
+        return True
+    try:
+        return key in keys()
+    except Exception as e:
+        print(f"Error listing {endpoint} snapshot keys: {e}")
+        return False
+
+
+def save_snapshot(endpoint, key, result):
+    """Store an endpoint's result, returning False when the key is not one it precomputes."""
+    if not _persistable(endpoint, key):
+        return False
+    payload = json.dumps(result)
+    _connect()
+    execute_write("cache", lambda conn: conn.execute(
+        "INSERT OR REPLACE INTO snapshots (endpoint, key, payload, updated_at) VALUES (?, ?, ?, ?)",
+        (endpoint, key, payload, time.time())
+    ))
+    return True
+
+
+def refresh_snapshot(endpoint, key=GLOBAL_KEY):
+    """Recompute and store one snapshot, sharing the work with concurrent refreshes of the same key."""
+    def run():
+        result = _compute(endpoint, key)
+        save_snapshot(endpoint, key, result)
+        _count("refreshes")
+        return result
+    return _flight.do((endpoint, key), run)
+
+
+def _refresh_stale(endpoint, key):
+    # A refresh that replayed cached LLM responses would only re-date the
+    # same content, so stale snapshots are regenerated past the LLM cache
+    with priority(BACKGROUND), bypass_cache(True):
+        return refresh_snapshot(endpoint, key)
+
+
+def _refresh_in_background(endpoint, key):
+    with _lock:
+        if (endpoint, key) in _refreshing:
+            return
+        _refreshing.add((endpoint, key))
+
+    def run():
+        try:
+            _refresh_stale(endpoint, key)
+        except Exception as e:
+            print(f"Error refreshing {endpoint} snapshot for {key!r}: {e}")
+            _count("errors")
+        finally:
+            with _lock:
+                _refreshing.discard((endpoint, key))
+
+    threading.Thread(target=run, name=f"snapshot-{endpoint}", daemon=True).start()
+
+
+def cached_snapshot(endpoint, key=GLOBAL_KEY):
+    """Return (result, age) if a servable snapshot exists, scheduling a refresh when it is getting old."""
+    result, age = _load(endpoint, key)
+    if result is None or age >= MAX_AGE:
+        return None, age
+    if age >= REFRESH_AFTER:
+        _count("stale_hits")
+        _refresh_in_background(endpoint, key)
+    else:
+        _count("hits")
+    return result, age
+
+
+def serve_snapshot(endpoint, key=GLOBAL_KEY, refresh=False):
+    """Serve an endpoint's result from its snapshot, computing it inline only when none is usable."""
+    if not refresh:
+        result, _ = cached_snapshot(endpoint, key)
+        if result is not None:
+            return result
+        _count("misses")
+    return refresh_snapshot(endpoint, key)
+
+
+async def aserve_snapshot(endpoint, key=GLOBAL_KEY, acompute=None, refresh=False):
+    """serve_snapshot for the async server, awaiting acompute() instead of the registered producer on a miss."""
+    if not refresh:
+        result, _ = await asyncio.to_thread(cached_snapshot, endpoint, key)
+        if result is not None:
+            return result
+        _count("misses")
+    if acompute is None:
+        return await asyncio.to_thread(refresh_snapshot, endpoint, key)
+    result = await acompute()
+    await asyncio.to_thread(save_snapshot, endpoint, key, result)
+    _count("refreshes")
+    return result
+
+
+def _run_scheduler():
+    while True:
+        for endpoint, (_, keys) in list(_producers.items()):
+            try:
+                inputs = keys() if keys else [GLOBAL_KEY]
+            except Exception as e:
+                print(f"Error listing {endpoint} snapshot keys: {e}")
+                continue
+            # One refresh at a time keeps the scheduler from competing with interactive requests
+            for key in inputs:
+                _, age = _load(endpoint, key)
+                if age is not None and age < REFRESH_AFTER:
+                    continue
+                try:
+                    if age is None:
+                        with priority(BACKGROUND):
+                            refresh_snapshot(endpoint, key)
+                    else:
+                        _refresh_stale(endpoint, key)
+                except Exception as e:
+                    print(f"Error precomputing {endpoint} snapshot for {key!r}: {e}")
+                    _count("errors")
+        time.sleep(SCHEDULER_INTERVAL)
+
+
+def start_scheduler():
+    """Start the background thread that keeps every registered snapshot fresh."""
+    global _scheduler
+    with _lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = threading.Thread(target=_run_scheduler, name="snapshot-scheduler", daemon=True)
+            _scheduler.start()
+
+
+def snapshot_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["refreshing"] = len(_refreshing)
+    return stats
@@ -0,0 +1,122 @@
+import hashlib
+import sqlite3
+import threading
+from modules.db_manager import get_connection
+
+# Pinned entries are operator supplied and survive schema changes
+PINNED_SCHEMA = "*"
+
+_stats = {"hits": 0, "misses": 0, "pinned_hits": 0, "invalidated": 0}
+_stats_lock = threading.Lock()
+_table_ready = False
+
+
+def _connect():
+    global _table_ready
+    conn = get_connection("cache")
+    if _table_ready:
+        return conn
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sql_cache (
+            question TEXT NOT NULL,
+            schema_hash TEXT NOT NULL,
+            sql TEXT NOT NULL,
+            hits INTEGER DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (question, schema_hash)
+        )
+    ''')
+    conn.commit()
+    _table_ready = True
+    return conn
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def normalize_question(question):
+    """Collapse whitespace so reformatted prompts share a cache entry."""
+    return " ".join(question.split())
+
+
+def schema_fingerprint():
+    """Hash the live schema of farming_memory.db."""
+    rows = get_connection("farming").execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+    return hashlib.sha256(repr(rows).encode()).hexdigest()
+
+
+def _is_valid(sql):
+    try:
+        get_connection("farming").execute(f"EXPLAIN {sql}")
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def get_sql(question, generate):
+    """Return the SQL for a question, calling generate(question) only on a cache miss."""
+    key = normalize_question(question)
+    schema_hash = schema_fingerprint()
+    conn = _connect()
+    row = conn.execute(
+        "SELECT sql, schema_hash FROM sql_cache WHERE question = ? AND schema_hash IN (?, ?) "
+        "ORDER BY schema_hash = ? DESC LIMIT 1",
+        (key, PINNED_SCHEMA, schema_hash, PINNED_SCHEMA)
+    ).fetchone()
+    if row:
+        conn.execute(
+            "UPDATE sql_cache SET hits = hits + 1 WHERE question = ? AND schema_hash = ?",
+            (key, row[1])
+        )
+        conn.commit()
+        _count("pinned_hits" if row[1] == PINNED_SCHEMA else "hits")
+        return row[0]
+
+    _count("misses")
+    sql = generate(question)
+    if not sql or not _is_valid(sql):
+        return sql
+
+    conn = _connect()
+    stale = conn.execute(
+        "DELETE FROM sql_cache WHERE question = ? AND schema_hash NOT IN (?, ?)",
+        (key, PINNED_SCHEMA, schema_hash)
+    ).rowcount
+    conn.execute(
+        "INSERT OR REPLACE INTO sql_cache (question, schema_hash, sql) VALUES (?, ?, ?)",
+        (key, schema_hash, sql)
+    )
+    conn.commit()
+    if stale:
+        with _stats_lock:
+            _stats["invalidated"] += stale
+    return sql
+
+
+def pin_sql(question, sql):
+    """Pin known-good SQL for a question so it is always served from the cache."""
+    conn = _connect()
+    conn.execute(
+        "INSERT OR REPLACE INTO sql_cache (question, schema_hash, sql) VALUES (?, ?, ?)",
+        (normalize_question(question), PINNED_SCHEMA, sql)
+    )
+    conn.commit()
+
+
+def unpin_sql(question):
+    conn = _connect()
+    conn.execute(
+        "DELETE FROM sql_cache WHERE question = ? AND schema_hash = ?",
+        (normalize_question(question), PINNED_SCHEMA)
+    )
+    conn.commit()
+
+
+def sql_cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["pinned_hits"] + stats["misses"]
+    stats["hit_rate"] = round((stats["hits"] + stats["pinned_hits"]) / lookups, 3) if lookups else 0.0
+    return stats
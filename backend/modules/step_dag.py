@@ -0,0 +1,185 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Shared by every agent so concurrent requests cannot oversubscribe the process
+MAX_WORKERS = int(os.getenv("STEP_DAG_WORKERS", "16"))
+THREAD_PREFIX = "step-dag"
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix=THREAD_PREFIX)
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class DAGResult(dict):
+    """Step outputs keyed by step name, plus per-step timings in seconds."""
+
+    def __init__(self, initial):
+        super().__init__(initial)
+        self.timings = {}
+        self.elapsed = 0.0
+
+
+def _record(dag, step, elapsed):
+    with _stats_lock:
+        entry = _stats.setdefault(dag, {}).setdefault(step, {"count": 0, "total": 0.0, "max": 0.0})
+        entry["count"] += 1
+        entry["total"] += elapsed
+        entry["max"] = max(entry["max"], elapsed)
+
+
+def _timed(fn, kwargs):
+    started = time.perf_counter()
+    value = fn(**kwargs)
+    return value, started, time.perf_counter() - started
+
+
+class StepDAG:
+    """Run named steps as soon as the steps (or initial values) they take as inputs are available.
+
+    Each step function is called with keyword arguments named after its inputs,
+    and its return value becomes available to later steps under the step's name.
+    A step may also have an async variant (afn) that arun() awaits instead of
+    running fn in a worker thread.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.steps = {}
+        self.async_steps = {}
+
+    def add(self, name, fn, inputs=(), afn=None):
+        self.steps[name] = (fn, tuple(inputs))
+        if afn is not None:
+            self.async_steps[name] = afn
+        return self
+
+    def step(self, name=None, inputs=()):
+        """Decorator form of add()."""
+        def decorator(fn):
+            self.add(name or fn.__name__, fn, inputs)
+            return fn
+        return decorator
+
+    def order(self, initial=()):
+        """Topological order of the steps, raising ValueError on missing or circular inputs."""
+        available = set(initial)
+        remaining = dict(self.steps)
+        ordered = []
+        clashes = available & set(remaining)
+        if clashes:
+            raise ValueError(f"{self.name}: initial values shadow steps {sorted(clashes)}")
+        while remaining:
+            ready = [name for name, (_, inputs) in remaining.items() if available.issuperset(inputs)]
+            if not ready:
+                raise ValueError(f"{self.name}: steps {sorted(remaining)} have missing or circular inputs")
+            for name in ready:
+                del remaining[name]
+                available.add(name)
+            ordered.extend(ready)
+        return ordered
+
+    def _finish(self, results, name, value, started, elapsed, start, on_step_complete):
+        results[name] = value
+        results.timings[name] = {"start": round(started - start, 4), "elapsed": round(elapsed, 4)}
+        _record(self.name, name, elapsed)
+        if on_step_complete:
+            on_step_complete(name, value)
+
+    def run(self, on_step_complete=None, **initial):
+        """Run every step and return a DAGResult.
+
+        on_step_complete(name, value) is called from the calling thread as each
+        step finishes. A failing step cancels the steps not yet started and its
+        exception is re-raised.
+        """
+        ordered = self.order(initial)
+        results = DAGResult(initial)
+        start = time.perf_counter()
+
+        if threading.current_thread().name.startswith(THREAD_PREFIX):
+            # Nested inside another DAG's step: waiting on the shared pool from one of
+            # its own workers could deadlock, so run inline in dependency order
+            for name in ordered:
+                fn, inputs = self.steps[name]
+                value, started, elapsed = _timed(fn, {i: results[i] for i in inputs})
+                self._finish(results, name, value, started, elapsed, start, on_step_complete)
+        else:
+            pending = {name: self.steps[name] for name in ordered}
+            running = {}
+            try:
+                while pending or running:
+                    for name in [n for n, (_, inputs) in pending.items() if all(i in results for i in inputs)]:
+                        fn, inputs = pending.pop(name)
+                        kwargs = {i: results[i] for i in inputs}
+                        # Each step gets its own copy of the caller's context (e.g. bypass_cache)
+                        future = _executor.submit(contextvars.copy_context().run, _timed, fn, kwargs)
+                        running[future] = name
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        value, started, elapsed = future.result()
+                        self._finish(results, name, value, started, elapsed, start, on_step_complete)
+            except BaseException:
+                for future in running:
+                    future.cancel()
+                raise
+
+        results.elapsed = time.perf_counter() - start
+        _record(self.name, "total", results.elapsed)
+        return results
+
+    async def _atimed(self, name, kwargs):
+        started = time.perf_counter()
+        afn = self.async_steps.get(name)
+        if afn is not None:
+            value = await afn(**kwargs)
+        else:
+            value = await asyncio.to_thread(self.steps[name][0], **kwargs)
+        return value, started, time.perf_counter() - started
+
+    async def arun(self, on_step_complete=None, **initial):
+        """Async run(): async steps are awaited on the loop, plain steps run in worker threads."""
+        ordered = self.order(initial)
+        results = DAGResult(initial)
+        start = time.perf_counter()
+        pending = {name: self.steps[name] for name in ordered}
+        running = {}
+        try:
+            while pending or running:
+                for name in [n for n, (_, inputs) in pending.items() if all(i in results for i in inputs)]:
+                    _, inputs = pending.pop(name)
+                    task = asyncio.ensure_future(self._atimed(name, {i: results[i] for i in inputs}))
+                    running[task] = name
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    value, started, elapsed = task.result()
+                    self._finish(results, name, value, started, elapsed, start, on_step_complete)
+        except BaseException:
+            for task in running:
+                task.cancel()
+            raise
+
+        results.elapsed = time.perf_counter() - start
+        _record(self.name, "total", results.elapsed)
+        return results
+
+
+def dag_stats():
+    """Per-DAG, per-step call counts and average/max latency in milliseconds."""
+    with _stats_lock:
+        return {
+            dag: {
+                step: {
+                    "count": entry["count"],
+                    "avg_ms": round(entry["total"] / entry["count"] * 1000, 1),
+                    "max_ms": round(entry["max"] * 1000, 1)
+                }
+                for step, entry in steps.items()
+            }
+            for dag, steps in _stats.items()
+        }
@@ -0,0 +1,124 @@
+import numpy as np
+
+# Seasonal crop water needs in mm, as used by the water usage agent
+CROP_WATER_NEED_MM = {
+    "Wheat": 500,
+    "Soybean": 450,
+    "Corn": 600,
+    "Rice": 1200
+}
+DEFAULT_WATER_NEED_MM = 500
+
+LOW_MOISTURE_THRESHOLD = 20
+LOW_MOISTURE_FACTOR = 1.2
+LITERS_PER_MM_HA = 10000
+FARM_AREA_HA = 1
+
+DRIP_IRRIGATION = "Implement drip irrigation to reduce water use by 30%"
+RAINWATER_HARVESTING = "Use rainwater harvesting to supplement by 20%"
+ALTERNATE_WETTING_DRYING = "Adopt alternate wetting and drying (AWD) to save 25%"
+
+LOW_RAINFALL_THRESHOLD = 100
+DRIP_SAVINGS = 0.30
+HARVESTING_SAVINGS = 0.20
+AWD_SAVINGS = 0.25
+
+
+def _reading(value):
+    """A per-farm figure as JSON-safe data: NULL inputs come through as NaN and leave as None."""
+    return None if np.isnan(value) else float(value)
+
+
+def compute_water_usage(farm_data):
+    """Compute irrigation water usage and savings for rows of
+    (Farm_ID, Crop_Type, Soil_Moisture, Rainfall_mm)."""
+    if not farm_data:
+        return {
+            "farm_data": [],
+            "conservation_insights": [],
+            "total_water_usage_liters": 0.0,
+            "total_estimated_savings_liters": 0.0
+        }
+
+    farm_ids = np.array([row[0] for row in farm_data])
+    crop_types = np.array([str(row[1]) for row in farm_data])
+    soil_moisture = np.array([row[2] for row in farm_data], dtype=float)
+    rainfall = np.array([row[3] for row in farm_data], dtype=float)
+
+    crops, crop_index = np.unique(crop_types, return_inverse=True)
+    crop_need = np.array([CROP_WATER_NEED_MM.get(crop, DEFAULT_WATER_NEED_MM) for crop in crops], dtype=float)
+
+    irrigation_mm = np.clip(crop_need[crop_index] - rainfall, 0, None)
+    low_moisture = soil_moisture < LOW_MOISTURE_THRESHOLD
+    irrigation_mm = np.where(low_moisture, irrigation_mm * LOW_MOISTURE_FACTOR, irrigation_mm)
+    water_usage = irrigation_mm * LITERS_PER_MM_HA * FARM_AREA_HA
+
+    low_rainfall = rainfall < LOW_RAINFALL_THRESHOLD
+    is_rice = crop_types == "Rice"
+    savings_rate = low_moisture * DRIP_SAVINGS + low_rainfall * HARVESTING_SAVINGS + is_rice * AWD_SAVINGS
+    savings = water_usage * savings_rate
+
+    water_usage = np.round(water_usage, 2)
+    savings = np.round(savings, 2)
+    # A farm without a rainfall reading has no usage estimate; it is listed but left out of the totals
+    usage_totals = np.nan_to_num(water_usage)
+    savings_totals = np.nan_to_num(savings)
+
+    rows = [
+        {
+            "crop_type": crop,
+            "farm_id": int(farm_id),
+            "rainfall_mm": _reading(rain),
+            "soil_moisture": _reading(moisture),
+            "water_usage_liters": _reading(usage),
+            "estimated_savings_liters": _reading(saved)
+        }
+        for farm_id, crop, moisture, rain, usage, saved in zip(
+            farm_ids.tolist(), crop_types.tolist(), soil_moisture.tolist(),
+            rainfall.tolist(), water_usage.tolist(), savings.tolist()
+        )
+    ]
+
+    crop_usage = np.bincount(crop_index, weights=usage_totals, minlength=len(crops))
+    crop_savings = np.bincount(crop_index, weights=savings_totals, minlength=len(crops))
+    crop_farms = np.bincount(crop_index, minlength=len(crops))
+    crop_drip = np.bincount(crop_index, weights=low_moisture, minlength=len(crops))
+    crop_harvesting = np.bincount(crop_index, weights=low_rainfall, minlength=len(crops))
+
+    conservation_insights = []
+    for i, crop in enumerate(crops.tolist()):
+        insights = []
+        if crop_drip[i]:
+            insights.append(DRIP_IRRIGATION)
+        if crop_harvesting[i]:
+            insights.append(RAINWATER_HARVESTING)
+        if crop == "Rice":
+            insights.append(ALTERNATE_WETTING_DRYING)
+        conservation_insights.append({
+            "crop_type": crop,
+            "farms": int(crop_farms[i]),
+            "water_usage_liters": round(float(crop_usage[i]), 2),
+            "estimated_savings_liters": round(float(crop_savings[i]), 2),
+            "insights": insights
+        })
+
+    return {
+        "farm_data": rows,
+        "conservation_insights": conservation_insights,
+        "total_water_usage_liters": round(float(usage_totals.sum()), 2),
+        "total_estimated_savings_liters": round(float(savings_totals.sum()), 2)
+    }
+
+
+def summarize_water_usage(result):
+    """Render the per-crop totals of a compute_water_usage result for prompting."""
+    lines = [
+        f"- {item['crop_type']}: {item['farms']} farms, "
+        f"{item['water_usage_liters']} liters used, "
+        f"{item['estimated_savings_liters']} liters potential savings "
+        f"({'; '.join(item['insights']) or 'no strategy triggered'})"
+        for item in result["conservation_insights"]
+    ]
+    lines.append(f"- Total Water Usage: {result['total_water_usage_liters']} liters")
+    lines.append(f"- Total Potential Savings: {result['total_estimated_savings_liters']} liters")
+    return "\n".join(lines)
@@ -0,0 +1,160 @@
+import re
+
+# Deterministic replacement for the weather agent's two LLM calls. The output
+# strings keep the "- Weather condition: ..." and "- Plantation Crops: ..."
+# formats the LLM prompts asked for, so downstream consumers are unchanged.
+
+# WMO weather interpretation codes as used by Open-Meteo
+WMO_GROUPS = {
+    "clear": range(0, 4),
+    "fog": (45, 48),
+    "drizzle": range(51, 58),
+    "rain": range(61, 68),
+    "snow": range(71, 78),
+    "showers": range(80, 83),
+    "snow_showers": (85, 86),
+    "thunderstorm": range(95, 100)
+}
+HEAVY_CODES = {65, 67, 75, 82, 86, 96, 99}
+
+# Thresholds over the forecast window, in mm and °C
+FLOOD_TOTAL_MM = 100
+FLOOD_DAY_MM = 50
+HEAVY_RAIN_TOTAL_MM = 50
+DRY_TOTAL_MM = 5
+DROUGHT_TOTAL_MM = 2
+DROUGHT_MAX_TEMP = 32
+HEAT_MAX_TEMP = 40
+COLD_MIN_TEMP = 0
+EXTREME_DAYS = 2
+
+CONDITION_CROPS = {
+    "Flood": {
+        "plant": ["Rice", "Jute", "Taro"],
+        "harvest": ["Maize", "Vegetables", "Pulses"],
+        "reason": "Waterlogging favours paddy and jute, and crops that rot in standing water should be brought in."
+    },
+    "Heavy Rain": {
+        "plant": ["Rice", "Sugarcane", "Turmeric"],
+        "harvest": ["Wheat", "Mustard", "Potato"],
+        "reason": "Wet soils suit water-loving crops, while mature dryland crops should be harvested before spoilage."
+    },
+    "Drought": {
+        "plant": ["Millet", "Sorghum", "Chickpea"],
+        "harvest": ["Cotton", "Groundnut", "Sesame"],
+        "reason": "Drought-tolerant cereals and pulses need little water, and dry weather is ideal for harvesting oilseeds and fibre."
+    },
+    "Dry": {
+        "plant": ["Soybean", "Groundnut", "Pigeon Pea"],
+        "harvest": ["Wheat", "Corn", "Mustard"],
+        "reason": "Low rainfall suits hardy legumes and gives a clear window to harvest and dry grain."
+    },
+    "Extreme Heat": {
+        "plant": ["Sorghum", "Pearl Millet", "Cowpea"],
+        "harvest": ["Wheat", "Barley", "Vegetables"],
+        "reason": "Heat-tolerant crops survive high temperatures, while heat-sensitive crops should be harvested early."
+    },
+    "Extreme Cold": {
+        "plant": ["Wheat", "Barley", "Peas"],
+        "harvest": ["Potato", "Carrot", "Cabbage"],
+        "reason": "Cold-hardy winter crops establish well, while frost can damage mature root and leafy vegetables."
+    },
+    "Stormy": {
+        "plant": ["Rice", "Sugarcane", "Banana"],
+        "harvest": ["Corn", "Wheat", "Soybean"],
+        "reason": "Sturdy or water-tolerant crops cope with storms, and standing grain should be harvested before lodging."
+    },
+    "Moderate": {
+        "plant": ["Corn", "Soybean", "Wheat", "Vegetables"],
+        "harvest": ["Rice", "Potato", "Pulses"],
+        "reason": "Balanced rain and temperatures suit most field crops."
+    }
+}
+
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def _value(text):
+    match = NUMBER.search(str(text))
+    return float(match.group()) if match else None
+
+
+def wmo_group(code):
+    for group, codes in WMO_GROUPS.items():
+        if code in codes:
+            return group
+    return "unknown"
+
+
+def summarize_forecast(forecast):
+    """Reduce fetcher() forecast rows to the totals and counts the classifier needs."""
+    days = forecast.get("forecast", []) if isinstance(forecast, dict) else forecast
+    rain = [_value(day.get("precipitation")) or 0.0 for day in days]
+    highs = [v for v in (_value(day.get("max_temp")) for day in days) if v is not None]
+    lows = [v for v in (_value(day.get("min_temp")) for day in days) if v is not None]
+    codes = [int(day["weather_code"]) for day in days if day.get("weather_code") is not None]
+    groups = [wmo_group(code) for code in codes]
+    return {
+        "days": len(days),
+        "total_precipitation_mm": round(sum(rain), 1),
+        "max_daily_precipitation_mm": max(rain, default=0.0),
+        "mean_max_temp": round(sum(highs) / len(highs), 1) if highs else None,
+        "hottest": max(highs, default=None),
+        "coldest": min(lows, default=None),
+        "hot_days": sum(1 for t in highs if t >= HEAT_MAX_TEMP),
+        "freezing_days": sum(1 for t in lows if t <= COLD_MIN_TEMP),
+        "heavy_days": sum(1 for code in codes if code in HEAVY_CODES),
+        "storm_days": groups.count("thunderstorm"),
+        "snow_days": groups.count("snow") + groups.count("snow_showers")
+    }
+
+
+def classify_weather(forecast):
+    """Return (condition, explanation) for a fetcher() forecast."""
+    summary = summarize_forecast(forecast)
+    if not summary["days"]:
+        return "Unknown", "No forecast data was available."
+
+    total = summary["total_precipitation_mm"]
+    if total >= FLOOD_TOTAL_MM or summary["max_daily_precipitation_mm"] >= FLOOD_DAY_MM:
+        return "Flood", (
+            f"{total} mm of rain is forecast over {summary['days']} days, "
+            f"with up to {summary['max_daily_precipitation_mm']} mm in a single day."
+        )
+    if summary["storm_days"] >= EXTREME_DAYS:
+        return "Stormy", f"Thunderstorms are forecast on {summary['storm_days']} of {summary['days']} days."
+    if summary["hot_days"] >= EXTREME_DAYS:
+        return "Extreme Heat", f"Highs reach {summary['hottest']}°C, with {summary['hot_days']} days at or above {HEAT_MAX_TEMP}°C."
+    if summary["freezing_days"] >= EXTREME_DAYS or summary["snow_days"] >= EXTREME_DAYS:
+        return "Extreme Cold", (
+            f"Lows fall to {summary['coldest']}°C, with {summary['freezing_days']} freezing days "
+            f"and {summary['snow_days']} days of snow."
+        )
+    if total >= HEAVY_RAIN_TOTAL_MM or summary["heavy_days"] >= EXTREME_DAYS:
+        return "Heavy Rain", f"{total} mm of rain is forecast over {summary['days']} days."
+    if total < DROUGHT_TOTAL_MM and (summary["mean_max_temp"] or 0) >= DROUGHT_MAX_TEMP:
+        return "Drought", f"Only {total} mm of rain is forecast, with highs averaging {summary['mean_max_temp']}°C."
+    if total < DRY_TOTAL_MM:
+        return "Dry", f"Only {total} mm of rain is forecast over {summary['days']} days."
+    return "Moderate", (
+        f"{total} mm of rain over {summary['days']} days, with highs averaging {summary['mean_max_temp']}°C."
+    )
+
+
+def recommend_crops(condition):
+    """Return (plant, harvest, reason) candidates for a weather condition."""
+    entry = CONDITION_CROPS.get(condition, CONDITION_CROPS["Moderate"])
+    return entry["plant"], entry["harvest"], entry["reason"]
+
+
+def format_condition(condition, explanation):
+    return f"- Weather condition: {condition}\n- {explanation}"
+
+
+def format_recommendation(condition):
+    plant, harvest, reason = recommend_crops(condition)
+    return (
+        f"- Plantation Crops: {', '.join(plant)}\n"
+        f"- Harvestation Crops: {', '.join(harvest)}\n"
+        f"- {reason}"
+    )
@@ -1,47 +1,401 @@
+import asyncio
+import csv
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+import weakref
+import httpx
 import requests
+from modules import cassette
+from modules.db_manager import get_connection
+
+# Failed lookups are retried after a day, found places never expire
+NEGATIVE_TTL = 24 * 3600
+# Nominatim's usage policy allows at most one request per second
+NOMINATIM_INTERVAL = 1.0
+# Forecasts are shared by every farm inside one grid cell (in degrees)
+FORECAST_GRID_DEG = float(os.getenv("FORECAST_GRID_DEG", "0.1"))
+# Fresh for FORECAST_TTL seconds, then served stale while a refresh runs in the background
+FORECAST_TTL = int(os.getenv("FORECAST_TTL", str(3 * 3600)))
+FORECAST_STALE_TTL = int(os.getenv("FORECAST_STALE_TTL", str(12 * 3600)))
+# Upper bound on simultaneous upstream requests for batch lookups
+BATCH_CONCURRENCY = int(os.getenv("WEATHER_BATCH_CONCURRENCY", "16"))
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+# Reused so sequential lookups keep their connections alive
+_session = requests.Session()
+
+_geocode_lock = threading.Lock()
+_last_geocode = 0.0
+_stats_lock = threading.Lock()
+_geocode_stats = {"hits": 0, "negative_hits": 0, "misses": 0, "errors": 0}
+_table_ready = False
+
+_forecasts = {}
+_forecast_lock = threading.Lock()
+_cell_locks = {}
+_refreshing = set()
+_forecast_stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+# httpx clients are bound to the event loop they were first used on
+_async_clients = weakref.WeakKeyDictionary()
+
+def _connect():
+    global _table_ready
+    conn = get_connection("cache")
+    if _table_ready:
+        return conn
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS geocode_cache (
+            location_key TEXT PRIMARY KEY,
+            lat REAL,
+            lon REAL,
+            found INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    conn.commit()
+    _table_ready = True
+    return conn
+
+def _count(name):
+    with _stats_lock:
+        _geocode_stats[name] += 1
+
+def normalize_location(location):
+    """Normalize case, unicode, whitespace and comma spacing so equivalent names share a cache key."""
+    key = unicodedata.normalize("NFKC", str(location)).casefold()
+    key = re.sub(r"\s*,\s*", ", ", key)
+    key = re.sub(r"\s+", " ", key)
+    return key.strip(" ,.;")
+
+def _cache_coordinates(key, lat, lon):
+    conn = _connect()
+    conn.execute(
+        "INSERT OR REPLACE INTO geocode_cache (location_key, lat, lon, found, updated_at) VALUES (?, ?, ?, ?, ?)",
+        (key, lat, lon, int(lat is not None), time.time())
+    )
+    conn.commit()
+
+def cached_coordinates(location):
+    """Return (hit, lat, lon) from the geocode cache without touching the network."""
+    row = _connect().execute(
+        "SELECT lat, lon, found, updated_at FROM geocode_cache WHERE location_key = ?",
+        (normalize_location(location),)
+    ).fetchone()
+    if row is None:
+        return False, None, None
+    lat, lon, found, updated_at = row
+    if found:
+        _count("hits")
+        return True, lat, lon
+    if time.time() - updated_at < NEGATIVE_TTL:
+        _count("negative_hits")
+        return True, None, None
+    return False, None, None
+
+def uncached_locations(locations):
+    """Distinct normalized locations that would need a Nominatim lookup, without counting cache stats."""
+    conn = _connect()
+    now = time.time()
+    missing = []
+    for key in dict.fromkeys(normalize_location(location) for location in locations):
+        row = conn.execute("SELECT found, updated_at FROM geocode_cache WHERE location_key = ?", (key,)).fetchone()
+        if row is None or (not row[0] and now - row[1] >= NEGATIVE_TTL):
+            missing.append(key)
+    return missing
+
+def _geocode_wait():
+    """Reserve the next Nominatim request slot and return how long to wait for it."""
+    global _last_geocode
+    if cassette.MODE == cassette.REPLAY:
+        # Replayed lookups never reach Nominatim
+        return 0
+    with _geocode_lock:
+        now = time.time()
+        slot = max(now, _last_geocode + NOMINATIM_INTERVAL)
+        _last_geocode = slot
+        return slot - now
+
+def _geocode_url(location):
+    return f"https://nominatim.openstreetmap.org/search?format=json&q={location}"
+
+def _parse_geocode(data):
+    if not data:
+        return None, None
+    return float(data[0]["lat"]), float(data[0]["lon"])
+
+def _get_json(url, **kwargs):
+    """GET url and decode the JSON body; recorded or replayed when a cassette is active."""
+    return cassette.call("http", {"method": "GET", "url": url}, lambda: _session.get(url, timeout=5, **kwargs).json())
+
+async def _aget_json(client, url):
+    async def get():
+        res = await client.get(url)
+        return res.json()
+    # Keyed on the URL alone, so sync and async lookups share recordings
+    return await cassette.acall("http", {"method": "GET", "url": url}, get)
+
+def _geocode(location):
+    """Look a location up on Nominatim, raising on network errors."""
+    time.sleep(_geocode_wait())
+    return _parse_geocode(_get_json(_geocode_url(location), headers=HEADERS))
 
 def get_coordinates(location):
     """Get latitude and longitude for a location using OpenStreetMap Nominatim."""
+    hit, lat, lon = cached_coordinates(location)
+    if hit:
+        return lat, lon
+    _count("misses")
     try:
-        geo_url = f"https://nominatim.openstreetmap.org/search?format=json&q={location}"
-        res = requests.get(geo_url, headers={"User-Agent": "Mozilla/5.0"}, timeout=5)
-        data = res.json()
-        if not data:
-            return None, None
-        return float(data[0]["lat"]), float(data[0]["lon"])
+        lat, lon = _geocode(location)
     except Exception as e:
+        # Transient failures are not cached
+        _count("errors")
         return None, None
+    _cache_coordinates(normalize_location(location), lat, lon)
+    return lat, lon
 
-def fetcher(location="New York"):
-    """Fetch 7-day weather forecast using Open-Meteo."""
-    lat, lon = get_coordinates(location)
-    if lat is None or lon is None:
-        return {"error": "Unable to get coordinates for the location."}
+def seed_geocode_cache(csv_path):
+    """Pre-seed the geocode cache from a CSV with a location column and optional lat/lon columns."""
+    seeded = geocoded = failed = 0
+    with open(csv_path, newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            location = (row.get("location") or "").strip()
+            if not location:
+                continue
+            if row.get("lat") and row.get("lon"):
+                _cache_coordinates(normalize_location(location), float(row["lat"]), float(row["lon"]))
+                seeded += 1
+                continue
+            hit, lat, _ = cached_coordinates(location)
+            if hit and lat is not None:
+                continue
+            lat, _ = get_coordinates(location)
+            if lat is None:
+                failed += 1
+            else:
+                geocoded += 1
+    return {"seeded": seeded, "geocoded": geocoded, "failed": failed}
+
+def geocode_cache_stats():
+    with _stats_lock:
+        return dict(_geocode_stats)
+
+def snap_to_grid(lat, lon, grid=None):
+    """Snap coordinates to the centre of their forecast grid cell."""
+    grid = grid or FORECAST_GRID_DEG
+    return round(round(lat / grid) * grid, 4), round(round(lon / grid) * grid, 4)
+
+def _forecast_key(lat, lon):
+    return snap_to_grid(lat, lon)
+
+def _issue_date():
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+def _is_fresh(entry, now):
+    # Open-Meteo issues new runs daily, so yesterday's forecast is stale however young it is
+    return now - entry[1] < FORECAST_TTL and entry[2] == _issue_date()
+
+def _count_forecast(name):
+    with _forecast_lock:
+        _forecast_stats[name] += 1
 
-    weather_url = (
+def _forecast_url(lat, lon):
+    return (
         f"https://api.open-meteo.com/v1/forecast?"
         f"latitude={lat}&longitude={lon}&daily=temperature_2m_max,temperature_2m_min,precipitation_sum,"
         f"weathercode&timezone=auto"
     )
 
+def _parse_forecast(data):
+    days = data["daily"]
+
+    forecast = []
+    for i in range(len(days["time"])):
+        forecast.append({
+            "date": days["time"][i],
+            "max_temp": f"{days['temperature_2m_max'][i]}°C",
+            "min_temp": f"{days['temperature_2m_min'][i]}°C",
+            "precipitation": f"{days['precipitation_sum'][i]}mm",
+            "weather_code": days['weathercode'][i]
+        })
+    return forecast
+
+def _fetch_forecast(lat, lon):
+    """Download the 7-day forecast for a point, raising on network or payload errors."""
+    return _parse_forecast(_get_json(_forecast_url(lat, lon)))
+
+def _store_forecast(key, forecast):
+    now = time.time()
+    with _forecast_lock:
+        # Entries past the stale window can only be refetched, so drop them and their cells' locks
+        for old in [k for k, entry in _forecasts.items() if now - entry[1] >= FORECAST_STALE_TTL]:
+            del _forecasts[old]
+            lock = _cell_locks.get(old)
+            if lock is not None and not lock.locked():
+                del _cell_locks[old]
+        _forecasts[key] = (forecast, now, _issue_date())
+
+def _refresh_forecast(key):
     try:
-        res = requests.get(weather_url, timeout=5)
-        data = res.json()
-        days = data["daily"]
-        
-        forecast = []
-        for i in range(len(days["time"])):
-            forecast.append({
-                "date": days["time"][i],
-                "max_temp": f"{days['temperature_2m_max'][i]}°C",
-                "min_temp": f"{days['temperature_2m_min'][i]}°C",
-                "precipitation": f"{days['precipitation_sum'][i]}mm",
-                "weather_code": days['weathercode'][i] 
-            })
-        
-        return {"location": location, "forecast": forecast}
+        _store_forecast(key, _fetch_forecast(key[0], key[1]))
+        _count_forecast("refreshes")
+    except Exception as e:
+        print(f"Forecast refresh failed for {key}: {e}")
+        _count_forecast("errors")
+    finally:
+        with _forecast_lock:
+            _refreshing.discard(key)
+
+def _cached_forecast(key):
+    """Return a fresh or stale cached forecast, scheduling a background refresh for stale ones."""
+    with _forecast_lock:
+        entry = _forecasts.get(key)
+        now = time.time()
+        if entry and _is_fresh(entry, now):
+            _forecast_stats["hits"] += 1
+            return entry[0]
+        if entry and now - entry[1] < FORECAST_STALE_TTL:
+            _forecast_stats["stale_hits"] += 1
+            if key not in _refreshing:
+                _refreshing.add(key)
+                threading.Thread(target=_refresh_forecast, args=(key,), daemon=True).start()
+            return entry[0]
+    return None
+
+def get_forecast(lat, lon):
+    """Return the cached forecast for a point's grid cell, fetching it at most once per cell."""
+    key = _forecast_key(lat, lon)
+    forecast = _cached_forecast(key)
+    if forecast is not None:
+        return forecast
+    with _forecast_lock:
+        cell_lock = _cell_locks.setdefault(key, threading.Lock())
+
+    # Farms in the same cell wait for one upstream fetch instead of each making their own
+    with cell_lock:
+        with _forecast_lock:
+            entry = _forecasts.get(key)
+            if entry and _is_fresh(entry, time.time()):
+                _forecast_stats["hits"] += 1
+                return entry[0]
+        _count_forecast("misses")
+        forecast = _fetch_forecast(key[0], key[1])
+        _store_forecast(key, forecast)
+        return forecast
+
+def forecast_cache_stats():
+    with _forecast_lock:
+        stats = dict(_forecast_stats)
+        stats["entries"] = len(_forecasts)
+    return stats
+
+def fetcher(location="New York"):
+    """Fetch 7-day weather forecast using Open-Meteo."""
+    lat, lon = get_coordinates(location)
+    if lat is None or lon is None:
+        return {"error": "Unable to get coordinates for the location."}
+
+    try:
+        return {"location": location, "forecast": get_forecast(lat, lon)}
 
     except Exception as e:
+        _count_forecast("errors")
         return {"error": str(e)}
 
+async def _aget_coordinates(client, location):
+    hit, lat, lon = cached_coordinates(location)
+    if hit:
+        return lat, lon
+    _count("misses")
+    try:
+        await asyncio.sleep(_geocode_wait())
+        lat, lon = _parse_geocode(await _aget_json(client, _geocode_url(location)))
+    except Exception:
+        # Transient failures are not cached
+        _count("errors")
+        return None, None
+    _cache_coordinates(normalize_location(location), lat, lon)
+    return lat, lon
+
+async def _afetch_forecast(client, key):
+    _count_forecast("misses")
+    forecast = _parse_forecast(await _aget_json(client, _forecast_url(key[0], key[1])))
+    _store_forecast(key, forecast)
+    return forecast
+
+async def _aget_forecast(client, lat, lon, pending):
+    key = _forecast_key(lat, lon)
+    forecast = _cached_forecast(key)
+    if forecast is not None:
+        return forecast
+    # Locations in the same cell await the one fetch already started for it
+    if key not in pending:
+        pending[key] = asyncio.ensure_future(_afetch_forecast(client, key))
+    return await pending[key]
+
+async def _afetcher(client, location, semaphore, pending):
+    async with semaphore:
+        lat, lon = await _aget_coordinates(client, location)
+        if lat is None or lon is None:
+            return {"location": location, "error": "Unable to get coordinates for the location."}
+        try:
+            return {"location": location, "forecast": await _aget_forecast(client, lat, lon, pending)}
+        except Exception as e:
+            _count_forecast("errors")
+            return {"location": location, "error": str(e)}
+
+async def afetch_many(locations, concurrency=None, transport=None):
+    """Fetch forecasts for many locations concurrently over one pooled HTTP client."""
+    limit = concurrency or BATCH_CONCURRENCY
+    unique = {}
+    for location in locations:
+        unique.setdefault(normalize_location(location), location)
+
+    semaphore = asyncio.Semaphore(limit)
+    pending = {}
+    async with httpx.AsyncClient(
+        headers=HEADERS,
+        timeout=5,
+        limits=httpx.Limits(max_connections=limit),
+        transport=transport
+    ) as client:
+        results = await asyncio.gather(*(_afetcher(client, location, semaphore, pending) for location in unique.values()))
+
+    by_key = dict(zip(unique, results))
+    return [dict(by_key[normalize_location(location)], location=location) for location in locations]
+
+def _async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=5,
+            limits=httpx.Limits(max_connections=BATCH_CONCURRENCY)
+        )
+    return client
+
+async def afetcher(location="New York"):
+    """Async fetcher() over a pooled client shared by every caller on the running event loop."""
+    result = await _afetcher(_async_client(), location, asyncio.Semaphore(1), {})
+    if "error" in result:
+        return {"error": result["error"]}
+    return result
+
+async def aclose_client():
+    """Close the running loop's pooled client, e.g. on server shutdown."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+def fetch_many(locations, concurrency=None, transport=None):
+    """Blocking wrapper around afetch_many, results are in the same order as locations."""
+    return asyncio.run(afetch_many(locations, concurrency, transport))
 
+if __name__ == "__main__":
+    # python -m modules.weather_fetcher locations.csv
+    print(seed_geocode_cache(sys.argv[1]))
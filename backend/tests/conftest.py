@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+# The backend imports its own code as top-level packages (from modules import ...)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# Agents build their Groq clients at import time; tests never let them reach the API
+os.environ.setdefault("GROQ_API_KEY", "test")
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+from modules.agent_stream import astream_sections, sse_event, stream_sections
+from modules.llm_cache import _bypass, bypass_cache
+
+SECTIONS = {"analysis": "sustainability_analysis", "trends": "web_trends"}
+
+
+def test_sse_event_format():
+    assert sse_event("result", {"a": 1}) == 'event: result\ndata: {"a": 1}\n\n'
+
+
+def test_sections_stream_as_their_steps_finish():
+    received = threading.Event()
+
+    def run(on_step_complete):
+        on_step_complete("trends", "rising")
+        on_step_complete("query", "not a section")
+        # The first section reaches the client while this run is still working
+        assert received.wait(1)
+        on_step_complete("analysis", SimpleNamespace(content="  good  "))
+        return {"done": True}
+
+    events = stream_sections(run, SECTIONS)
+    assert next(events) == ("web_trends", "rising")
+    received.set()
+    assert list(events) == [("sustainability_analysis", "good"), ("result", {"done": True})]
+
+
+def test_errors_end_the_stream():
+    def run(on_step_complete):
+        on_step_complete("analysis", "partial")
+        raise RuntimeError("search failed")
+
+    assert list(stream_sections(run, SECTIONS)) == [
+        ("sustainability_analysis", "partial"),
+        ("error", {"message": "search failed"})
+    ]
+
+
+def test_worker_keeps_the_callers_context():
+    with bypass_cache(True):
+        events = list(stream_sections(lambda on_step_complete: _bypass.get(), SECTIONS))
+    assert events == [("result", True)]
+
+
+def test_async_stream():
+    async def arun(on_step_complete):
+        on_step_complete("analysis", "first")
+        await asyncio.sleep(0)
+        on_step_complete("trends", SimpleNamespace(content="second"))
+        return {"done": True}
+
+    async def collect():
+        return [event async for event in astream_sections(arun, SECTIONS)]
+
+    assert asyncio.run(collect()) == [
+        ("sustainability_analysis", "first"),
+        ("web_trends", "second"),
+        ("result", {"done": True})
+    ]
+
+
+def test_async_stream_reports_errors():
+    async def arun(on_step_complete):
+        raise ValueError("bad crop")
+
+    async def collect():
+        return [event async for event in astream_sections(arun, SECTIONS)]
+
+    assert asyncio.run(collect()) == [("error", {"message": "bad crop"})]
+
+
+def test_streamed_payloads_are_json():
+    def run(on_step_complete):
+        on_step_complete("analysis", "text")
+        return {"crop": "Wheat"}
+
+    body = "".join(sse_event(event, data) for event, data in stream_sections(run, SECTIONS))
+    payloads = [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+    assert payloads == ["text", {"crop": "Wheat"}]
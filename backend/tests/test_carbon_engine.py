@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from modules.carbon_engine import compute_carbon_footprint, get_emission_factors, summarize_carbon_footprint
+
+
+def by_farm(result, key):
+    return {row["farm_id"]: row for row in result[key]}
+
+
+def test_footprint_uses_the_emission_factors():
+    result = compute_carbon_footprint([(1, "Wheat", 40, 2)])
+    assert by_farm(result, "farm_data")[1]["carbon_footprint"] == pytest.approx(40 * 5.2 + 2 * 16.6)
+
+
+def test_reductions_apply_above_the_thresholds():
+    result = compute_carbon_footprint([(1, "Rice", 60, 8), (2, "Rice", 50, 5)])
+    reductions = by_farm(result, "reductions")
+    # 20% of the fertilizer contribution plus 30% of the pesticide contribution
+    assert reductions[1]["estimated_reduction"] == pytest.approx(round(60 * 5.2 * 0.2 + 8 * 16.6 * 0.3, 2))
+    assert len(reductions[1]["insights"]) == 2
+    # Exactly at the thresholds nothing is suggested
+    assert reductions[2]["estimated_reduction"] == 0.0 and reductions[2]["insights"] == []
+
+
+def test_crop_and_overall_totals():
+    result = compute_carbon_footprint([(1, "Corn", 10, 1), (2, "Corn", 20, 1), (3, "Rice", 10, 0)])
+    totals = {item["crop_type"]: item for item in result["crop_totals"]}
+    assert totals["Corn"]["farms"] == 2
+    assert totals["Corn"]["carbon_footprint"] == pytest.approx(30 * 5.2 + 2 * 16.6)
+    assert result["total_carbon_footprint"] == pytest.approx(40 * 5.2 + 2 * 16.6)
+    assert "Total Carbon Footprint:" in summarize_carbon_footprint(result)
+
+
+def test_overridden_factors_are_versioned():
+    factors = get_emission_factors(overrides={"fertilizer": 1.0})
+    assert factors["version"] == "v1+custom"
+    result = compute_carbon_footprint([(1, "Wheat", 10, 0)], factors)
+    assert by_farm(result, "farm_data")[1]["carbon_footprint"] == 10.0
+
+
+def test_unknown_factor_version():
+    with pytest.raises(ValueError):
+        get_emission_factors("v0")
+
+
+def test_null_usage_becomes_none_and_keeps_known_reductions():
+    result = compute_carbon_footprint([(1, "Rice", None, 8), (2, "Wheat", 60, None), (3, "Wheat", 10, 1)])
+    rows = by_farm(result, "farm_data")
+    reductions = by_farm(result, "reductions")
+    assert rows[1]["fertilizer_use"] is None and rows[1]["carbon_footprint"] is None
+    assert rows[2]["pesticide_use"] is None and rows[2]["carbon_footprint"] is None
+    assert reductions[1]["estimated_reduction"] == pytest.approx(round(8 * 16.6 * 0.3, 2))
+    assert reductions[2]["estimated_reduction"] == pytest.approx(round(60 * 5.2 * 0.2, 2))
+    assert result["total_carbon_footprint"] == pytest.approx(10 * 5.2 + 16.6)
+    json.dumps(result, allow_nan=False)
@@ -0,0 +1,58 @@
+import sqlite3
+
+import pytest
+
+from modules import db_manager
+from modules.query_extract_run import run_query
+
+
+@pytest.fixture(autouse=True)
+def farming(tmp_path, monkeypatch):
+    path = tmp_path / "farming.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE farm_advisory (Farm_ID INTEGER, Crop_Type TEXT)")
+    conn.execute("INSERT INTO farm_advisory VALUES (1, 'Wheat'), (2, 'Maize')")
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(db_manager.DB_PATHS, "farming", path)
+    yield path
+    db_manager.close_thread_connections()
+
+
+def test_same_thread_reuses_one_connection():
+    assert db_manager.get_connection("farming") is db_manager.get_connection("farming")
+    assert db_manager.get_connection("farming").execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_run_query_returns_rows():
+    assert run_query("SELECT Farm_ID, Crop_Type FROM farm_advisory ORDER BY Farm_ID") == [(1, "Wheat"), (2, "Maize")]
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM farm_advisory",
+    "UPDATE farm_advisory SET Crop_Type = 'Rice'",
+    "DROP TABLE farm_advisory",
+])
+def test_run_query_refuses_writes(sql):
+    with pytest.raises(sqlite3.OperationalError, match="readonly"):
+        run_query(sql)
+    assert db_manager.fetchone("farming", "SELECT COUNT(*) FROM farm_advisory") == (2,)
+
+
+def test_run_query_leaves_the_pooled_connection_usable_for_writes():
+    with pytest.raises(sqlite3.OperationalError):
+        run_query("DELETE FROM farm_advisory")
+    conn = db_manager.get_connection("farming")
+    assert not conn.in_transaction
+    db_manager.execute_write("farming", lambda conn: conn.execute("INSERT INTO farm_advisory VALUES (3, 'Rice')"))
+    assert db_manager.fetchone("farming", "SELECT COUNT(*) FROM farm_advisory") == (3,)
+
+
+def test_failed_write_is_rolled_back():
+    def write(conn):
+        conn.execute("INSERT INTO farm_advisory VALUES (3, 'Rice')")
+        raise RuntimeError("failed halfway")
+
+    with pytest.raises(RuntimeError):
+        db_manager.execute_write("farming", write)
+    assert db_manager.fetchone("farming", "SELECT COUNT(*) FROM farm_advisory") == (2,)
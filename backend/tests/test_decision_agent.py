@@ -0,0 +1,88 @@
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from agents import decision_agent
+from agents.decision_agent import DecisionAgent
+from modules import db_manager, memory_handler
+
+
+class RecordingLLM:
+    def __init__(self, content='```json\n{"status": "ok"}\n```'):
+        self.content = content
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(content=self.content)
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    path = tmp_path / "memory.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE memory (id INTEGER PRIMARY KEY AUTOINCREMENT, agent_name TEXT NOT NULL UNIQUE, crux TEXT NOT NULL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+    conn.execute("INSERT INTO memory (agent_name, crux) VALUES ('weather', 'Rain all week')")
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(db_manager.DB_PATHS, "memory", path)
+    monkeypatch.setattr(decision_agent, "llm", RecordingLLM())
+    yield DecisionAgent(str(path))
+    db_manager.close_thread_connections()
+
+
+def add_memory(agent_name, crux):
+    memory_handler._write_rows([(agent_name, crux, True)])
+
+
+def count_reads(monkeypatch):
+    reads = []
+    fetchall = decision_agent.fetchall
+
+    def counting(db, sql, params=()):
+        reads.append(sql)
+        return fetchall(db, sql, params)
+
+    monkeypatch.setattr(decision_agent, "fetchall", counting)
+    return reads
+
+
+def test_memory_is_read_once_until_it_changes(agent, monkeypatch):
+    reads = count_reads(monkeypatch)
+    assert agent.fetch_memory() == [("weather", "Rain all week")]
+    assert agent.memory_context() == "weather: Rain all week"
+    assert agent.memory_context() == "weather: Rain all week"
+    assert len(reads) == 1
+
+
+def test_memory_writes_invalidate_the_cache(agent, monkeypatch):
+    reads = count_reads(monkeypatch)
+    agent.memory_context()
+    add_memory("market", "Prices rising")
+    assert agent.memory_context() == "weather: Rain all week\nmarket: Prices rising"
+    add_memory("weather", "Dry spell")
+    assert "weather: Dry spell" in agent.memory_context()
+    assert len(reads) == 3
+
+
+def test_free_form_branch_prompts_with_memory_and_parses_json(agent):
+    assert agent.analyze_and_clean({"temperature": 30}, "weather") == {"status": "ok"}
+    assert "weather: Rain all week" in decision_agent.llm.prompts[0]
+    assert "{'temperature': 30}" in decision_agent.llm.prompts[0]
+
+
+def test_invalid_json_is_returned_raw(agent, monkeypatch):
+    monkeypatch.setattr(decision_agent, "llm", RecordingLLM("not json"))
+    assert agent.analyze_and_clean("x", "weather") == {"error": "Invalid JSON returned by LLM", "raw_response": "not json"}
+
+
+def test_async_free_form_branch_uses_the_cached_memory(agent, monkeypatch):
+    reads = count_reads(monkeypatch)
+    agent.memory_context()
+    assert asyncio.run(agent.aanalyze_and_clean("x", "weather")) == {"status": "ok"}
+    assert len(reads) == 1
@@ -0,0 +1,131 @@
+from modules import format_parser
+from modules.format_parser import parse_bullets, parse_carbon, parse_market, parse_sustainability, parse_water
+
+SUSTAINABILITY_PARAMETERS = "Soil_pH (6.5), Soil_Moisture (28%), Temperature_C (24), Crop_Yield_ton (3.2)"
+MARKET_PARAMETERS = "Market_Price_per_ton (310), Demand_Index (140), Seasonal_Factor (Medium)"
+
+
+def trending(parameters, extra=""):
+    return "- Trending Crops:\n" + "\n".join(
+        f"  - {crop}:\n    - Parameters: {crop}: {parameters}\n    - Strength: steady yields\n{extra}    - Source: FAO"
+        for crop in ("Wheat", "Millet")
+    )
+
+
+def strategies(section, percentage_key):
+    return (
+        f"- {section}:\n"
+        f"  - Strategy 1:\n    - Description: Precision application\n    - {percentage_key}: 20%\n    - Source: USDA\n"
+        f"  - Strategy 2:\n    - Source: missing description, skipped"
+    )
+
+
+def test_parse_bullets_nests_by_indent_and_joins_continuation_lines():
+    nodes = parse_bullets("- **Analysis**: Yields are high\n  and stable\n- Top:\n\t1. Soybean: 8.2\n\t2. Corn: 7.9")
+    assert [node["key"] for node in nodes] == ["Analysis", "Top"]
+    assert nodes[0]["value"] == "Yields are high and stable"
+    assert [(child["key"], child["value"]) for child in nodes[1]["children"]] == [("Soybean", "8.2"), ("Corn", "7.9")]
+
+
+def test_find_ignores_case_and_punctuation():
+    nodes = parse_bullets("- Outer:\n  - sustainability_scores: 1, 2")
+    assert format_parser.find(nodes, "Sustainability Scores")["value"] == "1, 2"
+    assert format_parser.find(nodes, "Missing") is None
+
+
+def test_parse_sustainability():
+    parsed = parse_sustainability({
+        "crop_type": "Wheat",
+        "sustainability_analysis": f"- Sustainability Scores: 72.5, 68.1\n- Parameters: {SUSTAINABILITY_PARAMETERS}\n- Analysis: Stable yields.",
+        "top3_comparison": (
+            "- Top 3 Crops: Soybean (78.2), Corn (74.6), Rice (71.9)\n"
+            f"- Parameters Comparison:\n  - Soybean:\n    - Parameters: Soybean: {SUSTAINABILITY_PARAMETERS}\n"
+            "- Insights: Soybean needs less fertilizer."
+        ),
+        "web_trends": trending(SUSTAINABILITY_PARAMETERS)
+    })
+    analysis = parsed["sustainability_analysis"]
+    assert (analysis["analysis"], analysis["crop"], analysis["sustainability_scores"]) == ("Stable yields.", "Wheat", [72.5, 68.1])
+    assert analysis["parameters"]["Soil_Moisture"] == [28.0]
+    top = parsed["top3_comparison"]["top_crops"]
+    assert [(crop["crop"], crop["score"]) for crop in top] == [("Soybean", 78.2), ("Corn", 74.6), ("Rice", 71.9)]
+    assert top[0]["parameters"]["Soil_pH"] == 6.5 and top[1]["parameters"] == {}
+    trend = parsed["web_trends"]["trending_crops"][1]
+    assert (trend["crop"], trend["source"], trend["parameters"]["Crop_Yield_ton"]) == ("Millet", "FAO", 3.2)
+
+
+def test_parse_sustainability_falls_back_when_sections_are_missing():
+    assert parse_sustainability({"sustainability_analysis": "- Analysis: only this"}) is None
+
+
+def test_parse_market():
+    parsed = parse_market({
+        "market_analysis": (
+            "- Rising or non rising index Analysis: True, demand outpaces supply\n"
+            "- Parameter Trends:\n  - Demand_Index: True\n  - Supply Index: false, falling stocks"
+        ),
+        "top3_market_comparison": (
+            "- Top 3 Crops: Soybean (320), Corn (305)\n"
+            f"- Parameters Comparison:\n  - Corn: Parameters: Corn: {MARKET_PARAMETERS}\n"
+            "- Insights: Soybean leads."
+        ),
+        "web_market_trends": trending(MARKET_PARAMETERS, "    - Rising percentage: 12%\n")
+    })
+    analysis = parsed["market_analysis"]
+    assert analysis["overall_trend"] == "Rising (True): demand outpaces supply"
+    assert analysis["analysis"]["Demand_Index"] == "True"
+    assert analysis["analysis"]["Supply_Index"] == "False"
+    assert analysis["analysis"]["Market_Price_per_ton"] == "Unknown"
+    comparison = parsed["top3_market_comparison"]
+    assert comparison["top_crops"] == ["Soybean", "Corn"]
+    assert comparison["parameters_comparison"]["Corn"]["Seasonal_Factor"] == "Medium"
+    wheat = parsed["web_market_trends"]["crops"]["Wheat"]
+    assert (wheat["Market_Price_per_ton"], wheat["rising_percentage"], wheat["source"]) == (310, "12%", "FAO")
+
+
+def test_parse_market_needs_a_true_or_false_trend():
+    assert parse_market({
+        "market_analysis": "- Rising or non rising index Analysis: Maybe",
+        "top3_market_comparison": "- Top 3 Crops: Soybean (320)",
+        "web_market_trends": trending(MARKET_PARAMETERS)
+    }) is None
+
+
+def test_parse_carbon_keeps_the_numbers_and_the_narration():
+    farm_data = [{"Farm_ID": 1, "Crop_Type": "Rice", "carbon_footprint": 12.5}]
+    parsed = parse_carbon({
+        "farm_data": farm_data,
+        "total_carbon_footprint": 12.5,
+        "reductions": [{"crop": "Rice", "reduction_percentage": 20}],
+        "carbon_footprint_calculation": "- Summary: Fertilizer drives emissions.",
+        "reduction_insights": "- Rice: use less fertilizer",
+        "web_carbon_trends": strategies("Reduction Strategies", "Reduction_Percentage")
+    })
+    calculation = parsed["carbon_footprint_calculation"]
+    assert (calculation["farm_data"], calculation["total_carbon_footprint"]) == (farm_data, 12.5)
+    assert calculation["summary"] == "- Summary: Fertilizer drives emissions."
+    assert parsed["reduction_insights"]["summary"] == "- Rice: use less fertilizer"
+    assert parsed["web_carbon_trends"]["reduction_strategies"] == [
+        {"description": "Precision application", "reduction_percentage": "20%", "source": "USDA"}
+    ]
+
+
+def test_parse_water_keeps_the_numbers_and_the_narration():
+    parsed = parse_water({
+        "farm_data": [],
+        "total_water_usage_liters": 6000,
+        "water_usage_by_crop": [{"crop": "Rice", "savings_liters": 1200}],
+        "water_usage_calculation": "- Summary: Rice dominates.",
+        "conservation_insights": "- Rice: alternate wetting and drying",
+        "web_water_trends": strategies("Conservation Strategies", "Savings_Percentage")
+    })
+    assert parsed["total_water_usage_liters"] == 6000
+    assert parsed["conservation_insights"] == [{"crop": "Rice", "savings_liters": 1200}]
+    assert (parsed["water_usage_summary"], parsed["conservation_summary"]) == ("- Summary: Rice dominates.", "- Rice: alternate wetting and drying")
+    assert parsed["water_conservation_strategies"][0]["savings_percentage"] == "20%"
+
+
+def test_parse_carbon_and_water_need_the_engine_results():
+    trends = strategies("Reduction Strategies", "Reduction_Percentage")
+    assert parse_carbon({"web_carbon_trends": trends}) is None
+    assert parse_water({"farm_data": [], "web_water_trends": "- nothing useful"}) is None
@@ -0,0 +1,146 @@
+import json
+import queue
+import re
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from modules import db_manager, memory_handler
+
+
+class FakeLLM:
+    """Answers summary prompts like the model would, optionally failing or blocking."""
+
+    def __init__(self, batched="json", single="ok", gate=None):
+        self.batched = batched
+        self.single = single
+        self.gate = gate
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        if self.gate is not None and len(self.prompts) == 1:
+            self.gate.wait(2)
+        numbers = re.findall(r"^\[(\d+)\] \((\w+)\)", prompt, flags=re.M)
+        if numbers:
+            if self.batched == "garbage":
+                return SimpleNamespace(content="not json")
+            return SimpleNamespace(content="```json\n" + json.dumps({n: f"summary of {agent}" for n, agent in numbers}) + "\n```")
+        if self.single == "fail":
+            raise RuntimeError("groq is down")
+        return SimpleNamespace(content=" short summary ")
+
+
+@pytest.fixture(autouse=True)
+def memory_db(tmp_path, monkeypatch):
+    path = tmp_path / "memory.db"
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE memory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_name TEXT NOT NULL UNIQUE,
+            crux TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(db_manager.DB_PATHS, "memory", path)
+    monkeypatch.setattr(memory_handler, "_queue", queue.Queue(maxsize=memory_handler.QUEUE_SIZE))
+    monkeypatch.setattr(memory_handler, "_worker", None)
+    monkeypatch.setattr(memory_handler, "_metrics", {name: 0 for name in memory_handler._metrics})
+    monkeypatch.setattr(memory_handler, "WRITE_BEHIND", True)
+    monkeypatch.setattr(memory_handler, "WRITE_RETRY_DELAY", 0.001)
+    monkeypatch.setattr(memory_handler, "llm", FakeLLM())
+    yield path
+    db_manager.close_thread_connections()
+
+
+def rows():
+    return db_manager.fetchall("memory", "SELECT agent_name, crux FROM memory ORDER BY agent_name")
+
+
+def test_store_crux_writes_in_the_background():
+    version = memory_handler.memory_version()
+    memory_handler.store_crux("weather", "Heavy rain expected for three days")
+    assert memory_handler.flush_memory(2)
+    assert rows() == [("weather", "short summary")]
+    assert memory_handler.memory_version() > version
+    stats = memory_handler.memory_queue_stats()
+    assert (stats["enqueued"], stats["written"], stats["queue_depth"]) == (1, 1, 0)
+
+
+def test_batch_is_summarized_in_one_call_and_later_updates_win():
+    now = 0.0
+    memory_handler._process([
+        ("market", "old market insight", True, now),
+        ("weather", "weather insight", True, now),
+        ("market", "new market insight", True, now),
+    ])
+    assert len(memory_handler.llm.prompts) == 1
+    assert "old market insight" not in memory_handler.llm.prompts[0]
+    assert rows() == [("market", "summary of market"), ("weather", "summary of weather")]
+    stats = memory_handler.memory_queue_stats()
+    assert (stats["written"], stats["coalesced"], stats["batches"]) == (2, 1, 1)
+
+
+def test_inserts_are_never_coalesced():
+    entries = [("a", "1", False, 0), ("a", "2", False, 0), ("b", "3", True, 0), ("b", "4", True, 0)]
+    assert memory_handler._coalesce(entries) == [entries[0], entries[1], entries[3]]
+
+
+def test_unparseable_batch_falls_back_to_one_call_per_item():
+    memory_handler.llm = FakeLLM(batched="garbage")
+    summaries = memory_handler.summarize_cruxes([("market", "m"), ("weather", "w")])
+    assert summaries == [{"agent_name": "market", "summary": "short summary"}, {"agent_name": "weather", "summary": "short summary"}]
+    assert len(memory_handler.llm.prompts) == 3
+
+
+def test_failed_summary_keeps_the_raw_insight():
+    memory_handler.llm = FakeLLM(single="fail")
+    memory_handler._process([("weather", "raw weather insight", True, 0.0)])
+    assert rows() == [("weather", "raw weather insight")]
+    assert memory_handler.memory_queue_stats()["unsummarized"] == 1
+
+
+def test_failed_rows_are_written_one_by_one():
+    # The plain insert of an agent_name that already exists violates UNIQUE
+    db_manager.execute_write("memory", lambda conn: conn.execute("INSERT INTO memory (agent_name, crux) VALUES ('market', 'x')"))
+    memory_handler._process([("market", "dup", False, 0.0), ("weather", "w", True, 0.0)])
+    assert rows() == [("market", "x"), ("weather", "summary of weather")]
+    stats = memory_handler.memory_queue_stats()
+    assert (stats["written"], stats["failed"]) == (1, 1)
+    assert stats["write_retries"] == 2 * memory_handler.WRITE_RETRIES
+
+
+def test_full_queue_writes_synchronously_instead_of_dropping(monkeypatch):
+    gate = threading.Event()
+    memory_handler.llm = FakeLLM(gate=gate)
+    monkeypatch.setattr(memory_handler, "_queue", queue.Queue(maxsize=1))
+    monkeypatch.setattr(memory_handler, "ENQUEUE_TIMEOUT", 0.01)
+    monkeypatch.setattr(memory_handler, "BATCH_SIZE", 1)
+
+    memory_handler.store_crux("first", "held by the worker", update=True)
+    deadline = time.monotonic() + 2
+    while not memory_handler.llm.prompts:
+        assert time.monotonic() < deadline, "worker never picked up the first insight"
+        time.sleep(0.005)
+    memory_handler.store_crux("second", "waits in the queue", update=True)
+    memory_handler.store_crux("third", "no room left", update=True)
+    assert ("third", "short summary") in rows()
+    assert memory_handler.memory_queue_stats()["sync_writes"] == 1
+
+    gate.set()
+    assert memory_handler.flush_memory(2)
+    assert [agent for agent, _ in rows()] == ["first", "second", "third"]
+
+
+def test_without_write_behind_errors_reach_the_caller(monkeypatch):
+    monkeypatch.setattr(memory_handler, "WRITE_BEHIND", False)
+    memory_handler.store_crux("weather", "w", update=True)
+    assert rows() == [("weather", "short summary")]
+    with pytest.raises(RuntimeError, match="Could not write memory for weather"):
+        memory_handler.store_crux("weather", "w again")
@@ -0,0 +1,73 @@
+from modules.carbon_engine import compute_carbon_footprint, summarize_carbon_footprint
+from modules.prompt_compaction import compact_context, compact_farm_rows, distinct_crops, estimate_tokens
+from modules.water_engine import compute_water_usage, summarize_water_usage
+
+FIELDS = ["soil_moisture", "rainfall_mm", "water_usage_liters"]
+
+
+def water_rows(count):
+    crops = ["Wheat", "Rice", "Corn", "Soybean"]
+    return [(i, crops[i % 4], 10 + i % 30, 50 + (i * 37) % 800) for i in range(count)]
+
+
+def test_distinct_crops_keeps_first_seen_order():
+    assert distinct_crops([(1, "Rice"), (2, "Wheat"), (3, "Rice")]) == "Rice Wheat"
+
+
+def test_digest_size_does_not_grow_with_the_table():
+    small = compute_water_usage(water_rows(100))["farm_data"]
+    large = compute_water_usage(water_rows(10000))["farm_data"]
+    for rows in (small, large):
+        assert estimate_tokens(compact_farm_rows(rows, FIELDS, "water_usage_liters", budget=300)) <= 300
+
+
+def test_quantiles_then_outliers_are_dropped_to_fit():
+    rows = compute_water_usage(water_rows(1000))["farm_data"]
+    full = compact_farm_rows(rows, FIELDS, "water_usage_liters", budget=5000)
+    assert "p50" in full and "Farms with the highest" in full
+    tight = compact_farm_rows(rows, FIELDS, "water_usage_liters", budget=120)
+    assert "p50" not in tight
+    assert estimate_tokens(tight) <= 120
+
+
+def test_outliers_are_the_highest_scores():
+    rows = [
+        {"crop_type": "Rice", "farm_id": 1, "water_usage_liters": 5.0},
+        {"crop_type": "Rice", "farm_id": 2, "water_usage_liters": 50.0},
+        {"crop_type": "Rice", "farm_id": 3, "water_usage_liters": 20.0}
+    ]
+    digest = compact_farm_rows(rows, ["water_usage_liters"], "water_usage_liters", budget=1000, top_k=2)
+    assert "Farm 2 " in digest and "Farm 3 " in digest and "Farm 1 " not in digest
+    assert digest.index("Farm 2 ") < digest.index("Farm 3 ")
+
+
+def test_null_readings_are_skipped_in_statistics_and_shown_as_na():
+    result = compute_water_usage([(1, "Rice", None, 50), (2, "Rice", 30, 200), (3, "Wheat", 12, None)])
+    digest = compact_farm_rows(result["farm_data"], FIELDS, "water_usage_liters", budget=1000)
+    assert "Rice (2 farms): soil_moisture mean 30.00" in digest
+    assert "Wheat (1 farms): soil_moisture mean 12.00" in digest
+    assert "rainfall_mm n/a" in digest
+    assert "Farm 1 (Rice): soil_moisture n/a" in digest
+    # A farm without a usage estimate is not an outlier
+    assert "Farm 3 " not in digest
+
+
+def test_null_carbon_rows_compact_without_errors():
+    result = compute_carbon_footprint([(1, "Rice", None, 3), (2, "Corn", 60, None), (3, "Corn", 40, 2)])
+    context = compact_context(summarize_carbon_footprint(result), result["farm_data"], ["fertilizer_use", "pesticide_use", "carbon_footprint"], "carbon_footprint")
+    assert "Farm 3 (Corn): fertilizer_use 40.00, pesticide_use 2.00" in context
+    assert "Rice (1 farms): fertilizer_use n/a" in context
+
+
+def test_budget_covers_summary_and_digest_together():
+    result = compute_water_usage(water_rows(10000))
+    summary = summarize_water_usage(result)
+    context = compact_context(summary, result["farm_data"], FIELDS, "water_usage_liters", budget=300)
+    assert context.startswith(summary)
+    assert estimate_tokens(context) <= 300
+
+
+def test_summary_over_budget_is_sent_without_a_digest():
+    result = compute_water_usage(water_rows(100))
+    summary = summarize_water_usage(result)
+    assert compact_context(summary, result["farm_data"], FIELDS, "water_usage_liters", budget=10) == summary
@@ -0,0 +1,237 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from modules import rate_governor
+from modules.rate_governor import BACKGROUND, INTERACTIVE, ModelGovernor, TokenBucket
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        self.response = type("Response", (), {"headers": {"retry-after": retry_after}})()
+
+
+@pytest.fixture(autouse=True)
+def fresh_governors(monkeypatch):
+    monkeypatch.setattr(rate_governor, "_governors", {})
+    monkeypatch.setattr(rate_governor, "BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(rate_governor, "BACKOFF_MAX", 0.05)
+
+
+def wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_bucket_refills_at_its_per_minute_rate():
+    bucket = TokenBucket(600)
+    now = bucket.updated
+    bucket.take(600)
+    assert bucket.wait_time(100, now) == pytest.approx(10)
+    assert bucket.wait_time(100, now + 4) == pytest.approx(6)
+    assert bucket.wait_time(100, now + 10) == 0
+
+
+def test_bucket_never_waits_for_more_than_it_holds():
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    assert bucket.wait_time(1000, bucket.updated) == pytest.approx(60)
+
+
+def test_release_trues_up_the_token_reservation():
+    gov = ModelGovernor("m", 30, 6000, 4)
+    gov.acquire(1000)
+    gov.release(1000, used=400)
+    assert gov.tokens.tokens == pytest.approx(6000 - 400, abs=1)
+    assert gov.active == 0
+
+
+def test_waits_for_the_token_budget():
+    # 6000 per minute refills 100 tokens a second
+    gov = ModelGovernor("m", 30, 6000, 4)
+    gov.acquire(6000)
+    gov.release(6000)
+    started = time.monotonic()
+    gov.acquire(20)
+    assert time.monotonic() - started == pytest.approx(0.2, abs=0.1)
+
+
+def test_concurrency_cap_holds_later_callers():
+    gov = ModelGovernor("m", 30, 100000, 1)
+    gov.acquire(10)
+    acquired = threading.Event()
+    worker = threading.Thread(target=lambda: gov.acquire(10) or acquired.set())
+    worker.start()
+    assert not acquired.wait(0.1)
+    gov.release(10)
+    assert acquired.wait(1)
+    worker.join()
+    assert gov.active == 1
+
+
+def test_interactive_calls_go_before_queued_background_calls():
+    gov = ModelGovernor("m", 30, 100000, 1)
+    gov.acquire(10)
+    order = []
+
+    def call(level, name):
+        gov.acquire(10, level)
+        order.append(name)
+        gov.release(10)
+
+    background = threading.Thread(target=call, args=(BACKGROUND, "background"))
+    background.start()
+    wait_until(lambda: gov.stats()["waiting"] == 1)
+    interactive = threading.Thread(target=call, args=(INTERACTIVE, "interactive"))
+    interactive.start()
+    wait_until(lambda: gov.stats()["waiting"] == 2)
+
+    gov.release(10)
+    background.join(1)
+    interactive.join(1)
+    assert order == ["interactive", "background"]
+    assert gov.stats()["by_priority"] == {"interactive": 2, "background": 1}
+
+
+def test_priority_context_sets_the_level_of_calls_inside_it():
+    with rate_governor.priority(BACKGROUND):
+        rate_governor.governed_call("m", 10, lambda: None)
+    rate_governor.governed_call("m", 10, lambda: None)
+    assert rate_governor.governor("m").stats()["by_priority"] == {"interactive": 1, "background": 1}
+
+
+def test_backoff_pauses_the_model_and_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(rate_governor.random, "uniform", lambda low, high: high)
+    gov = ModelGovernor("m", 30, 100000, 4)
+    assert gov.backoff(0) == pytest.approx(0.01)
+    assert gov.backoff(10) == pytest.approx(0.05)
+    assert gov.backoff(0, retry_after=0.2) == pytest.approx(0.21)
+    started = time.monotonic()
+    gov.acquire(10)
+    assert time.monotonic() - started >= 0.15
+    assert gov.stats()["rate_limited"] == 3
+
+
+def test_governed_call_retries_rate_limited_calls():
+    attempts = []
+
+    def call():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise RateLimited()
+        return "ok"
+
+    assert rate_governor.governed_call("m", 10, call) == "ok"
+    assert len(attempts) == 3
+    stats = rate_governor.governor("m").stats()
+    assert (stats["rate_limited"], stats["active"]) == (2, 0)
+
+
+def test_governed_call_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(rate_governor, "MAX_RETRIES", 2)
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        raise RateLimited()
+
+    with pytest.raises(RateLimited):
+        rate_governor.governed_call("m", 10, call)
+    assert len(attempts) == 3
+    assert rate_governor.governor("m").active == 0
+
+
+def test_other_errors_are_not_retried():
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        rate_governor.governed_call("m", 10, call)
+    assert len(attempts) == 1
+    assert rate_governor.governor("m").active == 0
+
+
+def test_async_waiter_is_woken_by_a_release_from_another_thread():
+    gov = ModelGovernor("m", 30, 100000, 1)
+    gov.acquire(10)
+
+    async def main():
+        threading.Timer(0.05, gov.release, args=(10,)).start()
+        await asyncio.wait_for(gov.aacquire(10), 1)
+
+    asyncio.run(main())
+    assert gov.active == 1
+
+
+def test_cancelled_async_wait_does_not_keep_a_slot():
+    gov = ModelGovernor("m", 30, 100000, 1)
+
+    async def main():
+        await gov.aacquire(10)
+        waiter = asyncio.create_task(gov.aacquire(10))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        gov.release(10)
+        assert gov.active == 0
+        assert gov.stats()["waiting"] == 0
+        # The slot is free for the next caller
+        await asyncio.wait_for(gov.aacquire(10), 1)
+
+    asyncio.run(main())
+    assert gov.active == 1
+
+
+def test_cancelled_agoverned_call_leaves_no_slot_behind(monkeypatch):
+    monkeypatch.setattr(rate_governor, "MAX_CONCURRENCY", 1)
+
+    async def main():
+        started = asyncio.Event()
+        finish = asyncio.Event()
+
+        async def first():
+            started.set()
+            await finish.wait()
+            return "first"
+
+        async def second():
+            return "second"
+
+        running = asyncio.create_task(rate_governor.agoverned_call("m", 10, first))
+        await started.wait()
+        waiting = asyncio.create_task(rate_governor.agoverned_call("m", 10, second))
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        finish.set()
+        assert await running == "first"
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert rate_governor.governor("m").active == 0
+        assert await asyncio.wait_for(rate_governor.agoverned_call("m", 10, second), 1) == "second"
+
+    asyncio.run(main())
+
+
+def test_async_retry_after_rate_limit():
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RateLimited(retry_after="0.05")
+        return "ok"
+
+    assert asyncio.run(rate_governor.agoverned_call("m", 10, call)) == "ok"
+    assert len(attempts) == 2
+    assert rate_governor.governor("m").stats()["rate_limited"] == 1
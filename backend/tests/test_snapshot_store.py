@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from modules import db_manager, llm_cache, snapshot_store
+from modules.rate_governor import BACKGROUND, INTERACTIVE, _priority
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setitem(db_manager.DB_PATHS, "cache", tmp_path / "cache.db")
+    monkeypatch.setattr(snapshot_store, "_table_ready", False)
+    monkeypatch.setattr(snapshot_store, "_producers", {})
+    monkeypatch.setattr(snapshot_store, "_refreshing", set())
+    monkeypatch.setattr(snapshot_store, "_stats", {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0})
+    yield
+    db_manager.close_thread_connections()
+
+
+class Producer:
+    """Counts calls and records whether each ran past the LLM cache, and at what priority."""
+
+    def __init__(self):
+        self.calls = []
+        self.done = threading.Event()
+
+    def __call__(self, key=None):
+        self.calls.append((key, llm_cache._bypass.get(), _priority.get()))
+        self.done.set()
+        return {"key": key, "call": len(self.calls)}
+
+
+def age_snapshot(endpoint, key, seconds):
+    snapshot_store._connect().execute(
+        "UPDATE snapshots SET updated_at = ? WHERE endpoint = ? AND key = ?",
+        (time.time() - seconds, endpoint, key)
+    )
+    snapshot_store._connect().commit()
+
+
+def stored_keys():
+    return [row[0] for row in snapshot_store._connect().execute("SELECT key FROM snapshots ORDER BY key")]
+
+
+def test_first_request_computes_then_later_ones_are_served():
+    produce = Producer()
+    snapshot_store.register_snapshot("carbon", produce)
+    assert snapshot_store.serve_snapshot("carbon") == {"key": None, "call": 1}
+    assert snapshot_store.serve_snapshot("carbon") == {"key": None, "call": 1}
+    assert len(produce.calls) == 1
+    stats = snapshot_store.snapshot_stats()
+    assert (stats["hits"], stats["misses"], stats["refreshes"]) == (1, 1, 1)
+
+
+def test_refresh_recomputes_even_when_a_snapshot_exists():
+    produce = Producer()
+    snapshot_store.register_snapshot("carbon", produce)
+    snapshot_store.serve_snapshot("carbon")
+    assert snapshot_store.serve_snapshot("carbon", refresh=True)["call"] == 2
+
+
+def test_stale_snapshot_is_served_and_refreshed_past_the_llm_cache():
+    produce = Producer()
+    snapshot_store.register_snapshot("carbon", produce)
+    snapshot_store.serve_snapshot("carbon")
+    age_snapshot("carbon", "", snapshot_store.REFRESH_AFTER + 1)
+    produce.done.clear()
+
+    assert snapshot_store.serve_snapshot("carbon")["call"] == 1
+    assert produce.done.wait(2)
+    deadline = time.monotonic() + 2
+    while snapshot_store.snapshot_stats()["refreshing"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert produce.calls[-1] == (None, True, BACKGROUND)
+    assert snapshot_store.serve_snapshot("carbon")["call"] == 2
+
+
+def test_first_computation_uses_the_llm_cache():
+    produce = Producer()
+    snapshot_store.register_snapshot("carbon", produce)
+    snapshot_store.serve_snapshot("carbon")
+    assert produce.calls == [(None, False, INTERACTIVE)]
+
+
+def test_snapshot_past_max_age_is_recomputed_inline():
+    produce = Producer()
+    snapshot_store.register_snapshot("carbon", produce)
+    snapshot_store.serve_snapshot("carbon")
+    age_snapshot("carbon", "", snapshot_store.MAX_AGE + 1)
+    assert snapshot_store.serve_snapshot("carbon")["call"] == 2
+    assert snapshot_store.snapshot_stats()["misses"] == 2
+
+
+def test_only_precomputed_keys_are_stored():
+    produce = Producer()
+    snapshot_store.register_snapshot("market", produce, keys=lambda: ["Maize", "Wheat"])
+    assert snapshot_store.serve_snapshot("market", "Wheat")["key"] == "Wheat"
+    assert snapshot_store.serve_snapshot("market", "anything else")["key"] == "anything else"
+    assert snapshot_store.save_snapshot("market", "wheat", {}) is False
+    assert stored_keys() == ["Wheat"]
+    # Unstored keys are computed on every miss
+    snapshot_store.serve_snapshot("market", "anything else")
+    assert [call[0] for call in produce.calls] == ["Wheat", "anything else", "anything else"]
+
+
+def test_async_serve_awaits_acompute_and_stores_the_result():
+    produce = Producer()
+    snapshot_store.register_snapshot("carbon", produce)
+
+    async def acompute():
+        return {"async": True}
+
+    assert asyncio.run(snapshot_store.aserve_snapshot("carbon", acompute=acompute)) == {"async": True}
+    assert snapshot_store.serve_snapshot("carbon") == {"async": True}
+    assert produce.calls == []
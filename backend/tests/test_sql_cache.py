@@ -0,0 +1,95 @@
+import sqlite3
+
+import pytest
+
+from modules import db_manager, sql_cache
+
+QUESTION = "GIVE ONLY THE SQL QUERY to select Farm_ID, Crop_Type from farm_advisory"
+SQL = "SELECT Farm_ID, Crop_Type FROM farm_advisory"
+
+
+@pytest.fixture(autouse=True)
+def databases(tmp_path, monkeypatch):
+    farming = tmp_path / "farming.db"
+    conn = sqlite3.connect(farming)
+    conn.execute("CREATE TABLE farm_advisory (Farm_ID INTEGER, Crop_Type TEXT)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(db_manager.DB_PATHS, "farming", farming)
+    monkeypatch.setitem(db_manager.DB_PATHS, "cache", tmp_path / "cache.db")
+    monkeypatch.setattr(sql_cache, "_table_ready", False)
+    monkeypatch.setattr(sql_cache, "_stats", {"hits": 0, "misses": 0, "pinned_hits": 0, "invalidated": 0})
+    yield
+    db_manager.close_thread_connections()
+
+
+class Generator:
+    def __init__(self, sql=SQL):
+        self.sql = sql
+        self.calls = 0
+
+    def __call__(self, question):
+        self.calls += 1
+        return self.sql
+
+
+def cached_rows():
+    return sql_cache._connect().execute("SELECT question, schema_hash, sql FROM sql_cache").fetchall()
+
+
+def test_generates_once_then_serves_from_cache():
+    generate = Generator()
+    assert sql_cache.get_sql(QUESTION, generate) == SQL
+    assert sql_cache.get_sql(QUESTION, generate) == SQL
+    assert generate.calls == 1
+    stats = sql_cache.sql_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_reformatted_question_shares_the_entry():
+    generate = Generator()
+    sql_cache.get_sql(QUESTION, generate)
+    sql_cache.get_sql("  " + QUESTION.replace(" ", "\n    "), generate)
+    assert generate.calls == 1
+
+
+def test_schema_change_invalidates_cached_sql():
+    generate = Generator()
+    sql_cache.get_sql(QUESTION, generate)
+    before = sql_cache.schema_fingerprint()
+
+    db_manager.get_connection("farming").execute("ALTER TABLE farm_advisory ADD COLUMN Soil_pH REAL")
+    assert sql_cache.schema_fingerprint() != before
+
+    sql_cache.get_sql(QUESTION, generate)
+    assert generate.calls == 2
+    # The entry for the old schema is replaced, not kept alongside
+    assert [row[1] for row in cached_rows()] == [sql_cache.schema_fingerprint()]
+    assert sql_cache.sql_cache_stats()["invalidated"] == 1
+
+
+def test_unchanged_schema_has_a_stable_fingerprint():
+    assert sql_cache.schema_fingerprint() == sql_cache.schema_fingerprint()
+
+
+def test_invalid_sql_is_not_cached():
+    generate = Generator("SELECT missing_column FROM farm_advisory")
+    sql_cache.get_sql(QUESTION, generate)
+    sql_cache.get_sql(QUESTION, generate)
+    assert generate.calls == 2
+    assert cached_rows() == []
+
+
+def test_pinned_sql_wins_and_survives_schema_changes():
+    generate = Generator()
+    sql_cache.get_sql(QUESTION, generate)
+    sql_cache.pin_sql(QUESTION, "SELECT Farm_ID FROM farm_advisory")
+    db_manager.get_connection("farming").execute("ALTER TABLE farm_advisory ADD COLUMN Soil_pH REAL")
+
+    assert sql_cache.get_sql(QUESTION, generate) == "SELECT Farm_ID FROM farm_advisory"
+    assert generate.calls == 1
+    assert sql_cache.sql_cache_stats()["pinned_hits"] == 1
+
+    sql_cache.unpin_sql(QUESTION)
+    assert sql_cache.get_sql(QUESTION, generate) == SQL
+    assert generate.calls == 2
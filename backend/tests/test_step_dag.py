@@ -0,0 +1,143 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+
+from modules.step_dag import StepDAG
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def diamond(log=None):
+    """a and b from x, c from both, each step logging when it runs."""
+    def step(name, value):
+        def fn(**kwargs):
+            if log is not None:
+                log.append(name)
+            return value(**kwargs)
+        return fn
+
+    dag = StepDAG("diamond")
+    dag.add("c", step("c", lambda a, b: a + b), ["a", "b"])
+    dag.add("a", step("a", lambda x: x * 2), ["x"])
+    dag.add("b", step("b", lambda x: x + 1), ["x"])
+    return dag
+
+
+def test_order_puts_inputs_first():
+    assert diamond().order(["x"]) == ["a", "b", "c"]
+
+
+def test_order_rejects_missing_inputs():
+    with pytest.raises(ValueError, match="missing or circular"):
+        diamond().order()
+
+
+def test_order_rejects_cycles():
+    dag = StepDAG("cycle").add("a", lambda b: b, ["b"]).add("b", lambda a: a, ["a"])
+    with pytest.raises(ValueError, match="missing or circular"):
+        dag.order()
+
+
+def test_order_rejects_initial_values_named_like_steps():
+    with pytest.raises(ValueError, match="shadow"):
+        diamond().order(["x", "a"])
+
+
+def test_run_passes_outputs_to_dependent_steps():
+    log = []
+    result = diamond(log).run(x=3)
+    assert (result["a"], result["b"], result["c"]) == (6, 4, 10)
+    assert log[-1] == "c"
+    assert set(result.timings) == {"a", "b", "c"}
+
+
+def test_independent_steps_run_concurrently():
+    dag = StepDAG("parallel")
+    dag.add("a", lambda: time.sleep(0.2) or "a")
+    dag.add("b", lambda: time.sleep(0.2) or "b")
+    started = time.perf_counter()
+    dag.run()
+    assert time.perf_counter() - started < 0.35
+
+
+def test_steps_start_only_after_their_inputs_finish():
+    dag = StepDAG("sequence")
+    dag.add("slow", lambda: time.sleep(0.1) or time.perf_counter())
+    dag.add("after", lambda slow: time.perf_counter() - slow, ["slow"])
+    assert dag.run()["after"] >= 0
+
+
+def test_on_step_complete_runs_in_the_calling_thread():
+    calls = []
+    diamond().run(on_step_complete=lambda name, value: calls.append((name, value, threading.current_thread())), x=1)
+    assert sorted((name, value) for name, value, _ in calls) == [("a", 2), ("b", 2), ("c", 4)]
+    assert {thread for _, _, thread in calls} == {threading.current_thread()}
+
+
+def test_failing_step_raises_and_stops_dependents():
+    ran = []
+
+    def fail():
+        raise RuntimeError("step failed")
+
+    dag = StepDAG("failing")
+    dag.add("fail", fail)
+    dag.add("after", lambda fail: ran.append("after"), ["fail"])
+    with pytest.raises(RuntimeError, match="step failed"):
+        dag.run()
+    assert ran == []
+
+
+def test_failure_cancels_steps_not_yet_started():
+    ran = []
+
+    def fail():
+        raise RuntimeError("step failed")
+
+    dag = StepDAG("cancel")
+    dag.add("fail", fail)
+    dag.add("slow", lambda: time.sleep(0.3) or "slow")
+    dag.add("later", lambda slow: ran.append("later"), ["slow"])
+    with pytest.raises(RuntimeError):
+        dag.run()
+    time.sleep(0.4)
+    assert ran == []
+
+
+def test_steps_see_the_callers_context():
+    dag = StepDAG("context").add("seen", lambda: request_id.get())
+    token = request_id.set("req-1")
+    try:
+        assert dag.run()["seen"] == "req-1"
+    finally:
+        request_id.reset(token)
+
+
+def test_nested_run_inside_a_step_runs_inline():
+    inner = diamond()
+    outer = StepDAG("outer").add("inner", lambda: inner.run(x=2)["c"])
+    assert outer.run()["inner"] == 7
+
+
+def test_arun_awaits_async_steps_and_threads_plain_ones():
+    async def adouble(x):
+        await asyncio.sleep(0)
+        return x * 2
+
+    dag = diamond()
+    dag.add("a", lambda x: x * 2, ["x"], afn=adouble)
+    result = asyncio.run(dag.arun(x=3))
+    assert (result["a"], result["b"], result["c"]) == (6, 4, 10)
+
+
+def test_arun_propagates_step_errors():
+    async def fail():
+        raise RuntimeError("async step failed")
+
+    dag = StepDAG("afailing").add("fail", lambda: None, afn=fail)
+    dag.add("after", lambda fail: fail, ["fail"])
+    with pytest.raises(RuntimeError, match="async step failed"):
+        asyncio.run(dag.arun())
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from modules.water_engine import compute_water_usage, summarize_water_usage
+
+
+def farm(result, farm_id):
+    return next(row for row in result["farm_data"] if row["farm_id"] == farm_id)
+
+
+def test_irrigation_is_crop_need_minus_rainfall_in_liters():
+    result = compute_water_usage([(1, "Wheat", 30, 200)])
+    # (500 mm - 200 mm) * 10,000 liters per mm on one hectare
+    assert farm(result, 1)["water_usage_liters"] == 3000000.0
+
+
+def test_rain_above_the_crop_need_means_no_irrigation():
+    result = compute_water_usage([(1, "Soybean", 30, 700)])
+    assert farm(result, 1)["water_usage_liters"] == 0.0
+
+
+def test_low_soil_moisture_adds_twenty_percent():
+    result = compute_water_usage([(1, "Corn", 19.9, 100), (2, "Corn", 20, 100)])
+    assert farm(result, 1)["water_usage_liters"] == pytest.approx(5000000 * 1.2)
+    assert farm(result, 2)["water_usage_liters"] == 5000000.0
+
+
+def test_unknown_crops_use_the_default_need():
+    result = compute_water_usage([(1, "Millet", 30, 0)])
+    assert farm(result, 1)["water_usage_liters"] == 5000000.0
+
+
+def test_savings_add_up_across_triggered_strategies():
+    # Rice with low moisture and low rainfall: drip 30% + harvesting 20% + AWD 25%
+    result = compute_water_usage([(1, "Rice", 10, 50)])
+    usage = (1200 - 50) * 10000 * 1.2
+    row = farm(result, 1)
+    assert row["water_usage_liters"] == pytest.approx(usage)
+    assert row["estimated_savings_liters"] == pytest.approx(usage * 0.75)
+    insights = result["conservation_insights"][0]["insights"]
+    assert len(insights) == 3
+
+
+def test_per_crop_and_overall_totals():
+    result = compute_water_usage([(1, "Wheat", 30, 200), (2, "Wheat", 30, 400), (3, "Rice", 30, 1200)])
+    by_crop = {item["crop_type"]: item for item in result["conservation_insights"]}
+    assert by_crop["Wheat"]["farms"] == 2
+    assert by_crop["Wheat"]["water_usage_liters"] == 4000000.0
+    assert result["total_water_usage_liters"] == 4000000.0
+    assert "Total Water Usage: 4000000.0 liters" in summarize_water_usage(result)
+
+
+def test_empty_input():
+    result = compute_water_usage([])
+    assert result["farm_data"] == [] and result["total_water_usage_liters"] == 0.0
+
+
+def test_null_readings_become_none_and_are_left_out_of_totals():
+    result = compute_water_usage([(1, "Rice", None, 50), (2, "Wheat", 10, None), (3, "Wheat", 30, 200)])
+    # Without a moisture reading the +20% and drip rules do not apply
+    assert farm(result, 1)["soil_moisture"] is None
+    assert farm(result, 1)["water_usage_liters"] == 11500000.0
+    no_rain = farm(result, 2)
+    assert no_rain["rainfall_mm"] is None
+    assert no_rain["water_usage_liters"] is None and no_rain["estimated_savings_liters"] is None
+    assert result["total_water_usage_liters"] == 11500000.0 + 3000000.0
+    # jsonify must be able to emit it as valid JSON
+    json.dumps(result, allow_nan=False)
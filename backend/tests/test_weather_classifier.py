@@ -0,0 +1,87 @@
+import pytest
+
+from modules.weather_classifier import (
+    CONDITION_CROPS,
+    classify_weather,
+    format_condition,
+    format_recommendation,
+    summarize_forecast,
+    wmo_group,
+)
+
+
+def forecast(rain=1.0, high=28.0, low=18.0, code=3, days=7, first_days=None):
+    """A fetcher() result with the same reading every day, apart from first_days overrides."""
+    rows = []
+    for day in range(days):
+        row = {"rain": rain, "high": high, "low": low, "code": code}
+        row.update({key: values[day] for key, values in (first_days or {}).items() if day < len(values)})
+        rows.append({
+            "date": f"2025-01-0{day + 1}",
+            "max_temp": f"{row['high']}°C",
+            "min_temp": f"{row['low']}°C",
+            "precipitation": f"{row['rain']}mm",
+            "weather_code": row["code"]
+        })
+    return {"forecast": rows}
+
+
+def test_summary_reads_the_fetcher_strings():
+    summary = summarize_forecast(forecast(rain=2.5, high=41, low=-1, code=95, days=3))
+    assert summary["total_precipitation_mm"] == 7.5
+    assert (summary["hottest"], summary["coldest"], summary["mean_max_temp"]) == (41.0, -1.0, 41.0)
+    assert (summary["hot_days"], summary["freezing_days"], summary["storm_days"]) == (3, 3, 3)
+
+
+def test_summary_skips_missing_readings():
+    summary = summarize_forecast([{"precipitation": None, "max_temp": "n/a", "weather_code": None}])
+    assert summary["total_precipitation_mm"] == 0.0
+    assert summary["mean_max_temp"] is None
+    assert summary["storm_days"] == 0
+
+
+def test_wmo_groups():
+    assert [wmo_group(code) for code in (0, 45, 61, 75, 96, 42)] == ["clear", "fog", "rain", "snow", "thunderstorm", "unknown"]
+
+
+@pytest.mark.parametrize("weather, condition", [
+    (forecast(rain=15), "Flood"),
+    (forecast(rain=0, first_days={"rain": [60]}), "Flood"),
+    (forecast(first_days={"code": [95, 95]}), "Stormy"),
+    (forecast(first_days={"code": [95]}), "Moderate"),
+    (forecast(high=42), "Extreme Heat"),
+    (forecast(low=-3), "Extreme Cold"),
+    (forecast(code=73), "Extreme Cold"),
+    (forecast(rain=8), "Heavy Rain"),
+    (forecast(first_days={"code": [65, 65]}), "Heavy Rain"),
+    (forecast(rain=0, high=35), "Drought"),
+    (forecast(rain=0.5), "Dry"),
+    (forecast(rain=2), "Moderate"),
+])
+def test_classify_weather(weather, condition):
+    assert classify_weather(weather)[0] == condition
+
+
+def test_flooding_takes_precedence_over_heat():
+    assert classify_weather(forecast(rain=20, high=45))[0] == "Flood"
+
+
+def test_empty_forecast_is_unknown():
+    assert classify_weather({"forecast": []}) == ("Unknown", "No forecast data was available.")
+
+
+def test_explanation_quotes_the_forecast():
+    condition, explanation = classify_weather(forecast(rain=0.5, days=4))
+    assert explanation == "Only 2.0 mm of rain is forecast over 4 days."
+    assert format_condition(condition, explanation) == "- Weather condition: Dry\n- Only 2.0 mm of rain is forecast over 4 days."
+
+
+def test_recommendation_keeps_the_llm_format():
+    lines = format_recommendation("Drought").splitlines()
+    assert lines[0] == "- Plantation Crops: Millet, Sorghum, Chickpea"
+    assert lines[1] == "- Harvestation Crops: Cotton, Groundnut, Sesame"
+    assert lines[2] == "- " + CONDITION_CROPS["Drought"]["reason"]
+
+
+def test_unknown_conditions_get_moderate_crops():
+    assert format_recommendation("Unknown") == format_recommendation("Moderate")
@@ -0,0 +1,40 @@
+import time
+
+import pytest
+
+from modules import db_manager, weather_fetcher
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setitem(db_manager.DB_PATHS, "cache", tmp_path / "cache.db")
+    monkeypatch.setattr(weather_fetcher, "_table_ready", False)
+    monkeypatch.setattr(weather_fetcher, "_geocode_stats", {"hits": 0, "negative_hits": 0, "misses": 0, "errors": 0})
+    yield
+    db_manager.close_thread_connections()
+
+
+def test_equivalent_names_share_a_cache_key():
+    assert weather_fetcher.normalize_location("  Pune ,Maharashtra. ") == "pune, maharashtra"
+    assert weather_fetcher.normalize_location("PUNE,  maharashtra") == "pune, maharashtra"
+
+
+def test_uncached_locations_lists_each_missing_place_once():
+    weather_fetcher._cache_coordinates("pune", 18.5, 73.8)
+    missing = weather_fetcher.uncached_locations(["Pune", "Nashik", "nashik ", "Satara"])
+    assert missing == ["nashik", "satara"]
+    assert weather_fetcher.geocode_cache_stats()["hits"] == 0
+
+
+def test_expired_negative_entries_count_as_uncached(monkeypatch):
+    weather_fetcher._cache_coordinates("nowhere", None, None)
+    assert weather_fetcher.uncached_locations(["Nowhere"]) == []
+    later = time.time() + weather_fetcher.NEGATIVE_TTL + 1
+    monkeypatch.setattr(weather_fetcher.time, "time", lambda: later)
+    assert weather_fetcher.uncached_locations(["Nowhere"]) == ["nowhere"]
+
+
+def test_cached_coordinates_are_served_without_geocoding(monkeypatch):
+    weather_fetcher._cache_coordinates("pune", 18.5, 73.8)
+    monkeypatch.setattr(weather_fetcher, "_geocode", lambda location: pytest.fail("geocoded a cached location"))
+    assert weather_fetcher.get_coordinates("PUNE") == (18.5, 73.8)